@@ -0,0 +1,386 @@
+"""
+Headless command-line interface for the attendance system
+
+Runs exports, imports, reports and punches straight on DatabaseManager
+and utils without importing any UI module, so it starts quickly and can
+be scheduled from cron, e.g.:
+
+    python -m attendance_cli export --from 2025-10-01 --to 2025-10-31 -o october.csv
+    python -m attendance_cli export --absences --department Finance --from 2025-10-01 -o absent.csv
+    python -m attendance_cli holiday add 2025-10-01 "Independence Day"
+    python -m attendance_cli import staff.csv
+    python -m attendance_cli import-history old/*.csv --on-conflict merge --rejects rejects.csv
+    python -m attendance_cli report --from 2025-01-01 --to 2025-12-31 --by department
+    python -m attendance_cli absences --from 2025-10-01 --to 2025-10-31 --department Finance
+    python -m attendance_cli punch 001 222
+    python -m attendance_cli run-job refresh_summaries
+    python -m attendance_cli backup --keep 14
+    python -m attendance_cli vacuum
+    python -m attendance_cli audit --key 001 --limit 20
+    python -m attendance_cli site --set branch-ikeja
+    python -m attendance_cli sync-export --to hq -o outbox/
+    python -m attendance_cli sync-import inbox/*.sync.gz --on-conflict merge
+    python -m attendance_cli serve --host 0.0.0.0 --port 8765
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+from datetime import date
+
+from database import DatabaseManager
+from database.backup import KEEP_SNAPSHOTS, backup_database
+from database.maintenance import enable_incremental_vacuum
+from database.scheduler import JOBS, Scheduler
+from database.sync import CONFLICT_RULES, export_changes, get_site_id, import_changes, set_site_id
+from utils import (
+    export_to_csv, format_attendance_record, format_day, format_timestamp_for_display, parse_day, day_number,
+    validate_staff_id
+)
+
+
+ATTENDANCE_HEADERS = ['Staff ID', 'Name', 'Department', 'Date', 'Time In', 'Time Out']
+ABSENCE_HEADERS = ['Date', 'Staff ID', 'Name', 'Department']
+
+# The keys of database.history_import.CONFLICT_POLICIES; that module is only
+# imported by import-history (its process pool would slow down every command)
+HISTORY_CONFLICT_POLICIES = ("merge", "replace", "skip")
+
+# Defaults of the serve command, kept equal to database.api's, which is only
+# imported when serving (http.server would slow down every other command)
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+
+
+def export_command(db: DatabaseManager, args) -> int:
+    """Export attendance records or absences, optionally limited to a date range, to CSV"""
+    start_day = parse_day(args.start) if args.start else 0
+    end_day = parse_day(args.end) if args.end else day_number(date.today())
+    # Records are formatted and written as they are fetched, so memory use does
+    # not grow with the size of the range
+    exported = 0
+
+    def records():
+        nonlocal exported
+        if args.absences:
+            for day, staff_id, name, department in db.iter_absences(start_day, end_day, args.department):
+                exported += 1
+                yield (format_day(day), staff_id, name, department)
+        else:
+            for record in db.iter_attendance({"start_day": start_day, "end_day": end_day,
+                                              "department": args.department}):
+                exported += 1
+                yield format_attendance_record(record)
+
+    headers = ABSENCE_HEADERS if args.absences else ATTENDANCE_HEADERS
+    if args.output == "-":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(headers)
+        writer.writerows(records())
+        return 0
+
+    if not export_to_csv(records(), headers, args.output):
+        return 1
+    kind = "absences" if args.absences else "attendance records"
+    print(f"Exported {exported} {kind} to {args.output}", file=sys.stderr)
+    return 0
+
+
+def import_command(db: DatabaseManager, args) -> int:
+    """Register staff from a CSV file with Staff ID, Name and Department columns"""
+    valid = 0
+    rejected = 0
+
+    def rows(reader):
+        # Valid rows are handed to the insert as they are read from the file
+        nonlocal valid, rejected
+        for row in reader:
+            if len(row) < 3 or not validate_staff_id(row[0].strip()) or not row[1].strip() or not row[2].strip():
+                rejected += 1
+                continue
+            valid += 1
+            yield (row[0].strip(), row[1].strip(), row[2].strip())
+
+    with open(args.file, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        if not args.no_header:
+            next(reader, None)
+        added = db.import_staff(rows(reader))
+    print(f"Added {added} staff, skipped {valid - added} existing IDs, rejected {rejected} invalid rows")
+    return 0
+
+
+def import_history_command(db: DatabaseManager, args) -> int:
+    """Bulk import historical attendance CSV files from other systems"""
+    from database.history_import import import_history
+    try:
+        result = import_history(db.db_path, args.files, args.on_conflict, args.workers, rejects_path=args.rejects)
+    except ValueError as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Imported history: {result.describe()}")
+    return 0
+
+
+def report_command(db: DatabaseManager, args) -> int:
+    """Print the hours-worked and punctuality report"""
+    # NumPy is only needed for this command
+    from utils.analytics import attendance_report, seconds_to_time
+
+    end = args.end or date.today().strftime("%Y-%m-%d")
+    start = args.start or end
+    rows = attendance_report(db.db_path, start, end, args.by)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow([
+        "Staff ID" if args.by == "staff" else "Department", "Name", "Days Present", "Total Hours",
+        "Mean Arrival", "Median Arrival", "90th Pct Arrival", "Late %", "Early Departures"
+    ])
+    for key, label, days, hours, mean_arrival, median_arrival, p90_arrival, late_share, early in rows:
+        writer.writerow([
+            key, label, days, f"{hours:.1f}",
+            seconds_to_time(mean_arrival), seconds_to_time(median_arrival), seconds_to_time(p90_arrival),
+            f"{late_share:.0%}", early
+        ])
+    return 0
+
+
+def absences_command(db: DatabaseManager, args) -> int:
+    """Print working-day absences, longest absence streak and attendance rate per staff member"""
+    from utils.analytics import absence_report
+
+    if args.rebuild:
+        db.rebuild_presence()
+    end = args.end or date.today().strftime("%Y-%m-%d")
+    start = args.start or end[:4] + "-01-01"
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow([
+        "Staff ID", "Name", "Department", "Working Days", "Days Present", "Days Absent",
+        "Longest Absence", "Attendance Rate"
+    ])
+    for staff_id, name, department, working, present, absent, streak, rate in \
+            absence_report(db.db_path, start, end, args.department):
+        writer.writerow([staff_id, name, department, working, present, absent, streak, f"{rate:.0%}"])
+    return 0
+
+
+def punch_command(db: DatabaseManager, args) -> int:
+    """Log attendance for one or more staff IDs"""
+    status = 0
+    for staff_id in args.staff_ids:
+        result = db.log_attendance(staff_id)
+        if not result:
+            print(f"{staff_id}: Invalid staff ID")
+            status = 1
+        else:
+            print(f"{staff_id}: {result.action} ({result.staff.name})")
+    return status
+
+
+def run_job_command(db: DatabaseManager, args) -> int:
+    """Run a maintenance job immediately, recording it like a scheduled run"""
+    status, message = Scheduler(db.db_path).run_job(args.job)
+    print(f"{args.job}: {status} ({message})")
+    return 0 if status == "ok" else 1
+
+
+def holiday_command(db: DatabaseManager, args) -> int:
+    """List, add or remove public holidays in the working-day calendar"""
+    if args.action == "list":
+        year = args.year or date.today().year
+        for day, name in db.get_holidays(parse_day(f"{year}-01-01"), parse_day(f"{year}-12-31")):
+            print(f"{format_day(day)}  {name}")
+        return 0
+
+    name = args.name if args.action == "add" else None
+    return 0 if db.set_holiday(parse_day(args.date), name) else 1
+
+
+def backup_command(db: DatabaseManager, args) -> int:
+    """Take a verified online snapshot of the database, keeping the newest ones"""
+    result = backup_database(db.db_path, args.dir, args.keep)
+    print(f"Backed up {result.describe()}")
+    return 0
+
+
+def vacuum_command(db: DatabaseManager, args) -> int:
+    """Convert the database to incremental vacuum; blocks kiosk punches until done, so run it off-peak"""
+    conn = sqlite3.connect(db.db_path, timeout=30)
+    try:
+        print(enable_incremental_vacuum(conn))
+    finally:
+        conn.close()
+    return 0
+
+
+def audit_command(db: DatabaseManager, args) -> int:
+    """Print the newest audit log entries, newest first, as CSV"""
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["Time", "Actor", "Source", "Table", "Key", "Action", "Before", "After"])
+    for at, *entry in db.get_audit_log(args.key, args.limit):
+        writer.writerow([format_timestamp_for_display(at), *entry])
+    return 0
+
+
+def site_command(db: DatabaseManager, args) -> int:
+    """Print or rename this database's sync site ID"""
+    if args.set:
+        try:
+            set_site_id(db.db_path, args.set)
+        except ValueError as e:
+            print(f"Invalid site ID: {e}", file=sys.stderr)
+            return 1
+    print(get_site_id(db.read_connection().cursor()))
+    return 0
+
+
+def sync_export_command(db: DatabaseManager, args) -> int:
+    """Write the changes since the last export to a peer site to a change file"""
+    try:
+        result = export_changes(db.db_path, args.to, args.output, args.full)
+    except ValueError as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {result.describe()}")
+    return 0
+
+
+def sync_import_command(db: DatabaseManager, args) -> int:
+    """Merge change files from other sites, oldest first"""
+    status = 0
+    for path in sorted(args.files):
+        try:
+            result = import_changes(db.db_path, path, args.on_conflict)
+        except (ValueError, OSError) as e:
+            print(f"{path}: import failed: {e}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"Imported {result.describe()}")
+    return status
+
+
+def serve_command(db: DatabaseManager, args) -> int:
+    """Serve the read-only HTTP API until interrupted"""
+    from database.api import serve
+
+    def ready(server):
+        host, port = server.server_address[:2]
+        print(f"Serving the attendance API on http://{host}:{port}/ (Ctrl+C to stop)", flush=True)
+    try:
+        serve(db.db_path, args.host, args.port, ready)
+    except OSError as e:
+        print(f"Cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="attendance_cli", description="Attendance system command-line tools")
+    parser.add_argument("--db", default="attendance.db", help="Path to the attendance database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export attendance records to CSV")
+    export_parser.add_argument("--from", dest="start", help="First date (YYYY-MM-DD)")
+    export_parser.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD), default today")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file, '-' for stdout")
+    export_parser.add_argument("--department", help="Only this department")
+    export_parser.add_argument("--absences", action="store_true",
+                               help="Export the working days staff did not sign in instead of attendance")
+    export_parser.set_defaults(handler=export_command)
+
+    import_parser = commands.add_parser("import", help="Register staff from a CSV file")
+    import_parser.add_argument("file", help="CSV file with Staff ID, Name, Department columns")
+    import_parser.add_argument("--no-header", action="store_true", help="The file has no header row")
+    import_parser.set_defaults(handler=import_command)
+
+    history_parser = commands.add_parser("import-history", help="Bulk import historical attendance CSV files")
+    history_parser.add_argument("files", nargs="+", metavar="FILE",
+                                help="CSV files with at least Staff ID, Date and Time In columns")
+    history_parser.add_argument("--on-conflict", choices=HISTORY_CONFLICT_POLICIES, default="skip",
+                                help="What to do with a staff member's day that already has a record")
+    history_parser.add_argument("--workers", type=int, help="Parsing processes, default one per CPU")
+    history_parser.add_argument("--rejects", help="Write rejected rows and the reason to this CSV file")
+    history_parser.set_defaults(handler=import_history_command)
+
+    report_parser = commands.add_parser("report", help="Print the hours-worked and punctuality report as CSV")
+    report_parser.add_argument("--from", dest="start", help="First date (YYYY-MM-DD), default the last date")
+    report_parser.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD), default today")
+    report_parser.add_argument("--by", choices=["staff", "department"], default="staff")
+    report_parser.set_defaults(handler=report_command)
+
+    absences_parser = commands.add_parser("absences", help="Print absences on working days per staff member as CSV")
+    absences_parser.add_argument("--from", dest="start", help="First date (YYYY-MM-DD), default January 1st")
+    absences_parser.add_argument("--to", dest="end", help="Last date (YYYY-MM-DD), default today")
+    absences_parser.add_argument("--department", help="Only staff of this department")
+    absences_parser.add_argument("--rebuild", action="store_true", help="Rebuild the presence bitmaps first")
+    absences_parser.set_defaults(handler=absences_command)
+
+    punch_parser = commands.add_parser("punch", help="Log attendance for staff IDs")
+    punch_parser.add_argument("staff_ids", nargs="+", metavar="STAFF_ID")
+    punch_parser.set_defaults(handler=punch_command)
+
+    job_parser = commands.add_parser("run-job", help="Run a scheduled maintenance job now")
+    job_parser.add_argument("job", choices=sorted(JOBS))
+    job_parser.set_defaults(handler=run_job_command)
+
+    holiday_parser = commands.add_parser("holiday", help="Manage public holidays")
+    holiday_actions = holiday_parser.add_subparsers(dest="action", required=True)
+    holiday_list = holiday_actions.add_parser("list", help="List the holidays of a year")
+    holiday_list.add_argument("--year", type=int, help="Default this year")
+    holiday_add = holiday_actions.add_parser("add", help="Mark a date as a public holiday")
+    holiday_add.add_argument("date", help="YYYY-MM-DD")
+    holiday_add.add_argument("name")
+    holiday_remove = holiday_actions.add_parser("remove", help="Make a date an ordinary day again")
+    holiday_remove.add_argument("date", help="YYYY-MM-DD")
+    holiday_parser.set_defaults(handler=holiday_command)
+
+    backup_parser = commands.add_parser("backup", help="Take an online snapshot of the database")
+    backup_parser.add_argument("--dir", help="Snapshot directory, default 'backups' next to the database")
+    backup_parser.add_argument("--keep", type=int, default=KEEP_SNAPSHOTS, help="Number of snapshots to keep")
+    backup_parser.set_defaults(handler=backup_command)
+
+    vacuum_parser = commands.add_parser(
+        "vacuum", help="Switch an older database to incremental vacuum (one-time full VACUUM, run off-peak)"
+    )
+    vacuum_parser.set_defaults(handler=vacuum_command)
+
+    audit_parser = commands.add_parser("audit", help="Print the audit log of changes as CSV")
+    audit_parser.add_argument("--key", help="Only changes of this staff ID, department or date (YYYY-MM-DD)")
+    audit_parser.add_argument("--limit", type=int, default=100, help="Number of entries, default 100")
+    audit_parser.set_defaults(handler=audit_command)
+
+    site_parser = commands.add_parser("site", help="Print this database's sync site ID")
+    site_parser.add_argument("--set", metavar="SITE_ID", help="Rename the site (before the first sync)")
+    site_parser.set_defaults(handler=site_command)
+
+    sync_export_parser = commands.add_parser("sync-export", help="Write changes since the last sync to a file")
+    sync_export_parser.add_argument("--to", required=True, metavar="SITE_ID", help="Site the file is for")
+    sync_export_parser.add_argument("-o", "--output", help="Output file or directory, default a numbered file here")
+    sync_export_parser.add_argument("--full", action="store_true", help="Send all rows, e.g. after a lost file")
+    sync_export_parser.set_defaults(handler=sync_export_command)
+
+    sync_import_parser = commands.add_parser("sync-import", help="Merge change files from other sites")
+    sync_import_parser.add_argument("files", nargs="+", metavar="FILE")
+    sync_import_parser.add_argument("--on-conflict", choices=sorted(CONFLICT_RULES), default="merge",
+                                    help="Which record wins for a day recorded at both sites")
+    sync_import_parser.set_defaults(handler=sync_import_command)
+
+    serve_parser = commands.add_parser("serve", help="Serve staff and attendance as read-only JSON over HTTP")
+    serve_parser.add_argument("--host", default=API_HOST,
+                              help=f"Address to listen on, default {API_HOST}; 0.0.0.0 for the LAN")
+    serve_parser.add_argument("--port", type=int, default=API_PORT, help=f"Default {API_PORT}")
+    serve_parser.set_defaults(handler=serve_command)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    db = DatabaseManager(args.db)
+    return args.handler(db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,20 +4,131 @@ Database module for the attendance system using SQLite
 
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils import day_number, format_day
+from .audit import AuditLog, changed_fields, init_audit_table
+from .presence import mark_present, rebuild_presence
+from .records import AttendanceRecord, PunchResult, Staff, row_factory
+from .sync import init_sync_tables
+from .workdays import absences_query, extend_calendar
+from .policy import PolicyBook, ShiftPolicy, DEFAULT_POLICY, MONDAY_TO_FRIDAY, LATENESS_SQL, lateness_sql_for
+
+
+def build_search_query(text: str) -> str:
+    """Turn free text typed by the user into an FTS5 prefix query"""
+    # Quote every word so characters like '-' or '*' are never parsed as FTS syntax
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def connect_readonly(db_path: str, **kwargs) -> sqlite3.Connection:
+    """Open a read-only connection, for reports that must never write or hold write locks"""
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True, **kwargs)
+
+
+# Repeated punches by the same staff member within this many seconds are
+# treated as one (double Enter, fingerprint reader firing twice)
+PUNCH_DEBOUNCE_SECONDS = 60
+
+# Rows fetched per round trip by the streaming iterators
+FETCH_BATCH_SIZE = 1000
+
+# Filters accepted by iter_attendance and the condition each one adds
+ATTENDANCE_FILTERS = {
+    "start_day": "date >= ?",
+    "end_day": "date <= ?",
+    "staff_id": "staff_id = ?",
+    "department": "department = ?",
+}
+
+# Number of read query results kept in memory, least recently used dropped first
+QUERY_CACHE_SIZE = 64
+
+# Rows per page of the admin tables
+PAGE_SIZE = 200
+
+# Columns the admin tables can be sorted and filtered by; each one is indexed
+STAFF_COLUMNS = ("staff_id", "name", "department")
+ATTENDANCE_COLUMNS = ("staff_id", "name", "department", "date", "time_in", "time_out")
+
+# Filters on these columns match values starting with the typed text, as a
+# range over the column's index (case-sensitive); others match exactly
+PREFIX_FILTER_COLUMNS = ("staff_id", "name", "department")
+PREFIX_END = "\U0010ffff"
+
+
+def page_clauses(columns, sort: str, descending: bool, filters: Optional[Dict[str, object]], tiebreak: str):
+    """WHERE conditions, their parameters and the ORDER BY clause of an admin table page
+    
+    Column names are checked against columns, so only whitelisted names reach
+    the SQL text; tiebreak makes the order total, so pages never overlap
+    """
+    if sort not in columns:
+        raise ValueError(f"Cannot sort by {sort}")
+    
+    conditions = []
+    params = []
+    for column, value in (filters or {}).items():
+        if column not in columns:
+            raise ValueError(f"Cannot filter by {column}")
+        if value is None or value == "":
+            continue
+        if column in PREFIX_FILTER_COLUMNS:
+            conditions.append(f"{column} >= ? AND {column} < ?")
+            params += [value, value + PREFIX_END]
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    
+    direction = " DESC" if descending else ""
+    return conditions, params, f"ORDER BY {sort}{direction}, {tiebreak}{direction}"
 
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "attendance.db"):
+    def __init__(self, db_path: str = "attendance.db", punch_debounce: float = PUNCH_DEBOUNCE_SECONDS,
+                 cache_size: int = QUERY_CACHE_SIZE, audit_source: str = "admin", actor: Optional[str] = None):
         self.db_path = db_path
+        self.punch_debounce = punch_debounce
+        # (query, params) -> result of read queries, valid while cache_version holds
+        self.query_cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+        self.cache_version = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Bumped by every write through this manager; data_version covers other connections
+        self.write_count = 0
+        self.version_conn = None
+        # staff_id -> (monotonic time, result) of the last punch that reached the database
+        self.last_punches = {}
+        self.punch_lock = threading.Lock()
+        # Read-only report connections, one per thread
+        self.readers = threading.local()
         self.init_database()
+        # Changes are audited as made by actor (default the OS account) through audit_source
+        self.audit = AuditLog(db_path)
+        self.audit_source = audit_source
+        self.actor = actor
     
     def init_database(self):
         """Initialize the database with required tables"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Lets nightly maintenance release free pages in small steps. It only takes
+        # effect on a new database (so it has to come before the journal mode, which
+        # initializes the file); existing ones are converted once by `attendance_cli vacuum`
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        
+        # Write-ahead logging lets report queries read a snapshot while the kiosk writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Check if the old staff table exists and migrate if needed
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='staff';")
         table_exists = cursor.fetchone()
@@ -113,8 +224,8 @@ class DatabaseManager:
                     # Get staff info to set name and department
                     staff_info = self.get_staff(staff_id)
                     if staff_info:
-                        name = staff_info[1]
-                        department = staff_info[2]
+                        name = staff_info.name
+                        department = staff_info.department
                     else:
                         name = "Unknown"
                         department = "Unknown"
@@ -130,35 +241,393 @@ class DatabaseManager:
                         staff_id TEXT NOT NULL,
                         name TEXT NOT NULL,
                         department TEXT NOT NULL,
-                        date TEXT NOT NULL,
-                        time_in TEXT,
-                        time_out TEXT,
-                        timestamp_in DATETIME,
-                        timestamp_out DATETIME,
+                        date INTEGER NOT NULL,
+                        time_in INTEGER,
+                        time_out INTEGER,
                         UNIQUE(staff_id, date)
                     )
                 ''')
         else:
             # Create new attendance table if it doesn't exist
             # Include name and department to preserve historical data when staff is deleted
+            # date is a day number (days since 1970-01-01), time_in/time_out are epoch seconds
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS attendance (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     staff_id TEXT NOT NULL,
                     name TEXT NOT NULL,
                     department TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    time_in TEXT,
-                    time_out TEXT,
-                    timestamp_in DATETIME,
-                    timestamp_out DATETIME,
+                    date INTEGER NOT NULL,
+                    time_in INTEGER,
+                    time_out INTEGER,
                     UNIQUE(staff_id, date)
                 )
             ''')
-        
+
+        self.migrate_epoch_columns(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_time_in ON attendance(time_in)")
+        # Sorting and filtering of the admin tables (staff_id is covered by the UNIQUE index)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_time_out ON attendance(time_out)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_name ON attendance(name)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_department ON attendance(department)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_staff_name ON staff(name)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_staff_department ON staff(department)")
+
+        self.init_search_index(cursor)
+        self.init_shift_policies(cursor)
+        self.init_revisions(cursor)
+        self.init_job_tables(cursor)
+        self.init_presence(cursor)
+        self.init_calendar(cursor)
+        self.init_photos(cursor)
+        init_audit_table(cursor)
+        init_sync_tables(cursor)
+
         conn.commit()
         conn.close()
-    
+
+    def read_connection(self) -> sqlite3.Connection:
+        """Get this thread's read-only connection for listing and report queries
+        
+        In WAL mode its reads work on a snapshot, so a long report or export
+        neither blocks nor waits for the kiosk's punches
+        """
+        conn = getattr(self.readers, "conn", None)
+        if conn is None:
+            conn = connect_readonly(self.db_path)
+            self.readers.conn = conn
+        return conn
+
+    def data_version(self) -> tuple:
+        """Token that changes whenever anything is committed to the database"""
+        with self.cache_lock:
+            # data_version values are only comparable on one connection, so every
+            # thread checks through the same one
+            if self.version_conn is None:
+                self.version_conn = connect_readonly(self.db_path, check_same_thread=False)
+            version = self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+            return version, self.write_count
+
+    def cached(self, key, load):
+        """Return load() for the key, reusing the last result while the database is unchanged
+        
+        Results are shared between callers and must not be modified
+        """
+        version = self.data_version()
+        with self.cache_lock:
+            if version != self.cache_version:
+                self.query_cache.clear()
+                self.cache_version = version
+            elif key in self.query_cache:
+                self.query_cache.move_to_end(key)
+                self.cache_hits += 1
+                return self.query_cache[key]
+            self.cache_misses += 1
+        
+        # Loaded outside the lock so slow reports don't hold up other readers. A
+        # commit in between only makes the result newer than the version it is
+        # stored under, and the next lookup clears it anyway.
+        result = load()
+        with self.cache_lock:
+            if version == self.cache_version:
+                self.query_cache[key] = result
+                if len(self.query_cache) > self.cache_size:
+                    self.query_cache.popitem(last=False)
+        return result
+
+    def cached_query(self, query: str, params: tuple = (), record=None) -> List[tuple]:
+        """Run a read query on this thread's read connection through the result cache
+        
+        Rows are built as record instances (see database.records) when a record class is given
+        """
+        def load():
+            cursor = self.read_connection().cursor()
+            if record is not None:
+                cursor.row_factory = row_factory(record)
+            return cursor.execute(query, params).fetchall()
+        return self.cached((query, params, record), load)
+
+    def cache_stats(self) -> dict:
+        """Hit and miss counts and current size of the read query cache"""
+        with self.cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "size": len(self.query_cache),
+                "capacity": self.cache_size,
+            }
+
+    def log_change(self, table: str, key: Optional[str], action: str, before: Optional[dict] = None,
+                   after: Optional[dict] = None, actor: Optional[str] = None, source: Optional[str] = None):
+        """Add a committed change to the audit log (buffered, written in batches)"""
+        self.audit.record(table, key, action, before, after, actor or self.actor, source or self.audit_source)
+
+    def get_audit_log(self, row_key: Optional[str] = None, limit: int = 100) -> List[tuple]:
+        """Get the newest audit entries, optionally only those of one key (staff ID, department or date)
+        
+        Rows are (at, actor, source, table_name, row_key, action, before, after)
+        """
+        # Entries still buffered by this manager would otherwise be missing
+        self.audit.flush()
+        where = "WHERE row_key = ?" if row_key is not None else ""
+        params = (row_key, limit) if row_key is not None else (limit,)
+        return self.read_connection().execute(f'''
+            SELECT at, actor, source, table_name, row_key, action, before, after
+            FROM audit_log {where}
+            ORDER BY at DESC, id DESC
+            LIMIT ?
+        ''', params).fetchall()
+
+    def migrate_epoch_columns(self, cursor):
+        """Convert attendance rows stored as date/time strings to integer day numbers and epoch seconds"""
+        cursor.execute("PRAGMA table_info(attendance)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'timestamp_in' not in columns:
+            return
+
+        cursor.execute("ALTER TABLE attendance RENAME TO attendance_text")
+        cursor.execute('''
+            CREATE TABLE attendance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                staff_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                department TEXT NOT NULL,
+                date INTEGER NOT NULL,
+                time_in INTEGER,
+                time_out INTEGER,
+                UNIQUE(staff_id, date)
+            )
+        ''')
+
+        # The text values are local times; the 'utc' modifier converts them to UTC epoch seconds
+        cursor.execute('''
+            INSERT INTO attendance (id, staff_id, name, department, date, time_in, time_out)
+            SELECT id, staff_id, name, department,
+                   CAST(julianday(date) - 2440587.5 AS INTEGER),
+                   CAST(strftime('%s', date || ' ' || time_in, 'utc') AS INTEGER),
+                   CAST(strftime('%s', date || ' ' || time_out, 'utc') AS INTEGER)
+            FROM attendance_text
+        ''')
+        cursor.execute("DROP TABLE attendance_text")
+
+    def init_shift_policies(self, cursor):
+        """Create the shift policy table and the stored lateness of each attendance row"""
+        # department '' holds the default policy; start_time is seconds since midnight
+        # and working_days a bitmask with Monday as bit 0
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shift_policy (
+                department TEXT PRIMARY KEY,
+                start_time INTEGER NOT NULL,
+                grace_minutes INTEGER NOT NULL DEFAULT 0,
+                working_days INTEGER NOT NULL
+            )
+        ''')
+        # Seed the default with the rule the kiosk always used: late after 08:30, Monday to Friday
+        cursor.execute(
+            "INSERT OR IGNORE INTO shift_policy (department, start_time, grace_minutes, working_days) VALUES (?, ?, ?, ?)",
+            (DEFAULT_POLICY, 8 * 3600 + 30 * 60, 0, MONDAY_TO_FRIDAY)
+        )
+
+        cursor.execute("PRAGMA table_info(attendance)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'late_seconds' not in columns:
+            cursor.execute("ALTER TABLE attendance ADD COLUMN late_seconds INTEGER")
+            cursor.execute(LATENESS_SQL)
+
+        self.policies = PolicyBook.load(cursor)
+
+    def init_job_tables(self, cursor):
+        """Create the tables used by the background job scheduler"""
+        # Records closed by the nightly job get an end-of-day time_out and this flag
+        cursor.execute("PRAGMA table_info(attendance)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'auto_closed' not in columns:
+            cursor.execute("ALTER TABLE attendance ADD COLUMN auto_closed INTEGER NOT NULL DEFAULT 0")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_summary (
+                date INTEGER NOT NULL,
+                department TEXT NOT NULL,
+                present INTEGER NOT NULL,
+                late INTEGER NOT NULL,
+                signed_out INTEGER NOT NULL,
+                PRIMARY KEY (date, department)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job TEXT NOT NULL,
+                started_at INTEGER NOT NULL,
+                duration_ms INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job, started_at)")
+        # The scheduler (of any application instance) running a job, until expires_at
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_leases (
+                job TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at INTEGER NOT NULL
+            )
+        ''')
+        # Sizes in bytes and probe query timings before and after each maintenance run
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at INTEGER NOT NULL,
+                size_before INTEGER NOT NULL,
+                size_after INTEGER NOT NULL,
+                free_pages_before INTEGER NOT NULL,
+                free_pages_after INTEGER NOT NULL,
+                analyzed TEXT NOT NULL,
+                vacuumed INTEGER NOT NULL,
+                probe_ms_before REAL NOT NULL,
+                probe_ms_after REAL NOT NULL
+            )
+        ''')
+
+    def init_presence(self, cursor):
+        """Create the per-staff, per-year presence bitmaps, built from attendance the first time"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='presence';")
+        if cursor.fetchone():
+            return
+        cursor.execute('''
+            CREATE TABLE presence (
+                staff_id TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                bits BLOB NOT NULL,
+                PRIMARY KEY (staff_id, year)
+            ) WITHOUT ROWID
+        ''')
+        rebuild_presence(cursor)
+
+    def init_calendar(self, cursor):
+        """Create the working-day calendar, covering all attendance through the end of next year"""
+        # holiday names a public holiday, NULL on an ordinary day
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS calendar (
+                date INTEGER PRIMARY KEY,
+                holiday TEXT
+            )
+        ''')
+        today = date.today()
+        cursor.execute("SELECT MIN(date) FROM attendance")
+        first_day = cursor.fetchone()[0]
+        extend_calendar(
+            cursor,
+            min(first_day, day_number(today)) if first_day is not None else day_number(today),
+            day_number(date(today.year + 1, 12, 31))
+        )
+
+    def init_photos(self, cursor):
+        """Create the staff photo table (encoded image files, shown on the kiosk at each punch)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS staff_photo (
+                staff_id TEXT PRIMARY KEY,
+                photo BLOB NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        ''')
+
+    def init_revisions(self, cursor):
+        """Add a change counter (rev) to staff and attendance, bumped by triggers on every write"""
+        for table, key in (("staff", "rowid"), ("attendance", "id")):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            if 'rev' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+                # Existing rows get distinct revisions in insertion order
+                cursor.execute(f"UPDATE {table} SET rev = {key}")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_rev ON {table}(rev)")
+
+        # Each insert or update moves the row above the current highest revision.
+        # late_seconds is derived from the shift policy and does not count as a change.
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_rev_ai AFTER INSERT ON staff BEGIN
+                UPDATE staff SET rev = (SELECT MAX(rev) FROM staff) + 1 WHERE rowid = new.rowid;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_rev_au AFTER UPDATE OF staff_id, name, department ON staff BEGIN
+                UPDATE staff SET rev = (SELECT MAX(rev) FROM staff) + 1 WHERE rowid = new.rowid;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS attendance_rev_ai AFTER INSERT ON attendance BEGIN
+                UPDATE attendance SET rev = (SELECT MAX(rev) FROM attendance) + 1 WHERE id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS attendance_rev_au
+            AFTER UPDATE OF staff_id, name, department, date, time_in, time_out ON attendance BEGIN
+                UPDATE attendance SET rev = (SELECT MAX(rev) FROM attendance) + 1 WHERE id = new.id;
+            END
+        ''')
+
+        # Deletions leave no row to carry a revision, so they are counted per table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_deletes (
+                table_name TEXT PRIMARY KEY,
+                deletes INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for table in ("staff", "attendance"):
+            cursor.execute("INSERT OR IGNORE INTO table_deletes (table_name) VALUES (?)", (table,))
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_deletes_ad AFTER DELETE ON {table} BEGIN
+                    UPDATE table_deletes SET deletes = deletes + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+    def init_search_index(self, cursor):
+        """Create the FTS5 index over staff and the triggers that keep it in sync"""
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS staff_fts USING fts5(
+                staff_id, name, department,
+                content='staff', content_rowid='rowid',
+                prefix='2 3'
+            )
+        ''')
+
+        # Triggers are dropped together with the staff table (e.g. by the schema
+        # migration above), so their absence means the index has to be rebuilt
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='staff_fts_au';")
+        trigger = cursor.fetchone()
+        if trigger and "UPDATE OF" in trigger[0]:
+            return
+
+        # Older databases re-indexed on any update, including the rev bump of a new
+        # row, which can run before the row is indexed and corrupt the index; their
+        # triggers are replaced and the index rebuilt
+        for name in ("staff_fts_ai", "staff_fts_ad", "staff_fts_au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+        cursor.execute('''
+            CREATE TRIGGER staff_fts_ai AFTER INSERT ON staff BEGIN
+                INSERT INTO staff_fts (rowid, staff_id, name, department)
+                VALUES (new.rowid, new.staff_id, new.name, new.department);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER staff_fts_ad AFTER DELETE ON staff BEGIN
+                INSERT INTO staff_fts (staff_fts, rowid, staff_id, name, department)
+                VALUES ('delete', old.rowid, old.staff_id, old.name, old.department);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER staff_fts_au AFTER UPDATE OF staff_id, name, department ON staff BEGIN
+                INSERT INTO staff_fts (staff_fts, rowid, staff_id, name, department)
+                VALUES ('delete', old.rowid, old.staff_id, old.name, old.department);
+                INSERT INTO staff_fts (rowid, staff_id, name, department)
+                VALUES (new.rowid, new.staff_id, new.name, new.department);
+            END
+        ''')
+        cursor.execute("INSERT INTO staff_fts (staff_fts) VALUES ('rebuild')")
+
     def add_staff(self, staff_id: str, name: str, department: str):
         """Add a new staff member to the database"""
         conn = sqlite3.connect(self.db_path)
@@ -170,6 +639,8 @@ class DatabaseManager:
                 (staff_id, name, department)
             )
             conn.commit()
+            self.write_count += 1
+            self.log_change("staff", staff_id, "insert", after={"name": name, "department": department})
             return True
         except sqlite3.IntegrityError:
             # Staff ID already exists
@@ -177,10 +648,32 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_staff(self, staff_id: str) -> Optional[tuple]:
+    def import_staff(self, rows: Iterable[tuple]) -> int:
+        """Add many (staff_id, name, department) rows in one transaction, skipping existing IDs
+        
+        rows may be any iterable (e.g. a generator reading a file), it is consumed
+        as it is inserted. Returns the number of staff added
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO staff (staff_id, name, department) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            self.write_count += 1
+            self.log_change("staff", None, "import", after={"added": cursor.rowcount}, source="import")
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def get_staff(self, staff_id: str) -> Optional[Staff]:
         """Get staff information by ID"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(Staff)
         
         cursor.execute("SELECT staff_id, name, department FROM staff WHERE staff_id = ?", (staff_id,))
         result = cursor.fetchone()
@@ -188,20 +681,43 @@ class DatabaseManager:
         conn.close()
         return result
     
-    def log_attendance(self, staff_id: str):
-        """Log attendance for a staff member - first entry is sign-in, second is sign-out"""
+    def log_attendance(self, staff_id: str) -> Optional[PunchResult]:
+        """Log attendance for a staff member - first entry is sign-in, second is sign-out
+        
+        A repeated punch within punch_debounce seconds is answered with the
+        original result from memory instead of being logged again. Returns
+        None for an unknown staff ID
+        """
+        now = time.monotonic()
+        with self.punch_lock:
+            last_punch = self.last_punches.get(staff_id)
+            if last_punch is not None and now - last_punch[0] < self.punch_debounce:
+                return last_punch[1]
+            
+            result = self.record_punch(staff_id)
+            if result:
+                if len(self.last_punches) > 256:
+                    # Drop punches whose window has passed so the table stays small
+                    self.last_punches = {
+                        key: punch for key, punch in self.last_punches.items()
+                        if now - punch[0] < self.punch_debounce
+                    }
+                self.last_punches[staff_id] = (now, result)
+            return result
+    
+    def record_punch(self, staff_id: str) -> Optional[PunchResult]:
+        """Write a punch to the database and return the action taken"""
         # Check if staff exists
         staff = self.get_staff(staff_id)
         if not staff:
-            return False
+            return None
         
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         now = datetime.now()
-        date = now.strftime("%Y-%m-%d")
-        time = now.strftime("%H:%M:%S")
-        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        date = day_number(now.date())
+        timestamp = int(now.timestamp())
         
         # Check if there's already an attendance record for this staff member today
         cursor.execute(
@@ -211,41 +727,40 @@ class DatabaseManager:
         result = cursor.fetchone()
         
         if result is None:
-            # Get staff information to store with the attendance record
-            staff_info = self.get_staff(staff_id)
-            if staff_info:
-                name = staff_info[1]
-                department = staff_info[2]
-            else:
-                name = "Unknown"
-                department = "Unknown"
-            
             # First entry of the day - sign in
+            late_seconds = self.policies.late_seconds(staff.department, timestamp)
             cursor.execute(
-                "INSERT INTO attendance (staff_id, name, department, date, time_in, timestamp_in) VALUES (?, ?, ?, ?, ?, ?)",
-                (staff_id, name, department, date, time, timestamp)
+                "INSERT INTO attendance (staff_id, name, department, date, time_in, late_seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                (staff_id, staff.name, staff.department, date, timestamp, late_seconds)
             )
+            mark_present(cursor, staff_id, date)
             conn.commit()
+            self.write_count += 1
             conn.close()
-            return "Sign In"
+            self.log_change("attendance", staff_id, "sign_in",
+                            after={"date": format_day(date), "time_in": timestamp}, actor=staff_id)
+            return PunchResult("Sign In", staff, late_seconds)
         else:
             time_in, time_out = result
             if time_out is None:
                 # Second entry of the day - sign out
                 cursor.execute(
-                    "UPDATE attendance SET time_out = ?, timestamp_out = ? WHERE staff_id = ? AND date = ?",
-                    (time, timestamp, staff_id, date)
+                    "UPDATE attendance SET time_out = ? WHERE staff_id = ? AND date = ?",
+                    (timestamp, staff_id, date)
                 )
                 conn.commit()
+                self.write_count += 1
                 conn.close()
-                return "Sign Out"
+                self.log_change("attendance", staff_id, "sign_out", before={"time_out": None},
+                                after={"date": format_day(date), "time_out": timestamp}, actor=staff_id)
+                return PunchResult("Sign Out", staff)
             else:
                 # Already signed out for the day - don't log anything
                 conn.close()
-                return "Already Signed Out"
+                return PunchResult("Already Signed Out", staff)
     
-    def get_daily_attendance_count(self, staff_id: str, date: str) -> int:
-        """Get the count of attendance records for a staff member on a given date"""
+    def get_daily_attendance_count(self, staff_id: str, date: int) -> int:
+        """Get the count of attendance records for a staff member on a given day number"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -258,45 +773,215 @@ class DatabaseManager:
         conn.close()
         return count
     
-    def get_all_attendance(self) -> List[tuple]:
-        """Get all attendance records"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_all_attendance(self) -> List[AttendanceRecord]:
+        """Get all attendance records (date as day number, times as epoch seconds)"""
+        return self.cached_query('''
+            SELECT a.staff_id, a.name, a.department, a.date, a.time_in, a.time_out
+            FROM attendance a
+            ORDER BY a.time_in DESC
+        ''', record=AttendanceRecord)
+    
+    def get_all_staff(self) -> List[Staff]:
+        """Get all staff members"""
+        return self.cached_query("SELECT staff_id, name, department FROM staff ORDER BY name", record=Staff)
+
+    def search_staff(self, text: str, limit: int = 200) -> List[Staff]:
+        """Search staff by ID, name or department using the full-text index"""
+        query = build_search_query(text)
+        if not query:
+            return self.get_all_staff()
         
-        cursor.execute('''
+        return self.cached_query('''
+            SELECT s.staff_id, s.name, s.department
+            FROM staff_fts f
+            JOIN staff s ON s.rowid = f.rowid
+            WHERE staff_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, limit), Staff)
+    
+    def search_attendance(self, text: str, limit: int = 500) -> List[AttendanceRecord]:
+        """Search attendance records of staff matching the text in the full-text index"""
+        query = build_search_query(text)
+        if not query:
+            return self.get_all_attendance()
+        
+        return self.cached_query('''
             SELECT a.staff_id, a.name, a.department, a.date, a.time_in, a.time_out
             FROM attendance a
-            ORDER BY a.timestamp_in DESC
-        ''')
-        results = cursor.fetchall()
+            WHERE a.staff_id IN (SELECT staff_id FROM staff_fts WHERE staff_fts MATCH ?)
+            ORDER BY a.time_in DESC
+            LIMIT ?
+        ''', (query, limit), AttendanceRecord)
+    
+    def iter_attendance(self, filters: Optional[Dict[str, object]] = None, batch_size: int = FETCH_BATCH_SIZE,
+                        newest_first: bool = False) -> Iterator[AttendanceRecord]:
+        """Yield attendance records one at a time, without holding the whole result in memory
         
-        conn.close()
-        return results
+        Args:
+            filters: Optional conditions keyed by ATTENDANCE_FILTERS (start_day and
+                end_day are inclusive day numbers)
+            batch_size: Rows fetched from SQLite per round trip
+            newest_first: Order by sign-in time descending instead of oldest first
+        
+        Yields:
+            AttendanceRecord rows
+        """
+        conditions = []
+        params = []
+        for name, value in (filters or {}).items():
+            if name not in ATTENDANCE_FILTERS:
+                raise ValueError(f"Unknown attendance filter: {name}")
+            if value is not None:
+                conditions.append(ATTENDANCE_FILTERS[name])
+                params.append(value)
+        
+        query = "SELECT staff_id, name, department, date, time_in, time_out FROM attendance"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY time_in DESC" if newest_first else " ORDER BY date, time_in"
+        
+        return self.iter_query(query, params, batch_size, AttendanceRecord)
     
-    def get_all_staff(self) -> List[tuple]:
-        """Get all staff members"""
-        conn = sqlite3.connect(self.db_path)
+    def iter_absences(self, start_day: int, end_day: int, department: Optional[str] = None,
+                      batch_size: int = FETCH_BATCH_SIZE) -> Iterator[tuple]:
+        """Yield (date, staff_id, name, department) for every working day a staff member did not sign in
+        
+        Working days are the non-holiday calendar days on which the department's
+        shift policy works; ordered by day, then staff ID
+        """
+        query, params = absences_query(start_day, end_day, department)
+        return self.iter_query(query, params, batch_size)
+    
+    def iter_query(self, query: str, params, batch_size: int, record=None) -> Iterator[tuple]:
+        """Yield the rows of a read query, fetched batch_size at a time (as record instances if given)"""
+        # A connection of its own, so the generator can be consumed on any thread;
+        # the open statement keeps one snapshot for the whole iteration
+        conn = connect_readonly(self.db_path)
+        try:
+            cursor = conn.cursor()
+            if record is not None:
+                cursor.row_factory = row_factory(record)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+    
+    def get_staff_since(self, rev: int) -> List[tuple]:
+        """Get staff changed after a revision as (rev, staff_id, name, department), ordered by name"""
+        conn = self.read_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT staff_id, name, department FROM staff ORDER BY name")
+        cursor.execute(
+            "SELECT rev, staff_id, name, department FROM staff WHERE rev > ? ORDER BY name",
+            (rev,)
+        )
         results = cursor.fetchall()
+        return results
+    
+    def get_attendance_since(self, rev: int) -> List[tuple]:
+        """Get attendance records changed after a revision, newest sign-in first
         
-        conn.close()
+        Rows are (id, rev, staff_id, name, department, date, time_in, time_out)
+        """
+        conn = self.read_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, rev, staff_id, name, department, date, time_in, time_out
+            FROM attendance
+            WHERE rev > ?
+            ORDER BY time_in DESC
+        ''', (rev,))
+        results = cursor.fetchall()
         return results
     
+    def get_staff_page(self, sort: str = "name", descending: bool = False,
+                       filters: Optional[Dict[str, str]] = None, search: str = "",
+                       limit: int = PAGE_SIZE, offset: int = 0) -> List[tuple]:
+        """Get one page of staff as (rev, staff_id, name, department)
+        
+        Args:
+            sort: Column of STAFF_COLUMNS to order by
+            descending: Reverse the order
+            filters: Column of STAFF_COLUMNS -> text its values must start with
+            search: Free text matched against the full-text index
+            limit: Rows per page
+            offset: Rows skipped, i.e. the number already shown
+        """
+        conditions, params, order = page_clauses(STAFF_COLUMNS, sort, descending, filters, "rowid")
+        query = build_search_query(search)
+        if query:
+            conditions.append("rowid IN (SELECT rowid FROM staff_fts WHERE staff_fts MATCH ?)")
+            params.append(query)
+        
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return self.cached_query(
+            f"SELECT rev, staff_id, name, department FROM staff{where} {order} LIMIT ? OFFSET ?",
+            tuple(params) + (limit, offset)
+        )
+    
+    def get_attendance_page(self, sort: str = "time_in", descending: bool = True,
+                            filters: Optional[Dict[str, object]] = None, search: str = "",
+                            limit: int = PAGE_SIZE, offset: int = 0) -> List[tuple]:
+        """Get one page of attendance records, newest sign-in first by default
+        
+        Arguments are as for get_staff_page, with ATTENDANCE_COLUMNS (a date
+        filter is a day number). Rows are (id, rev, staff_id, name, department,
+        date, time_in, time_out)
+        """
+        conditions, params, order = page_clauses(ATTENDANCE_COLUMNS, sort, descending, filters, "id")
+        query = build_search_query(search)
+        if query:
+            conditions.append("staff_id IN (SELECT staff_id FROM staff_fts WHERE staff_fts MATCH ?)")
+            params.append(query)
+        
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return self.cached_query(
+            "SELECT id, rev, staff_id, name, department, date, time_in, time_out"
+            f" FROM attendance{where} {order} LIMIT ? OFFSET ?",
+            tuple(params) + (limit, offset)
+        )
+    
+    def get_revision(self, table: str) -> int:
+        """Get the highest revision in the staff or attendance table (0 when empty)"""
+        if table not in ("staff", "attendance"):
+            raise ValueError(f"Unknown table: {table}")
+        
+        return self.cached_query(f"SELECT COALESCE(MAX(rev), 0) FROM {table}")[0][0]
+    
+    def get_delete_count(self, table: str) -> int:
+        """Get the number of rows ever deleted from the staff or attendance table"""
+        if table not in ("staff", "attendance"):
+            raise ValueError(f"Unknown table: {table}")
+        
+        return self.cached_query("SELECT deletes FROM table_deletes WHERE table_name = ?", (table,))[0][0]
+    
     def update_staff(self, staff_id: str, name: str, department: str) -> bool:
         """Update staff information"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
+            cursor.execute("SELECT name, department FROM staff WHERE staff_id = ?", (staff_id,))
+            old = cursor.fetchone()
             cursor.execute(
                 "UPDATE staff SET name = ?, department = ? WHERE staff_id = ?",
                 (name, department, staff_id)
             )
             conn.commit()
+            self.write_count += 1
             updated = cursor.rowcount > 0
             conn.close()
+            if updated:
+                before, after = changed_fields(
+                    {"name": old[0], "department": old[1]}, {"name": name, "department": department}
+                )
+                self.log_change("staff", staff_id, "update", before, after)
             return updated
         except Exception as e:
             conn.close()
@@ -311,11 +996,175 @@ class DatabaseManager:
             # Delete only the staff record, not the attendance records
             # This allows us to keep historical attendance for audit purposes
             # while preventing the staff member from logging new attendance
+            cursor.execute("SELECT name, department FROM staff WHERE staff_id = ?", (staff_id,))
+            old = cursor.fetchone()
             cursor.execute("DELETE FROM staff WHERE staff_id = ?", (staff_id,))
+            cursor.execute("DELETE FROM staff_photo WHERE staff_id = ?", (staff_id,))
             conn.commit()
-            deleted = cursor.rowcount > 0
+            self.write_count += 1
             conn.close()
-            return deleted
+            if old:
+                self.log_change("staff", staff_id, "delete", before={"name": old[0], "department": old[1]})
+            return old is not None
         except Exception as e:
             conn.close()
-            return False
\ No newline at end of file
+            return False
+    
+    def get_staff_photo(self, staff_id: str) -> Optional[bytes]:
+        """Get the encoded photo of a staff member, None if they have none"""
+        # Not cached: photos are large and the kiosk keeps its own decoded thumbnails
+        row = self.read_connection().execute(
+            "SELECT photo FROM staff_photo WHERE staff_id = ?", (staff_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set_staff_photo(self, staff_id: str, photo: Optional[bytes]) -> bool:
+        """Store an encoded image (JPEG/PNG) as a staff member's photo, or remove it when photo is None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            if photo is None:
+                cursor.execute("DELETE FROM staff_photo WHERE staff_id = ?", (staff_id,))
+            else:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO staff_photo (staff_id, photo, updated_at) VALUES (?, ?, ?)",
+                    (staff_id, photo, int(time.time()))
+                )
+            conn.commit()
+            self.write_count += 1
+            # The image itself is not copied into the log
+            if photo is None:
+                self.log_change("staff_photo", staff_id, "delete")
+            else:
+                self.log_change("staff_photo", staff_id, "update", after={"bytes": len(photo)})
+            return True
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+    
+    def get_early_arrivers(self, limit: int, days: int = 30) -> List[str]:
+        """Get the IDs of staff with photos who signed in earliest on average over the last days"""
+        start_day = day_number(date.today()) - days
+        rows = self.read_connection().execute('''
+            SELECT a.staff_id
+            FROM attendance a
+            JOIN staff_photo p ON p.staff_id = a.staff_id
+            WHERE a.date >= ? AND a.time_in IS NOT NULL
+            GROUP BY a.staff_id
+            ORDER BY AVG(CAST(strftime('%s', a.time_in, 'unixepoch', 'localtime') AS INTEGER) - a.date * 86400)
+            LIMIT ?
+        ''', (start_day, limit)).fetchall()
+        return [row[0] for row in rows]
+    
+    def get_shift_policies(self) -> List[ShiftPolicy]:
+        """Get all shift policies, the default ('' department) first"""
+        rows = self.cached_query(
+            "SELECT department, start_time, grace_minutes, working_days FROM shift_policy ORDER BY department"
+        )
+        return [ShiftPolicy(*row) for row in rows]
+    
+    def set_shift_policy(self, department: str, start_time: int, grace_minutes: int, working_days: int) -> bool:
+        """Create or replace the shift policy of a department and recompute historical lateness"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            old = self.policy_values(cursor, department)
+            cursor.execute(
+                "INSERT OR REPLACE INTO shift_policy (department, start_time, grace_minutes, working_days) VALUES (?, ?, ?, ?)",
+                (department, start_time, grace_minutes, working_days)
+            )
+            cursor.execute(*lateness_sql_for(department))
+            conn.commit()
+            self.write_count += 1
+            self.policies = PolicyBook.load(cursor)
+            new = {"start_time": start_time, "grace_minutes": grace_minutes, "working_days": working_days}
+            if old is None:
+                self.log_change("shift_policy", department, "insert", after=new)
+            else:
+                self.log_change("shift_policy", department, "update", *changed_fields(old, new))
+            return True
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+    
+    def delete_shift_policy(self, department: str) -> bool:
+        """Remove a department override (the default policy cannot be deleted)"""
+        if department == DEFAULT_POLICY:
+            return False
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            old = self.policy_values(cursor, department)
+            cursor.execute("DELETE FROM shift_policy WHERE department = ?", (department,))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                # The department falls back to the default policy
+                cursor.execute(*lateness_sql_for(department))
+            conn.commit()
+            self.write_count += 1
+            self.policies = PolicyBook.load(cursor)
+            if deleted:
+                self.log_change("shift_policy", department, "delete", before=old)
+            return deleted
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+    
+    def policy_values(self, cursor, department: str) -> Optional[dict]:
+        """The stored fields of a department's policy, for the audit log"""
+        cursor.execute(
+            "SELECT start_time, grace_minutes, working_days FROM shift_policy WHERE department = ?", (department,)
+        )
+        row = cursor.fetchone()
+        return dict(zip(("start_time", "grace_minutes", "working_days"), row)) if row else None
+    
+    def get_holidays(self, start_day: int, end_day: int) -> List[tuple]:
+        """Get the (date, name) of public holidays between two day numbers (inclusive)"""
+        return self.cached_query(
+            "SELECT date, holiday FROM calendar WHERE date BETWEEN ? AND ? AND holiday IS NOT NULL ORDER BY date",
+            (start_day, end_day)
+        )
+    
+    def set_holiday(self, day: int, name: Optional[str]) -> bool:
+        """Mark a day as a public holiday, or as an ordinary day again when name is None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            extend_calendar(cursor, day, day)
+            cursor.execute("SELECT holiday FROM calendar WHERE date = ?", (day,))
+            old = cursor.fetchone()[0]
+            cursor.execute("UPDATE calendar SET holiday = ? WHERE date = ?", (name, day))
+            conn.commit()
+            self.write_count += 1
+            if old != name:
+                self.log_change("calendar", format_day(day), "update", {"holiday": old}, {"holiday": name})
+            return True
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+    
+    def rebuild_presence(self) -> int:
+        """Recompute the presence bitmaps from attendance; returns the number of bitmaps"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            count = rebuild_presence(conn.cursor())
+            conn.commit()
+            self.write_count += 1
+            return count
+        finally:
+            conn.close()
+    
+    def load_policies(self):
+        """Recompile the in-memory policy lookup (e.g. after another instance changed it)"""
+        conn = sqlite3.connect(self.db_path)
+        self.policies = PolicyBook.load(conn.cursor())
+        conn.close()
@@ -0,0 +1,271 @@
+"""
+Read-only HTTP API for payroll and other local systems
+
+An optional server on the standard library's ThreadingHTTPServer,
+started with `attendance_cli serve`. Every request reads from a
+read-only connection inside one snapshot, so it never takes a write lock
+or holds up kiosk punches. Endpoints return JSON pages:
+
+    GET /staff?limit=500&after=S0199
+    GET /attendance?from=2025-10-01&to=2025-10-31&limit=1000&after=<next>
+    GET /changes?table=attendance&since=<next>
+
+    {"items": [...], "next": "<cursor>", "more": true}
+
+Pages are ordered by key and continued by passing next back as after
+(since for /changes), so a page never skips or repeats rows when rows
+are added meanwhile. /changes returns the rows written after a revision
+(see the rev triggers) in the order they were written; staff deletions
+are not reported. Dates are YYYY-MM-DD, times epoch seconds.
+
+Responses carry an ETag built from the table's latest revision and
+deletion count, so a client repeating a request with If-None-Match gets 304 Not
+Modified until something changed. Bodies are streamed with chunked
+transfer encoding as rows are fetched, so memory use does not grow with
+the page size.
+"""
+
+import hashlib
+import json
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from database import FETCH_BATCH_SIZE, connect_readonly
+from utils import format_day, parse_day
+from .records import AttendanceRecord, Staff
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+CHANGE_TABLES = {
+    "staff": ("staff_id, name, department", Staff),
+    "attendance": ("staff_id, name, department, date, time_in, time_out", AttendanceRecord),
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    table: str  # Table whose version makes the ETag
+    query: str  # Selects up to limit + 1 rows, the extra one only telling that there are more
+    params: tuple
+    limit: int
+    to_item: Callable  # row -> JSON object
+    next_cursor: Callable  # Last row of the page -> the cursor continuing after it
+
+
+def to_item(record_class, row) -> dict:
+    """A JSON object of a row of record_class fields"""
+    item = dict(zip(record_class._fields, row))
+    if "date" in item:
+        item["date"] = format_day(item["date"])
+    return item
+
+
+def page_size(params: dict) -> int:
+    limit = int_param(params, "limit", DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def int_param(params: dict, name: str, default: int) -> int:
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a whole number") from None
+
+
+def day_param(params: dict, name: str, default: int) -> int:
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return parse_day(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a date (YYYY-MM-DD)") from None
+
+
+def staff_page(params: dict) -> Page:
+    """A page of staff ordered by ID"""
+    limit = page_size(params)
+    query = "SELECT staff_id, name, department FROM staff WHERE staff_id > ? ORDER BY staff_id LIMIT ?"
+    return Page("staff", query, (params.get("after", ""), limit + 1), limit,
+                lambda row: to_item(Staff, row), lambda row: row[0])
+
+
+def attendance_page(params: dict) -> Page:
+    """A page of attendance between the from and to dates (inclusive), ordered by day"""
+    start_day = day_param(params, "from", 0)
+    end_day = day_param(params, "to", 2 ** 31)
+    after_day, after_id = start_day, 0
+    if "after" in params:
+        try:
+            after_day, after_id = (int(part) for part in params["after"].split("-"))
+        except ValueError:
+            raise BadRequest("after must be a next value of an earlier page") from None
+    query = '''
+        SELECT id, staff_id, name, department, date, time_in, time_out FROM attendance
+        WHERE date BETWEEN ? AND ? AND (date, id) > (?, ?)
+        ORDER BY date, id LIMIT ?
+    '''
+    limit = page_size(params)
+    return Page("attendance", query, (start_day, end_day, after_day, after_id, limit + 1), limit,
+                lambda row: to_item(AttendanceRecord, row[1:]), lambda row: f"{row[4]}-{row[0]}")
+
+
+def changes_page(params: dict) -> Page:
+    """Rows of a table written after the since revision, in the order they were written"""
+    table = params.get("table")
+    if table not in CHANGE_TABLES:
+        raise BadRequest(f"table must be one of: {', '.join(CHANGE_TABLES)}")
+    columns, record_class = CHANGE_TABLES[table]
+    since = int_param(params, "since", 0)
+    limit = page_size(params)
+
+    def change(row):
+        item = to_item(record_class, row[1:])
+        item["rev"] = row[0]
+        return item
+    query = f"SELECT rev, {columns} FROM {table} WHERE rev > ? ORDER BY rev LIMIT ?"
+    return Page(table, query, (since, limit + 1), limit, change, lambda row: row[0])
+
+
+ENDPOINTS = {
+    "/staff": staff_page,
+    "/attendance": attendance_page,
+    "/changes": changes_page,
+}
+
+
+def table_version(cursor, table: str) -> tuple:
+    """Changes whenever a row of the table is written (rev) or deleted (table_deletes)"""
+    return cursor.execute(
+        f"SELECT (SELECT COALESCE(MAX(rev), 0) FROM {table}), deletes FROM table_deletes WHERE table_name = ?",
+        (table,)
+    ).fetchone()
+
+
+def make_etag(path: str, params: dict, version: tuple) -> str:
+    key = json.dumps([path, sorted(params.items()), version])
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = ENDPOINTS.get(url.path.rstrip("/"))
+        if endpoint is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown endpoint, use one of: {', '.join(ENDPOINTS)}")
+            return
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            page = endpoint(params)
+        except BadRequest as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+
+        conn = connect_readonly(self.server.db_path)
+        try:
+            cursor = conn.cursor()
+            # One snapshot for the ETag and the rows, even if a punch commits meanwhile
+            cursor.execute("BEGIN")
+            etag = make_etag(url.path.rstrip("/"), params, table_version(cursor, page.table))
+            if etag in (tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.chunked = self.request_version == "HTTP/1.1"
+            if self.chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+            else:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+
+            for part in self.stream_page(cursor.execute(page.query, page.params), page):
+                self.write_chunk(part.encode())
+            if self.chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        finally:
+            conn.close()
+
+    def stream_page(self, cursor, page: Page) -> Iterator[str]:
+        """The JSON page, in pieces of up to FETCH_BATCH_SIZE items"""
+        limit = page.limit
+        yield '{"items":['
+        sent = 0
+        last = None
+        more = False
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            if sent + len(rows) > limit:
+                # The extra row fetched past the limit only tells that there are more
+                rows = rows[:limit - sent]
+                more = True
+            if rows:
+                yield ("," if sent else "") + ",".join(
+                    json.dumps(page.to_item(row), separators=(",", ":")) for row in rows
+                )
+                sent += len(rows)
+                last = rows[-1]
+            if more:
+                break
+        yield '],"next":' + json.dumps(page.next_cursor(last) if last is not None else None) + \
+              ',"more":' + json.dumps(more) + '}'
+
+    def write_chunk(self, data: bytes):
+        if self.chunked:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def send_error_json(self, status: HTTPStatus, message: str):
+        body = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """HTTP server answering each request on its own thread from a read-only connection"""
+    daemon_threads = True
+
+    def __init__(self, db_path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        super().__init__((host, port), ApiHandler)
+        self.db_path = db_path
+
+
+def serve(db_path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, ready: Optional[Callable] = None):
+    """Serve the API until interrupted; ready(server) is called once it is listening"""
+    with ApiServer(db_path, host, port) as server:
+        if ready is not None:
+            ready(server)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
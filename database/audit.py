@@ -0,0 +1,178 @@
+"""
+Append-only audit log of staff and attendance changes
+
+Every mutation made through DatabaseManager is recorded with its actor,
+time, source (kiosk, admin, import, scheduler) and the values before and
+after the change, as compact JSON of only the fields that changed. Rows
+of audit_log are never updated or deleted; triggers reject both.
+
+Entries are buffered in memory and written by a background thread in
+one transaction per batch, so a punch only pays for a list append. The
+buffer is flushed when it fills up, every FLUSH_INTERVAL_SECONDS, and on
+close(), which also runs at interpreter exit. Because entries are
+recorded after their change commits, a process killed in between (at
+most FLUSH_INTERVAL_SECONDS) keeps the change but loses its entry. Bulk
+writers that already hold a transaction (history import, nightly jobs)
+append their entries directly with append_entries, in the same commit.
+"""
+
+import atexit
+import getpass
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+
+AUDIT_SOURCES = ("kiosk", "admin", "import", "scheduler")
+
+# Longest time an entry waits in memory before it is written
+FLUSH_INTERVAL_SECONDS = 2.0
+
+# Buffered entries that trigger a flush before the interval is up
+FLUSH_BATCH_SIZE = 500
+
+INSERT_SQL = '''
+    INSERT INTO audit_log (at, actor, source, table_name, row_key, action, before, after)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def init_audit_table(cursor):
+    """Create the audit_log table and the triggers that make it append-only"""
+    # before/after are JSON objects of the changed fields, NULL for inserts/deletes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY,
+            at INTEGER NOT NULL,
+            actor TEXT NOT NULL,
+            source TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            row_key TEXT,
+            action TEXT NOT NULL,
+            before TEXT,
+            after TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_row ON audit_log(row_key, at)")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audit_log_no_update BEFORE UPDATE ON audit_log BEGIN
+            SELECT RAISE(ABORT, 'audit_log is append-only');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audit_log_no_delete BEFORE DELETE ON audit_log BEGIN
+            SELECT RAISE(ABORT, 'audit_log is append-only');
+        END
+    ''')
+
+
+def default_actor() -> str:
+    """The operating system account running this process"""
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "unknown"
+
+
+def to_json(values: Optional[dict]) -> Optional[str]:
+    return json.dumps(values, separators=(",", ":"), sort_keys=True) if values else None
+
+
+def changed_fields(before: dict, after: dict) -> Tuple[dict, dict]:
+    """The fields whose values differ, as (before, after) dicts"""
+    keys = [key for key in after if before.get(key) != after[key]]
+    return {key: before.get(key) for key in keys}, {key: after[key] for key in keys}
+
+
+def make_entry(table: str, key: Optional[str], action: str, before: Optional[dict] = None,
+               after: Optional[dict] = None, actor: Optional[str] = None, source: str = "admin") -> tuple:
+    """An audit_log row for INSERT_SQL"""
+    if source not in AUDIT_SOURCES:
+        raise ValueError(f"Unknown audit source: {source}")
+    return (int(time.time()), actor or default_actor(), source, table, key, action, to_json(before), to_json(after))
+
+
+def append_entries(cursor, entries: Iterable[tuple]):
+    """Write entries from make_entry inside the caller's transaction"""
+    cursor.executemany(INSERT_SQL, entries)
+
+
+class AuditLog:
+    """In-memory buffer of audit entries, written to the database in batches"""
+
+    def __init__(self, db_path: str, interval: float = FLUSH_INTERVAL_SECONDS, batch_size: int = FLUSH_BATCH_SIZE):
+        self.db_path = db_path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.entries: List[tuple] = []
+        self.lock = threading.Lock()
+        # Serializes flushes, so batches are written in the order they were taken
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.closed = False
+        self.thread = None
+        atexit.register(self.close)
+
+    def record(self, table: str, key: Optional[str], action: str, before: Optional[dict] = None,
+               after: Optional[dict] = None, actor: Optional[str] = None, source: str = "admin"):
+        """Buffer an entry for a change that has been committed
+
+        The entry is lost if the process dies before the next flush; use
+        append_entries inside the change's transaction where that matters
+        """
+        entry = make_entry(table, key, action, before, after, actor, source)
+        with self.lock:
+            self.entries.append(entry)
+            full = len(self.entries) >= self.batch_size
+            closed = self.closed
+            if self.thread is None and not closed:
+                self.thread = threading.Thread(target=self.run, name="audit-flush", daemon=True)
+                self.thread.start()
+        if closed:
+            self.flush()  # After close() nothing flushes later, so it is written right away
+        elif full:
+            self.wake.set()
+
+    def flush(self) -> int:
+        """Write every buffered entry in one transaction; returns the number written"""
+        with self.flush_lock:
+            with self.lock:
+                entries, self.entries = self.entries, []
+            if not entries:
+                return 0
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    append_entries(conn.cursor(), entries)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                # Kept for the next attempt, ahead of anything recorded since
+                with self.lock:
+                    self.entries[:0] = entries
+                raise
+            return len(entries)
+
+    def run(self):
+        while not self.closed:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # The database was busy; retried on the next round
+
+    def close(self):
+        """Stop the flush thread and write whatever is still buffered"""
+        # Not needed at exit any more, and the registration would keep this object alive
+        atexit.unregister(self.close)
+        with self.lock:
+            self.closed = True
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.wake.set()
+            thread.join()
+        self.flush()
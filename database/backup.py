@@ -0,0 +1,121 @@
+"""
+Online backups of the attendance database
+
+Snapshots are taken with SQLite's backup API while the application keeps
+running. Pages are copied in small batches, with a pause after each one,
+from a single read snapshot, which in WAL mode never holds up kiosk
+punches, so it is safe to run mid-day. Each snapshot is verified with
+PRAGMA integrity_check before it replaces the oldest one.
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from database import connect_readonly
+
+
+# Snapshots kept per database, oldest deleted first
+KEEP_SNAPSHOTS = 7
+
+# Pages copied per step and pause between steps
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.02
+
+
+class BackupResult(NamedTuple):
+    path: Path
+    size: int  # Bytes
+    seconds: float
+    removed: List[Path]  # Snapshots deleted by rotation
+
+    @property
+    def throughput(self) -> float:
+        """Megabytes copied per second"""
+        return self.size / 1_000_000 / self.seconds if self.seconds else 0.0
+
+    def describe(self) -> str:
+        return (f"{self.path.name}: {self.size / 1_000_000:.1f} MB in {self.seconds:.1f} s "
+                f"({self.throughput:.1f} MB/s), {len(self.removed)} old snapshots removed")
+
+
+def default_backup_dir(db_path: str) -> Path:
+    """The backups directory next to the database"""
+    return Path(db_path).resolve().parent / "backups"
+
+
+def list_snapshots(db_path: str, backup_dir: Optional[str] = None) -> List[Path]:
+    """Existing snapshots of a database, oldest first"""
+    directory = Path(backup_dir) if backup_dir else default_backup_dir(db_path)
+    # Timestamped names (fixed width, down to the microsecond) sort chronologically
+    return sorted(directory.glob(f"{Path(db_path).stem}-*.db"))
+
+
+def snapshot_path(directory: Path, stem: str) -> Path:
+    """A new snapshot name, unique even for backups started in the same microsecond"""
+    name = f"{stem}-{datetime.now():%Y%m%d-%H%M%S-%f}"
+    path = directory / f"{name}.db"
+    suffix = 1
+    while path.exists() or path.with_suffix(".db.partial").exists():
+        # '_' sorts after '.', keeping the order of list_snapshots
+        path = directory / f"{name}_{suffix}.db"
+        suffix += 1
+    return path
+
+
+def backup_database(db_path: str, backup_dir: Optional[str] = None, keep: int = KEEP_SNAPSHOTS,
+                    pages: int = PAGES_PER_STEP, pause: float = STEP_PAUSE_SECONDS) -> BackupResult:
+    """
+    Copy the database to a new verified snapshot and rotate old ones
+
+    Args:
+        db_path: Path to the SQLite database
+        backup_dir: Directory for snapshots, default 'backups' next to the database
+        keep: Number of snapshots to keep
+        pages: Pages copied per backup step
+        pause: Seconds to sleep between steps
+
+    Returns:
+        BackupResult of the new snapshot
+
+    Raises:
+        sqlite3.DatabaseError: If the copy fails the integrity check (it is deleted)
+    """
+    directory = Path(backup_dir) if backup_dir else default_backup_dir(db_path)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = snapshot_path(directory, Path(db_path).stem)
+    # Written under a temporary name so a failed or interrupted copy never counts as a snapshot
+    partial = path.with_suffix(".db.partial")
+
+    start = time.perf_counter()
+    source = connect_readonly(db_path)
+    target = sqlite3.connect(partial)
+    try:
+        # The whole copy reads one WAL snapshot: punches committed meanwhile don't
+        # restart it (as they would outside a transaction), and they are never
+        # blocked by it, pauses included
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        # The copy inherits WAL mode; a snapshot should be one self-contained file
+        target.execute("PRAGMA journal_mode=DELETE")
+        check = target.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    if check != "ok":
+        partial.unlink()
+        raise sqlite3.DatabaseError(f"Backup failed integrity check: {check}")
+    # os.replace, as Path.rename refuses to overwrite on Windows
+    os.replace(partial, path)
+    seconds = time.perf_counter() - start
+
+    snapshots = list_snapshots(db_path, str(directory))
+    removed = snapshots[:max(0, len(snapshots) - keep)]
+    for old in removed:
+        old.unlink()
+    return BackupResult(path, path.stat().st_size, seconds, removed)
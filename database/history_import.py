@@ -0,0 +1,279 @@
+"""
+Bulk import of historical attendance from other systems
+
+CSV files (old spreadsheets, other vendors' dumps) are read in chunks
+that a process pool parses and normalizes to the attendance schema. This
+process alone writes the validated rows, in large executemany batches of
+one transaction each, so the database only ever sees a single writer.
+Rows whose (staff_id, date) already exists are resolved by a conflict
+policy.
+"""
+
+import csv
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils import day_number, validate_staff_id
+from .audit import append_entries, make_entry
+from .policy import LATENESS_SQL
+from .presence import mark_many_present
+from .workdays import extend_calendar
+
+
+# Rows per parsing task and per write transaction
+CHUNK_ROWS = 20000
+
+# Accepted spellings of each column in a file's header row (compared lowercased)
+COLUMN_ALIASES = {
+    "staff_id": ("staff id", "staff_id", "staffid", "id", "employee id", "employee_id", "emp id"),
+    "name": ("name", "staff name", "employee name", "full name"),
+    "department": ("department", "dept", "unit"),
+    "date": ("date", "day", "attendance date"),
+    "time_in": ("time in", "time_in", "in", "clock in", "sign in", "check in"),
+    "time_out": ("time out", "time_out", "out", "clock out", "sign out", "check out"),
+}
+REQUIRED_COLUMNS = ("staff_id", "date", "time_in")
+
+# Dates are day first, as in the spreadsheets being consolidated
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y")
+TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%I:%M:%S %p", "%I:%M %p")
+
+INSERT_SQL = '''
+    INSERT INTO attendance (staff_id, name, department, date, time_in, time_out)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (staff_id, date) DO
+'''
+
+# What happens to a row whose staff member already has a record that day
+CONFLICT_POLICIES = {
+    # Keep the existing record
+    "skip": INSERT_SQL + " NOTHING",
+    # Overwrite it with the imported one
+    "replace": INSERT_SQL + '''
+        UPDATE SET name = excluded.name, department = excluded.department,
+                   time_in = excluded.time_in, time_out = excluded.time_out, auto_closed = 0
+    ''',
+    # Keep the earliest sign-in and the latest sign-out of both
+    "merge": INSERT_SQL + '''
+        UPDATE SET time_in = MIN(COALESCE(attendance.time_in, excluded.time_in),
+                                 COALESCE(excluded.time_in, attendance.time_in)),
+                   time_out = MAX(COALESCE(attendance.time_out, excluded.time_out),
+                                  COALESCE(excluded.time_out, attendance.time_out))
+    ''',
+}
+
+
+class ImportResult(NamedTuple):
+    read: int
+    written: int  # Inserted, plus updated by the replace and merge policies
+    rejected: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def describe(self) -> str:
+        return (f"read {self.read} rows, wrote {self.written}, rejected {self.rejected} "
+                f"in {self.seconds:.1f} s ({self.rows_per_second:,.0f} rows/s)")
+
+
+def resolve_columns(header: Sequence[str]) -> Dict[str, int]:
+    """Map attendance fields to column positions of a file's header row"""
+    positions = {}
+    for index, title in enumerate(header):
+        title = title.strip().lower()
+        for field, aliases in COLUMN_ALIASES.items():
+            if title in aliases and field not in positions:
+                positions[field] = index
+
+    missing = [field for field in REQUIRED_COLUMNS if field not in positions]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return positions
+
+
+def parse_with(formats: Sequence[str], text: str) -> Optional[datetime]:
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def normalize_chunk(rows: List[List[str]], columns: Dict[str, int], first_line: int):
+    """
+    Validate and convert raw CSV rows to attendance rows (runs in a worker process)
+
+    Args:
+        rows: Raw CSV rows
+        columns: Field positions from resolve_columns
+        first_line: File line number of the first row, for reject reports
+
+    Returns:
+        (valid, rejects): valid rows as (staff_id, name, department, day,
+        time_in, time_out) with name/department None when the file lacks them,
+        and rejects as (line, reason, raw row)
+    """
+    valid = []
+    rejects = []
+    days = {}  # Most rows of a file share a handful of date strings
+
+    def field(row, name):
+        index = columns.get(name)
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for line, row in enumerate(rows, first_line):
+        staff_id = field(row, "staff_id")
+        if not validate_staff_id(staff_id):
+            rejects.append((line, "invalid staff ID", row))
+            continue
+
+        date_text = field(row, "date")
+        if date_text not in days:
+            parsed = parse_with(DATE_FORMATS, date_text)
+            days[date_text] = parsed.date() if parsed else None
+        day = days[date_text]
+        if day is None:
+            rejects.append((line, "invalid date", row))
+            continue
+
+        times = []
+        for name in ("time_in", "time_out"):
+            text = field(row, name)
+            parsed = parse_with(TIME_FORMATS, text) if text else None
+            if text and parsed is None:
+                break
+            # Combined with the date so DST is respected
+            times.append(int(datetime.combine(day, parsed.time()).timestamp()) if parsed else None)
+        if len(times) < 2:
+            rejects.append((line, "invalid time", row))
+            continue
+        time_in, time_out = times
+        if time_in is None:
+            rejects.append((line, "missing time in", row))
+            continue
+        if time_out is not None and time_out < time_in:
+            rejects.append((line, "time out before time in", row))
+            continue
+
+        valid.append((staff_id, field(row, "name") or None, field(row, "department") or None,
+                      day_number(day), time_in, time_out))
+    return valid, rejects
+
+
+def read_chunks(paths: Sequence[str], chunk_rows: int) -> Iterator[Tuple[str, List[List[str]], Dict[str, int], int]]:
+    """Yield (path, rows, columns, first line) chunks of every file"""
+    for path in paths:
+        with open(path, newline='', encoding='utf-8-sig') as csvfile:
+            reader = csv.reader(csvfile)
+            columns = resolve_columns(next(reader, []))
+            first_line = 2
+            while True:
+                rows = list(islice(reader, chunk_rows))
+                if not rows:
+                    break
+                yield path, rows, columns, first_line
+                first_line += len(rows)
+
+
+def import_history(db_path: str, paths: Sequence[str], conflict: str = "skip", workers: Optional[int] = None,
+                   chunk_rows: int = CHUNK_ROWS, rejects_path: Optional[str] = None) -> ImportResult:
+    """
+    Import historical attendance CSV files
+
+    Args:
+        db_path: Path to the SQLite database
+        paths: CSV files with a header row (see COLUMN_ALIASES)
+        conflict: One of CONFLICT_POLICIES
+        workers: Parsing processes, default one per CPU
+        chunk_rows: Rows per parsing task and write transaction
+        rejects_path: Optional CSV file listing every rejected row: its file, line
+            and reason, followed by the row's original fields as separate columns,
+            so it can be corrected and imported again
+
+    Returns:
+        ImportResult with row counts and timing
+
+    Raises:
+        ValueError: If the policy is unknown or a file lacks a required column
+    """
+    if conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {conflict}")
+    insert_sql = CONFLICT_POLICIES[conflict]
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    # Files often lack name and department; they come from the staff table
+    staff = {row[0]: row[1:] for row in cursor.execute("SELECT staff_id, name, department FROM staff")}
+    first_rev = cursor.execute("SELECT COALESCE(MAX(rev), 0) FROM attendance").fetchone()[0]
+
+    rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8') if rejects_path else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(["File", "Line", "Reason", "Fields"])
+
+    read = written = rejected = 0
+
+    def write(path, result):
+        nonlocal read, written, rejected
+        valid, rejects = result
+        read += len(valid) + len(rejects)
+        rejected += len(rejects)
+        if rejects_writer:
+            rejects_writer.writerows((path, line, reason, *row) for line, reason, row in rejects)
+
+        rows = []
+        for staff_id, name, department, day, time_in, time_out in valid:
+            known = staff.get(staff_id, ("Unknown", "Unknown"))
+            rows.append((staff_id, name or known[0], department or known[1], day, time_in, time_out))
+        cursor.executemany(insert_sql, rows)
+        written += cursor.rowcount
+        conn.commit()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Chunks are written in file order, which keeps the conflict policy
+            # deterministic; a bounded queue keeps memory flat on huge files
+            pending = deque()
+            for path, rows, columns, first_line in read_chunks(paths, chunk_rows):
+                pending.append((path, pool.submit(normalize_chunk, rows, columns, first_line)))
+                if len(pending) > workers * 2:
+                    path, future = pending.popleft()
+                    write(path, future.result())
+            while pending:
+                path, future = pending.popleft()
+                write(path, future.result())
+
+        # Imported sign-ins are checked against the shift policies and marked in
+        # the presence bitmaps like live ones
+        cursor.execute(LATENESS_SQL + " AND rev > ?", (first_rev,))
+        cursor.execute("SELECT staff_id, date FROM attendance WHERE rev > ? AND time_in IS NOT NULL", (first_rev,))
+        mark_many_present(cursor, cursor.fetchall())
+        # History can reach back before the calendar, which absences are computed from
+        cursor.execute("SELECT MIN(date), MAX(date) FROM attendance WHERE rev > ?", (first_rev,))
+        first_day, last_day = cursor.fetchone()
+        if first_day is not None:
+            extend_calendar(cursor, first_day, last_day)
+        append_entries(cursor, [make_entry(
+            "attendance", None, "import",
+            after={"files": [os.path.basename(path) for path in paths], "conflict": conflict,
+                   "written": written, "rejected": rejected},
+            source="import"
+        )])
+        conn.commit()
+    finally:
+        conn.close()
+        if rejects_file:
+            rejects_file.close()
+
+    return ImportResult(read, written, rejected, time.perf_counter() - start)
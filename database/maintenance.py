@@ -0,0 +1,163 @@
+"""
+Automatic database maintenance
+
+Run nightly by the scheduler. Query-planner statistics are refreshed when
+a table's row count has drifted from the count they were gathered at.
+Free pages left by deletes are handed back to the file system a few at a
+time through incremental vacuum. Every run records the database size and
+the timing of a few representative queries, before and after, in
+maintenance_runs.
+
+A database created before incremental vacuum was enabled needs one full
+VACUUM to switch modes, which holds the write lock for the whole rewrite.
+That is never done by the nightly job; it is run once, off-peak, with
+`attendance_cli vacuum`.
+"""
+
+import sqlite3
+import time
+from typing import List, Tuple
+
+
+# Tables whose statistics are kept current
+MAINTAINED_TABLES = ("staff", "attendance")
+
+# Relative change in row count after which a table is analyzed again
+DRIFT_RATIO = 0.1
+
+# Free pages released per incremental vacuum step, and the most steps per run
+VACUUM_STEP_PAGES = 256
+VACUUM_MAX_STEPS = 400
+VACUUM_STEP_PAUSE_SECONDS = 0.01
+
+# Queries timed before and after maintenance, shaped like the ones the kiosk
+# and admin views run most
+PROBE_QUERIES = [
+    "SELECT COUNT(*) FROM attendance WHERE date = (SELECT MAX(date) FROM attendance)",
+    "SELECT COUNT(*) FROM attendance WHERE staff_id = (SELECT MIN(staff_id) FROM staff)",
+    "SELECT COUNT(*) FROM attendance WHERE rev > (SELECT MAX(rev) - 100 FROM attendance)",
+    "SELECT staff_id, name, department FROM staff ORDER BY name",
+]
+
+
+def database_size(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Size of the database in bytes and its number of free pages"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size * page_count, free_pages
+
+
+def time_probes(conn: sqlite3.Connection) -> float:
+    """Total milliseconds taken by PROBE_QUERIES"""
+    start = time.perf_counter()
+    for query in PROBE_QUERIES:
+        conn.execute(query).fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def analyzed_rows(conn: sqlite3.Connection, table: str):
+    """Row count of a table when it was last analyzed, None if it never was"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        return None
+    # The first number of each index's stat is the table's row count
+    row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+    return int(row[0].split()[0]) if row else None
+
+
+def analyze_drifted(conn: sqlite3.Connection) -> List[str]:
+    """ANALYZE the tables whose row count drifted since their last analysis"""
+    analyzed = []
+    for table in MAINTAINED_TABLES:
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        previous = analyzed_rows(conn, table)
+        if previous is None or abs(rows - previous) > DRIFT_RATIO * max(previous, 1):
+            conn.execute(f"ANALYZE {table}")
+            analyzed.append(table)
+    conn.commit()
+    # Covers anything else SQLite considers stale (e.g. newly created indexes)
+    conn.execute("PRAGMA optimize")
+    return analyzed
+
+
+def is_incremental(conn: sqlite3.Connection) -> bool:
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> str:
+    """Switch an existing database to auto_vacuum=INCREMENTAL with a one-time full VACUUM
+
+    The mode of a database with tables only changes with a full VACUUM,
+    which rewrites the file and blocks every write until it is done, so
+    run it off-peak; new databases are created in this mode
+    """
+    if is_incremental(conn):
+        return "already using incremental vacuum"
+    started_at = int(time.time())
+    size_before, free_before = database_size(conn)
+    probe_ms_before = time_probes(conn)
+
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+    size_after, free_after = database_size(conn)
+    probe_ms_after = time_probes(conn)
+    record_run(conn, started_at, (size_before, size_after), (free_before, free_after), [], True,
+               (probe_ms_before, probe_ms_after))
+    return (f"full vacuum, {size_before / 1_000_000:.1f} -> {size_after / 1_000_000:.1f} MB, "
+            f"incremental vacuum enabled")
+
+
+def reclaim_free_pages(conn: sqlite3.Connection, step_pages: int = VACUUM_STEP_PAGES,
+                       max_steps: int = VACUUM_MAX_STEPS) -> int:
+    """Release free pages in short incremental vacuum steps; returns the pages released"""
+    if not is_incremental(conn):
+        # The pragma does nothing until the database is converted
+        return 0
+    released = 0
+    for _ in range(max_steps):
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            break
+        # Each step is its own short write transaction, so punches can get in between.
+        # The pragma frees one page per sqlite3_step, which execute() would stop
+        # after; executescript steps it to completion.
+        conn.executescript(f"PRAGMA incremental_vacuum({step_pages})")
+        released += min(free_pages, step_pages)
+        time.sleep(VACUUM_STEP_PAUSE_SECONDS)
+    return released
+
+
+def record_run(conn: sqlite3.Connection, started_at: int, sizes: Tuple[int, int], free_pages: Tuple[int, int],
+               analyzed: List[str], vacuumed: bool, probe_ms: Tuple[float, float]):
+    """Add a (before, after) row to maintenance_runs"""
+    conn.execute('''
+        INSERT INTO maintenance_runs (started_at, size_before, size_after, free_pages_before,
+                                      free_pages_after, analyzed, vacuumed, probe_ms_before, probe_ms_after)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (started_at, *sizes, *free_pages, ",".join(analyzed), int(vacuumed), *probe_ms))
+    conn.commit()
+
+
+def run_maintenance(conn: sqlite3.Connection) -> str:
+    """Refresh statistics, reclaim free space and record the effect in maintenance_runs
+
+    Only short steps: ANALYZE of drifted tables, PRAGMA optimize and
+    incremental vacuum, never a full VACUUM
+    """
+    started_at = int(time.time())
+    size_before, free_before = database_size(conn)
+    probe_ms_before = time_probes(conn)
+
+    analyzed = analyze_drifted(conn)
+    released = reclaim_free_pages(conn)
+
+    size_after, free_after = database_size(conn)
+    probe_ms_after = time_probes(conn)
+    record_run(conn, started_at, (size_before, size_after), (free_before, free_after), analyzed, False,
+               (probe_ms_before, probe_ms_after))
+
+    return (f"analyzed {', '.join(analyzed) or 'nothing'}, "
+            f"released {released} pages{'' if is_incremental(conn) else ' (run attendance_cli vacuum once)'}, "
+            f"{size_before / 1_000_000:.1f} -> {size_after / 1_000_000:.1f} MB, "
+            f"probes {probe_ms_before:.1f} -> {probe_ms_after:.1f} ms")
@@ -0,0 +1,91 @@
+"""
+Shift and lateness policies for the attendance system
+
+Policies live in the shift_policy table: one default row (department '')
+plus optional per-department overrides. They are compiled once into a
+PolicyBook for per-punch checks, and LATENESS_SQL applies the same rules
+to stored attendance rows in a single set-based UPDATE.
+"""
+
+from datetime import datetime
+from typing import Dict, NamedTuple
+
+
+# Department key of the policy that applies when a department has no override
+DEFAULT_POLICY = ""
+
+# Working days are a bitmask with Monday as bit 0 (matching date.weekday())
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MONDAY_TO_FRIDAY = 0b0011111
+
+# Seconds late for every attendance row, resolved against the department's
+# policy or the default one. Day numbers are local dates and day 0
+# (1970-01-01) was a Thursday, so the weekday is plain integer arithmetic;
+# only the local time of day needs SQLite's localtime conversion.
+LATENESS_SQL = '''
+    UPDATE attendance SET late_seconds = (
+        SELECT CASE
+            WHEN (p.working_days >> ((attendance.date + 3) % 7)) & 1 = 0 THEN 0
+            ELSE MAX(0, CAST(strftime('%s', attendance.time_in, 'unixepoch', 'localtime') AS INTEGER)
+                        - attendance.date * 86400 - p.start_time - p.grace_minutes * 60)
+        END
+        FROM shift_policy p
+        WHERE p.department IN (attendance.department, '')
+        ORDER BY p.department = ''
+        LIMIT 1
+    )
+    WHERE time_in IS NOT NULL
+'''
+
+
+def lateness_sql_for(department: str):
+    """LATENESS_SQL restricted to the rows a change to one department's policy can affect"""
+    if department == DEFAULT_POLICY:
+        # The default applies to every department without an override
+        return (LATENESS_SQL + " AND department NOT IN (SELECT department FROM shift_policy WHERE department != '')", ())
+    return (LATENESS_SQL + " AND department = ?", (department,))
+
+
+class ShiftPolicy(NamedTuple):
+    department: str
+    start_time: int  # Seconds since midnight
+    grace_minutes: int
+    working_days: int  # Bitmask, Monday = bit 0
+
+    @property
+    def late_after(self) -> int:
+        """Seconds since midnight after which an arrival counts as late"""
+        return self.start_time + self.grace_minutes * 60
+
+    def works_on(self, weekday: int) -> bool:
+        return bool(self.working_days >> weekday & 1)
+
+
+class PolicyBook:
+    """In-memory lookup of shift policies by department"""
+
+    def __init__(self, policies: Dict[str, ShiftPolicy]):
+        self.policies = policies
+        self.default = policies.get(DEFAULT_POLICY)
+
+    @classmethod
+    def load(cls, cursor) -> "PolicyBook":
+        """Compile the policies stored in the database"""
+        cursor.execute("SELECT department, start_time, grace_minutes, working_days FROM shift_policy")
+        return cls({row[0]: ShiftPolicy(*row) for row in cursor.fetchall()})
+
+    def policy_for(self, department: str) -> ShiftPolicy:
+        return self.policies.get(department, self.default)
+
+    def late_seconds(self, department: str, timestamp: int) -> int:
+        """Seconds a punch at the given epoch time is late for the department (0 if on time)"""
+        policy = self.policy_for(department)
+        if policy is None:
+            return 0
+
+        punch = datetime.fromtimestamp(timestamp)
+        if not policy.works_on(punch.weekday()):
+            return 0
+
+        seconds = punch.hour * 3600 + punch.minute * 60 + punch.second
+        return max(0, seconds - policy.late_after)
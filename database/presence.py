@@ -0,0 +1,75 @@
+"""
+Per-staff presence bitmaps
+
+The presence table holds one bitset per staff member per year, bit n set
+when they signed in on day n of the year (January 1st is bit 0). The bits
+are stored little-endian in a 46-byte BLOB, so a whole year of the whole
+organization is a few dozen kilobytes and absence, streak and rate
+questions become bitwise operations instead of anti-joins over
+attendance. The table is kept current by every sign-in and can always be
+rebuilt from attendance.
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Tuple
+
+from utils import day_number, day_to_date
+
+
+# 366 bits rounded up to whole bytes
+YEAR_BYTES = 46
+
+
+def year_and_bit(day: int) -> Tuple[int, int]:
+    """The year of a day number and its bit (day of the year, from 0)"""
+    when = day_to_date(day)
+    return when.year, day - day_number(date(when.year, 1, 1))
+
+
+def to_bits(blob) -> int:
+    return int.from_bytes(blob, "little") if blob else 0
+
+
+def to_blob(bits: int) -> bytes:
+    return bits.to_bytes(YEAR_BYTES, "little")
+
+
+def mark_present(cursor, staff_id: str, day: int):
+    """Set the presence bit of one staff member's day (call inside the sign-in transaction)"""
+    mark_many_present(cursor, [(staff_id, day)])
+
+
+def mark_many_present(cursor, pairs: Iterable[Tuple[str, int]]):
+    """Set the presence bits of many (staff_id, day) pairs"""
+    masks = defaultdict(int)
+    for staff_id, day in pairs:
+        year, bit = year_and_bit(day)
+        masks[staff_id, year] |= 1 << bit
+
+    for (staff_id, year), mask in masks.items():
+        cursor.execute("SELECT bits FROM presence WHERE staff_id = ? AND year = ?", (staff_id, year))
+        row = cursor.fetchone()
+        bits = to_bits(row[0]) if row else 0
+        if bits | mask != bits:
+            cursor.execute(
+                "INSERT OR REPLACE INTO presence (staff_id, year, bits) VALUES (?, ?, ?)",
+                (staff_id, year, to_blob(bits | mask))
+            )
+
+
+def rebuild_presence(cursor) -> int:
+    """Recompute every bitmap from attendance; returns the number of bitmaps"""
+    bitmaps: Dict[Tuple[str, int], int] = defaultdict(int)
+    cursor.execute("SELECT staff_id, date FROM attendance WHERE time_in IS NOT NULL")
+    for staff_id, day in cursor:
+        year, bit = year_and_bit(day)
+        bitmaps[staff_id, year] |= 1 << bit
+
+    cursor.execute("DELETE FROM presence")
+    cursor.executemany(
+        "INSERT INTO presence (staff_id, year, bits) VALUES (?, ?, ?)",
+        ((staff_id, year, to_blob(bits)) for (staff_id, year), bits in bitmaps.items())
+    )
+    return len(bitmaps)
+
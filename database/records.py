@@ -0,0 +1,63 @@
+"""
+Typed records returned by DatabaseManager
+
+Rows are built straight into these named tuples by a sqlite3 row_factory,
+so callers read fields by name (staff.name) rather than by position.
+Named tuples have no per-instance __dict__; CPython gives a tuple subclass
+one spare item slot, 8 bytes more than a plain tuple. The factory more than
+makes that up by sharing one string object between rows for the fields a
+record class lists in shared_fields (the staff columns copied onto every
+attendance row), instead of SQLite's fresh copy per row. New columns are
+added as trailing fields, which leaves code using the existing names
+unchanged.
+"""
+
+from typing import NamedTuple, Optional
+
+
+class Staff(NamedTuple):
+    staff_id: str
+    name: str
+    department: str
+
+    shared_fields = ("department",)
+
+
+class AttendanceRecord(NamedTuple):
+    staff_id: str
+    name: str
+    department: str
+    date: int  # Day number (days since 1970-01-01)
+    time_in: Optional[int]  # Epoch seconds
+    time_out: Optional[int]
+
+    # Repeated on every row of a staff member, so rows share one copy
+    shared_fields = ("staff_id", "name", "department")
+
+
+class PunchResult(NamedTuple):
+    action: str  # "Sign In", "Sign Out" or "Already Signed Out"
+    staff: Staff
+    late_seconds: int = 0  # Lateness of a sign-in under the department's shift policy
+
+
+def row_factory(record_class):
+    """A sqlite3 row_factory that builds record_class instances from rows of its fields"""
+    new = tuple.__new__
+    shared = [record_class._fields.index(name) for name in getattr(record_class, "shared_fields", ())]
+    if not shared:
+        def build(cursor, row):
+            # Skips _make's length check; the queries select exactly the record's fields
+            return new(record_class, row)
+        return build
+
+    # Lives as long as the query's factory, so only rows of one result share strings
+    strings = {}
+    share = strings.setdefault
+
+    def build_shared(cursor, row):
+        values = list(row)
+        for index in shared:
+            values[index] = share(values[index], values[index])
+        return new(record_class, values)
+    return build_shared
@@ -0,0 +1,275 @@
+"""
+In-process scheduler for nightly maintenance jobs
+
+Jobs run on a background thread at their configured local time of day,
+each on its own connection, and every run is recorded in job_runs with
+its duration and status. A job whose slot passed while the application
+was not running (e.g. a kiosk switched off overnight) is caught up once,
+but only in the off-peak hours, so it never competes with the morning
+clock-in rush; otherwise it waits. A job that has never run starts at
+its next slot.
+
+Every application instance sharing the database runs a scheduler, so a
+job is only started under a lease: a job_leases row taken in a BEGIN
+IMMEDIATE transaction, which also checks that no other instance ran the
+slot meanwhile. Failed runs are recorded in job_runs and the audit log.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as day_time, timedelta
+from typing import Dict, Optional, Tuple
+
+from database.audit import append_entries, make_entry
+from database.backup import backup_database
+from database.maintenance import run_maintenance
+from utils import day_number, day_start_timestamp, format_day
+
+
+# Job name -> local time of day ('HH:MM') it runs at
+DEFAULT_SCHEDULE = {
+    "close_open_records": "00:05",
+    "refresh_summaries": "00:15",
+    "backup": "01:00",
+    "maintenance": "02:00",
+}
+
+# Local hours ('HH:MM' from, to) in which a missed slot may be caught up
+DEFAULT_OFF_PEAK = ("20:00", "06:00")
+
+# A slot passed less than this long ago is on time rather than missed (the
+# jobs before it in the same check may have run for a while)
+ON_TIME_SECONDS = 15 * 60
+
+# Longest sleep between schedule checks, so clock changes are noticed
+MAX_WAIT_SECONDS = 60
+
+# How long a lease is held before another instance may take over the job,
+# in case the one running it died; longer than any job takes
+LEASE_SECONDS = 60 * 60
+
+
+def parse_time_of_day(text: str) -> day_time:
+    hours, minutes = (int(part) for part in text.split(":"))
+    return day_time(hours, minutes)
+
+
+def close_open_records(conn: sqlite3.Connection) -> str:
+    """Give sign-ins of past days without a sign-out an end-of-day time_out"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT date FROM attendance WHERE time_out IS NULL AND time_in IS NOT NULL AND date < ?",
+        (day_number(date.today()),)
+    )
+    days = [row[0] for row in cursor.fetchall()]
+
+    closed = 0
+    for day in days:
+        # One short transaction per day keeps kiosk writes from waiting
+        cursor.execute(
+            "UPDATE attendance SET time_out = ?, auto_closed = 1 "
+            "WHERE date = ? AND time_out IS NULL AND time_in IS NOT NULL",
+            (day_start_timestamp(day + 1) - 1, day)
+        )
+        closed += cursor.rowcount
+        append_entries(cursor, [make_entry(
+            "attendance", format_day(day), "auto_close", after={"closed": cursor.rowcount}, source="scheduler"
+        )])
+        conn.commit()
+    return f"closed {closed} records"
+
+
+def refresh_summaries(conn: sqlite3.Connection) -> str:
+    """Rebuild the per-day, per-department attendance summary"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM daily_summary")
+    cursor.execute('''
+        INSERT INTO daily_summary (date, department, present, late, signed_out)
+        SELECT date, department, COUNT(*),
+               SUM(COALESCE(late_seconds, 0) > 0),
+               SUM(time_out IS NOT NULL AND auto_closed = 0)
+        FROM attendance
+        GROUP BY date, department
+    ''')
+    rows = cursor.rowcount
+    conn.commit()
+    return f"{rows} summary rows"
+
+
+def backup(conn: sqlite3.Connection) -> str:
+    """Take a rotating online snapshot of the database"""
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return backup_database(db_path).describe()
+
+
+JOBS = {
+    "close_open_records": close_open_records,
+    "refresh_summaries": refresh_summaries,
+    "backup": backup,
+    "maintenance": run_maintenance,
+}
+
+
+class Scheduler:
+    """Run maintenance jobs at configured times on a background thread"""
+
+    def __init__(self, db_path: str = "attendance.db", schedule: Optional[Dict[str, str]] = None,
+                 off_peak: Tuple[str, str] = DEFAULT_OFF_PEAK):
+        self.db_path = db_path
+        self.schedule = dict(DEFAULT_SCHEDULE if schedule is None else schedule)
+        self.off_peak = tuple(parse_time_of_day(text) for text in off_peak)
+        # Identifies this scheduler's leases among those of other instances
+        self.owner = uuid.uuid4().hex
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def latest_slot(self, job: str, now: datetime) -> datetime:
+        """The most recent scheduled time of a job at or before now"""
+        slot_time = parse_time_of_day(self.schedule[job])
+        slot = now.replace(hour=slot_time.hour, minute=slot_time.minute, second=0, microsecond=0)
+        if slot > now:
+            slot -= timedelta(days=1)
+        return slot
+
+    def is_off_peak(self, now: datetime) -> bool:
+        """Whether now falls in the off-peak hours (which may span midnight)"""
+        start, end = self.off_peak
+        current = now.time()
+        if start <= end:
+            return start <= current < end
+        return current >= start or current < end
+
+    def last_run(self, job: str) -> Optional[int]:
+        """Epoch time the job last started (successfully or not)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(started_at) FROM job_runs WHERE job = ?", (job,))
+        result = cursor.fetchone()[0]
+        conn.close()
+        return result
+
+    def acquire_lease(self, job: str, slot: datetime) -> bool:
+        """Take the lease of a job for its slot, unless another instance holds it or already ran the slot"""
+        now = int(time.time())
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            # The write lock makes the check and the claim one step across instances
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT owner, expires_at FROM job_leases WHERE job = ?", (job,))
+            lease = cursor.fetchone()
+            if lease is not None and lease[0] != self.owner and lease[1] > now:
+                conn.rollback()
+                return False
+            cursor.execute("SELECT MAX(started_at) FROM job_runs WHERE job = ?", (job,))
+            last_run = cursor.fetchone()[0]
+            if last_run is not None and last_run >= slot.timestamp():
+                conn.rollback()
+                return False
+            cursor.execute(
+                "INSERT INTO job_leases (job, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (job) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                (job, self.owner, now + LEASE_SECONDS)
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def release_lease(self, job: str):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("DELETE FROM job_leases WHERE job = ? AND owner = ?", (job, self.owner))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run_job(self, job: str) -> Tuple[str, str]:
+        """Run one job now and record it in job_runs; returns (status, message)"""
+        started_at = int(time.time())
+        start = time.perf_counter()
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            message = JOBS[job](conn)
+            status = "ok"
+        except Exception as e:
+            conn.rollback()
+            message = str(e)
+            status = "failed"
+
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        try:
+            self.record_run(conn, job, started_at, duration_ms, status, message)
+        finally:
+            conn.close()
+        return status, message
+
+    def record_run(self, conn: sqlite3.Connection, job: str, started_at: int, duration_ms: int,
+                   status: str, message: str):
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO job_runs (job, started_at, duration_ms, status, message) VALUES (?, ?, ?, ?, ?)",
+            (job, started_at, duration_ms, status, message)
+        )
+        if status == "failed":
+            append_entries(cursor, [make_entry(
+                "job_runs", job, "failed", after={"message": message}, source="scheduler"
+            )])
+        conn.commit()
+
+    def set_baseline(self, job: str, slot: datetime):
+        """Record the current slot as done for a job that has never run, so it starts at the next one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            self.record_run(conn, job, int(slot.timestamp()), 0, "baseline", "waiting for the next slot")
+        finally:
+            conn.close()
+
+    def check_job(self, job: str, slot: datetime, now: datetime):
+        """Run a job if its latest slot is due and no other instance has taken it"""
+        last_run = self.last_run(job)
+        if last_run is None:
+            # E.g. the first start after an upgrade, at whatever time of day that is
+            self.set_baseline(job, slot)
+        elif last_run < slot.timestamp() and (now - slot < timedelta(seconds=ON_TIME_SECONDS)
+                                              or self.is_off_peak(now)):
+            # Due at its slot, or a missed slot caught up off-peak
+            if self.acquire_lease(job, slot):
+                try:
+                    self.run_job(job)  # Failures are recorded in job_runs and the audit log
+                finally:
+                    self.release_lease(job)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            now = datetime.now()
+            next_check = now + timedelta(seconds=MAX_WAIT_SECONDS)
+
+            for job in self.schedule:
+                slot = self.latest_slot(job, now)
+                if self.stop_event.is_set():
+                    return
+                try:
+                    self.check_job(job, slot, now)
+                except sqlite3.Error:
+                    continue  # E.g. the database stayed locked; the job is still due at the next check
+                next_check = min(next_check, slot + timedelta(days=1))
+
+            self.stop_event.wait(max(0.0, (next_check - datetime.now()).total_seconds()))
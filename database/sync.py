@@ -0,0 +1,385 @@
+"""
+Branch office sync through change files
+
+Each database has a site ID. export_changes writes the staff and
+attendance rows changed since the last export to a peer site (found by
+their rev watermarks) to a gzip-compressed JSON Lines file, which is
+moved to the peer by any file transfer. import_changes merges such a
+file on the staff_id and UNIQUE(staff_id, date) keys:
+
+    header  {"format": 1, "site": "B1", "to": "HQ", "seq": 12, ...}
+    rows    ["s", staff_id, name, department]
+            ["a", staff_id, name, department, date, time_in, time_out, auto_closed]
+    footer  {"end": true, "staff": 3, "attendance": 412}
+
+Merging is idempotent: a row that is already present with the same
+values is left untouched (so its revision does not move), and a file
+applied before is skipped. Rows an import inserts or updates do get new
+revisions; those that now hold exactly the values the peer sent are
+recorded in sync_echo and left out of the next file to that peer, so
+they are not sent back. Rows a merge changed beyond the peer's copy are
+sent back, so both sites converge. A day recorded at both sites is
+resolved by a conflict rule. Staff deletions, photos, shift
+policies and holidays are not synced.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+from .audit import append_entries, make_entry
+from .policy import LATENESS_SQL
+from .presence import mark_many_present
+from .workdays import extend_calendar
+
+
+FORMAT_VERSION = 1
+
+# Rows written per executemany batch while importing
+IMPORT_BATCH_SIZE = 5000
+
+ATTENDANCE_INSERT = '''
+    INSERT INTO attendance (staff_id, name, department, date, time_in, time_out, auto_closed)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (staff_id, date) DO
+'''
+
+# Earliest sign-in and latest sign-out of both records
+MERGED_TIME_IN = '''MIN(COALESCE(attendance.time_in, excluded.time_in),
+                        COALESCE(excluded.time_in, attendance.time_in))'''
+MERGED_TIME_OUT = '''MAX(COALESCE(attendance.time_out, excluded.time_out),
+                         COALESCE(excluded.time_out, attendance.time_out))'''
+
+# What happens to a day a staff member has a record for at both sites. Each
+# update is guarded so that unchanged rows are not rewritten.
+CONFLICT_RULES = {
+    # Keep the earliest sign-in and the latest sign-out of both
+    "merge": ATTENDANCE_INSERT + f'''
+        UPDATE SET time_in = {MERGED_TIME_IN}, time_out = {MERGED_TIME_OUT}
+        WHERE {MERGED_TIME_IN} IS NOT attendance.time_in OR {MERGED_TIME_OUT} IS NOT attendance.time_out
+    ''',
+    # The incoming record wins
+    "theirs": ATTENDANCE_INSERT + '''
+        UPDATE SET name = excluded.name, department = excluded.department, time_in = excluded.time_in,
+                   time_out = excluded.time_out, auto_closed = excluded.auto_closed
+        WHERE attendance.name IS NOT excluded.name OR attendance.department IS NOT excluded.department
+           OR attendance.time_in IS NOT excluded.time_in OR attendance.time_out IS NOT excluded.time_out
+           OR attendance.auto_closed IS NOT excluded.auto_closed
+    ''',
+    # The local record wins
+    "ours": ATTENDANCE_INSERT + " NOTHING",
+}
+
+# Staff details are taken from the file unless local records win
+STAFF_UPSERT = '''
+    INSERT INTO staff (staff_id, name, department) VALUES (?, ?, ?)
+    ON CONFLICT (staff_id) DO UPDATE SET name = excluded.name, department = excluded.department
+    WHERE staff.name IS NOT excluded.name OR staff.department IS NOT excluded.department
+'''
+STAFF_INSERT = "INSERT OR IGNORE INTO staff (staff_id, name, department) VALUES (?, ?, ?)"
+
+# Revisions written by an import that hold exactly what the peer sent
+STAFF_ECHO = '''
+    INSERT OR IGNORE INTO sync_echo (site_id, table_name, rev)
+    SELECT ?, 'staff', s.rev FROM temp.incoming_staff i JOIN staff s ON s.staff_id = i.staff_id
+    WHERE s.rev > ? AND s.name IS i.name AND s.department IS i.department
+'''
+ATTENDANCE_ECHO = '''
+    INSERT OR IGNORE INTO sync_echo (site_id, table_name, rev)
+    SELECT ?, 'attendance', a.rev
+    FROM temp.incoming_attendance i JOIN attendance a ON a.staff_id = i.staff_id AND a.date = i.date
+    WHERE a.rev > ? AND a.name IS i.name AND a.department IS i.department
+      AND a.time_in IS i.time_in AND a.time_out IS i.time_out
+'''
+
+
+class SyncResult(NamedTuple):
+    path: Path
+    site: str  # Site the file came from
+    seq: int
+    staff: int  # Rows in the file
+    attendance: int
+    changed: int  # Rows inserted or updated by an import (0 for exports)
+    size: int  # Bytes of the file
+    seconds: float
+    skipped: bool = False  # The file had been imported before
+
+    def describe(self) -> str:
+        if self.skipped:
+            return f"{self.path.name}: already imported (site {self.site}, file {self.seq})"
+        return (f"{self.path.name}: site {self.site} file {self.seq}, {self.staff} staff and "
+                f"{self.attendance} attendance rows, {self.changed} changed, "
+                f"{self.size / 1000:.1f} kB in {self.seconds:.1f} s")
+
+
+def init_sync_tables(cursor):
+    """Create the site ID and the per-peer sync state"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    # A new database gets a random site ID; branches usually rename theirs once
+    cursor.execute(
+        "INSERT OR IGNORE INTO sync_state (name, value) VALUES ('site_id', ?)", (uuid.uuid4().hex[:8],)
+    )
+    # Highest revisions and sequence number of the files exported to each peer
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            site_id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL DEFAULT 0,
+            staff_rev INTEGER NOT NULL DEFAULT 0,
+            attendance_rev INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Files imported from each peer
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_applied (
+            site_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            applied_at INTEGER NOT NULL,
+            changed INTEGER NOT NULL,
+            PRIMARY KEY (site_id, seq)
+        )
+    ''')
+    # Revisions of rows written by imports from a peer that match the peer's copy,
+    # left out of the next export to it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_echo (
+            site_id TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            rev INTEGER NOT NULL,
+            PRIMARY KEY (site_id, table_name, rev)
+        ) WITHOUT ROWID
+    ''')
+
+
+def get_site_id(cursor) -> str:
+    cursor.execute("SELECT value FROM sync_state WHERE name = 'site_id'")
+    return cursor.fetchone()[0]
+
+
+def set_site_id(db_path: str, site_id: str):
+    """Rename this database's site (do it before the first exchange with a peer)"""
+    if not site_id or not site_id.replace("-", "").replace("_", "").isalnum():
+        raise ValueError("A site ID is letters, digits, '-' and '_'")
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE sync_state SET value = ? WHERE name = 'site_id'", (site_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def export_changes(db_path: str, peer: str, path: Optional[str] = None, full: bool = False) -> SyncResult:
+    """
+    Write the rows changed since the last export to peer to a change file
+
+    Args:
+        db_path: Path to the SQLite database
+        peer: Site ID of the receiving database
+        path: Output file, or directory for '<site>-to-<peer>-<seq>.sync.gz' (default the working directory)
+        full: Send every row instead of only the changed ones (e.g. after a lost file),
+            including those that came from peer
+
+    Returns:
+        SyncResult of the written file
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        site = get_site_id(cursor)
+        if peer == site:
+            raise ValueError(f"{peer} is this database's own site ID")
+        cursor.execute("SELECT seq, staff_rev, attendance_rev FROM sync_peers WHERE site_id = ?", (peer,))
+        seq, staff_rev, attendance_rev = cursor.fetchone() or (0, 0, 0)
+        if full:
+            staff_rev = attendance_rev = 0
+        seq += 1
+        name = f"{site}-to-{peer}-{seq:06d}.sync.gz"
+        path = Path(path) / name if path and Path(path).is_dir() else Path(path or name)
+        partial = path.with_name(path.name + ".partial")
+
+        # One read transaction, so the rows and the new watermarks are one snapshot
+        cursor.execute("BEGIN")
+        cursor.execute("SELECT COALESCE(MAX(rev), 0) FROM staff")
+        last_staff_rev = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(rev), 0) FROM attendance")
+        last_attendance_rev = cursor.fetchone()[0]
+
+        staff = attendance = 0
+        with gzip.open(partial, "wt", encoding="utf-8") as out:
+            write_line(out, {
+                "format": FORMAT_VERSION, "site": site, "to": peer, "seq": seq, "created": int(time.time()),
+                "staff_rev": [staff_rev, last_staff_rev], "attendance_rev": [attendance_rev, last_attendance_rev],
+            })
+            # Rows written by imports from the peer (unless full) are its own changes
+            echo_site = None if full else peer
+            for row in cursor.execute('''
+                    SELECT staff_id, name, department FROM staff s WHERE rev > ? AND rev <= ?
+                    AND NOT EXISTS (SELECT 1 FROM sync_echo e
+                                    WHERE e.site_id = ? AND e.table_name = 'staff' AND e.rev = s.rev)
+                    ''', (staff_rev, last_staff_rev, echo_site)):
+                write_line(out, ["s", *row])
+                staff += 1
+            for row in cursor.execute('''
+                    SELECT staff_id, name, department, date, time_in, time_out, auto_closed
+                    FROM attendance a WHERE rev > ? AND rev <= ?
+                    AND NOT EXISTS (SELECT 1 FROM sync_echo e
+                                    WHERE e.site_id = ? AND e.table_name = 'attendance' AND e.rev = a.rev)
+                    ''', (attendance_rev, last_attendance_rev, echo_site)):
+                write_line(out, ["a", *row])
+                attendance += 1
+            write_line(out, {"end": True, "staff": staff, "attendance": attendance})
+        conn.commit()
+        os.replace(partial, path)
+
+        # Only a complete file moves the watermarks
+        cursor.execute('''
+            INSERT INTO sync_peers (site_id, seq, staff_rev, attendance_rev) VALUES (?, ?, ?, ?)
+            ON CONFLICT (site_id) DO UPDATE SET seq = excluded.seq, staff_rev = excluded.staff_rev,
+                                               attendance_rev = excluded.attendance_rev
+        ''', (peer, seq, last_staff_rev, last_attendance_rev))
+        cursor.execute(
+            "DELETE FROM sync_echo WHERE site_id = ? AND "
+            "(table_name = 'staff' AND rev <= ? OR table_name = 'attendance' AND rev <= ?)",
+            (peer, last_staff_rev, last_attendance_rev)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    return SyncResult(path, site, seq, staff, attendance, 0, path.stat().st_size, time.perf_counter() - start)
+
+
+def write_line(out, value):
+    out.write(json.dumps(value, separators=(",", ":")))
+    out.write("\n")
+
+
+def read_lines(path: Path) -> Iterator:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as lines:
+            for line in lines:
+                yield json.loads(line)
+    except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+        # A truncated or damaged transfer
+        raise ValueError(f"{path.name} is incomplete or damaged ({e})") from None
+
+
+def import_changes(db_path: str, path: str, conflict: str = "merge") -> SyncResult:
+    """
+    Merge a change file from another site into the database, in one transaction
+
+    Args:
+        db_path: Path to the SQLite database
+        path: File written by export_changes at the other site
+        conflict: One of CONFLICT_RULES, for days recorded at both sites
+
+    Returns:
+        SyncResult with the number of rows that were inserted or changed
+
+    Raises:
+        ValueError: If the rule is unknown, or the file is incomplete, of an
+            unknown format or addressed to another site
+    """
+    if conflict not in CONFLICT_RULES:
+        raise ValueError(f"Unknown conflict rule: {conflict}")
+
+    start = time.perf_counter()
+    path = Path(path)
+    lines = read_lines(path)
+    header = next(lines, None)
+    if not isinstance(header, dict) or header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path.name} is not a change file of format {FORMAT_VERSION}")
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        site, seq = header["site"], header["seq"]
+        own_site = get_site_id(cursor)
+        if header["to"] != own_site:
+            raise ValueError(f"{path.name} is addressed to site {header['to']}, this is {own_site}")
+        cursor.execute("SELECT 1 FROM sync_applied WHERE site_id = ? AND seq = ?", (site, seq))
+        if cursor.fetchone():
+            return SyncResult(path, site, seq, 0, 0, 0, path.stat().st_size, time.perf_counter() - start, True)
+
+        first_rev = cursor.execute("SELECT COALESCE(MAX(rev), 0) FROM attendance").fetchone()[0]
+        first_staff_rev = cursor.execute("SELECT COALESCE(MAX(rev), 0) FROM staff").fetchone()[0]
+        # The file's rows, to tell which of the rows written match the peer's copy
+        cursor.execute("CREATE TEMP TABLE incoming_staff (staff_id, name, department)")
+        cursor.execute(
+            "CREATE TEMP TABLE incoming_attendance (staff_id, name, department, date, time_in, time_out, auto_closed)"
+        )
+        staff_sql = STAFF_INSERT if conflict == "ours" else STAFF_UPSERT
+        staff = attendance = changed = 0
+        footer = None
+        staff_rows, attendance_rows = [], []
+
+        def write_staff():
+            nonlocal changed
+            cursor.executemany(staff_sql, staff_rows)
+            changed += cursor.rowcount
+            cursor.executemany("INSERT INTO temp.incoming_staff VALUES (?, ?, ?)", staff_rows)
+            staff_rows.clear()
+
+        def write_attendance():
+            nonlocal changed
+            cursor.executemany(CONFLICT_RULES[conflict], attendance_rows)
+            changed += cursor.rowcount
+            cursor.executemany("INSERT INTO temp.incoming_attendance VALUES (?, ?, ?, ?, ?, ?, ?)", attendance_rows)
+            attendance_rows.clear()
+
+        for line in lines:
+            if isinstance(line, dict):
+                footer = line
+                break
+            if line[0] == "s":
+                staff_rows.append(line[1:4])
+                staff += 1
+                if len(staff_rows) >= IMPORT_BATCH_SIZE:
+                    write_staff()
+            elif line[0] == "a":
+                attendance_rows.append(line[1:8])
+                attendance += 1
+                if len(attendance_rows) >= IMPORT_BATCH_SIZE:
+                    write_attendance()
+        if not footer or footer.get("staff") != staff or footer.get("attendance") != attendance:
+            raise ValueError(f"{path.name} is incomplete")
+        write_staff()
+        write_attendance()
+
+        # Merged sign-ins are checked against the local shift policies and marked in
+        # the presence bitmaps like local ones
+        cursor.execute(LATENESS_SQL + " AND rev > ?", (first_rev,))
+        cursor.execute("SELECT staff_id, date FROM attendance WHERE rev > ? AND time_in IS NOT NULL", (first_rev,))
+        mark_many_present(cursor, cursor.fetchall())
+        cursor.execute("SELECT MIN(date), MAX(date) FROM attendance WHERE rev > ?", (first_rev,))
+        first_day, last_day = cursor.fetchone()
+        if first_day is not None:
+            extend_calendar(cursor, first_day, last_day)
+
+        cursor.execute(STAFF_ECHO, (site, first_staff_rev))
+        cursor.execute(ATTENDANCE_ECHO, (site, first_rev))
+
+        cursor.execute(
+            "INSERT INTO sync_applied (site_id, seq, applied_at, changed) VALUES (?, ?, ?, ?)",
+            (site, seq, int(time.time()), changed)
+        )
+        append_entries(cursor, [make_entry(
+            "attendance", None, "sync",
+            after={"site": site, "seq": seq, "conflict": conflict, "changed": changed}, source="import"
+        )])
+        conn.commit()
+    finally:
+        conn.close()
+
+    return SyncResult(path, site, seq, staff, attendance, changed, path.stat().st_size, time.perf_counter() - start)
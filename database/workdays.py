@@ -0,0 +1,74 @@
+"""
+Working-day calendar and the absence query built on it
+
+The calendar table has one row per day, named in the holiday column when
+it is a public holiday. A staff member is expected on every calendar day
+that is not a holiday and falls on a working weekday of their
+department's shift policy. Absences are those expected days without an
+attendance row, found by one set-based query over the whole organization.
+Nobody is expected before their start day: the day they were registered,
+or their first sign-in when history was imported from before that.
+"""
+
+from datetime import date
+from typing import Optional
+
+from utils import day_number
+
+
+# Day number used as the start of staff with neither a registration time nor a sign-in
+NEVER = 2 ** 31
+
+# Every staff member with their start day. created_at is UTC text
+# (CURRENT_TIMESTAMP), converted to the local day number; the first sign-in
+# is read from the UNIQUE(staff_id, date) index.
+STAFF_START_SQL = f'''
+    SELECT staff_id, name, department, MIN(
+        COALESCE(CAST(julianday(created_at, 'localtime') - 2440587.5 AS INTEGER), {NEVER}),
+        COALESCE((SELECT MIN(a.date) FROM attendance a
+                  WHERE a.staff_id = staff.staff_id AND a.time_in IS NOT NULL), {NEVER})
+    ) AS start_day
+    FROM staff
+'''
+
+# Every (staff, expected day) pair without a sign-in. The policy is resolved
+# like in LATENESS_SQL, and the anti-join probes the UNIQUE(staff_id, date) index.
+ABSENCES_SQL = f'''
+    SELECT c.date, s.staff_id, s.name, s.department
+    FROM ({STAFF_START_SQL}) s
+    JOIN shift_policy p ON p.department = (
+        SELECT department FROM shift_policy
+        WHERE department IN (s.department, '')
+        ORDER BY department = ''
+        LIMIT 1
+    )
+    JOIN calendar c ON c.date BETWEEN MAX(?, s.start_day) AND ?
+                   AND c.holiday IS NULL
+                   AND (p.working_days >> ((c.date + 3) % 7)) & 1
+    WHERE NOT EXISTS (
+        SELECT 1 FROM attendance a
+        WHERE a.staff_id = s.staff_id AND a.date = c.date AND a.time_in IS NOT NULL
+    )
+'''
+
+
+def extend_calendar(cursor, first_day: int, last_day: int):
+    """Make sure the calendar has a row for every day in the range"""
+    cursor.execute('''
+        WITH RECURSIVE days(day) AS (
+            SELECT ? UNION ALL SELECT day + 1 FROM days WHERE day < ?
+        )
+        INSERT OR IGNORE INTO calendar (date) SELECT day FROM days
+    ''', (first_day, last_day))
+
+
+def absences_query(start_day: int, end_day: int, department: Optional[str] = None):
+    """ABSENCES_SQL for a range of day numbers (inclusive) and optionally one department
+
+    Days after today are left out, as in utils.analytics.absence_report: a
+    working day that has not happened yet is not an absence
+    """
+    end_day = min(end_day, day_number(date.today()))
+    if department is None:
+        return ABSENCES_SQL + " ORDER BY c.date, s.staff_id", (start_day, end_day)
+    return ABSENCES_SQL + " AND s.department = ? ORDER BY c.date, s.staff_id", (start_day, end_day, department)
@@ -3,20 +3,45 @@ Attendance System for NYSC
 Entry point of the application
 """
 
+import argparse
 import sys
+from pathlib import Path
 from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel, QPushButton, QLineEdit
 from PySide6.QtCore import Qt
 from ui.main_window import AttendanceMainWindow
+from utils.profiling import PROFILE_DIR, profile_block, set_capture
 
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Attendance system")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="Log event-loop stalls, profile startup and allow profile capture (Ctrl+Shift+P)")
+    parser.add_argument("--diagnostics-dir", default=PROFILE_DIR, help="Where stall logs and profiles are written")
+    # Everything else is left to Qt
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
-    # Create and show the main window
-    window = AttendanceMainWindow()
-    window.show()
+    if not args.diagnostics:
+        # Create and show the main window
+        window = AttendanceMainWindow()
+        window.show()
+        
+        # Start the application event loop
+        sys.exit(app.exec())
+    
+    # Only imported in diagnostics mode
+    from ui.diagnostics import StallWatchdog, install_capture_shortcut
+    
+    set_capture(False, args.diagnostics_dir)
+    with profile_block("startup"):
+        window = AttendanceMainWindow()
+        window.show()
+    
+    watchdog = StallWatchdog(Path(args.diagnostics_dir) / "stalls.log")
+    watchdog.start()
+    app.aboutToQuit.connect(watchdog.stop)
+    install_capture_shortcut(window)
     
-    # Start the application event loop
     sys.exit(app.exec())
 
 
@@ -0,0 +1,90 @@
+"""
+Tests for the working-day absence query
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from database import DatabaseManager
+from utils import day_number, format_day
+from utils.analytics import absence_report
+
+
+EVERY_DAY = 0b1111111
+
+
+class AbsencesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.directory.name, "attendance.db"))
+        self.db.set_shift_policy("", 8 * 3600, 15, EVERY_DAY)
+        self.db.add_staff("001", "Ada", "Finance")
+        self.today = day_number(date.today())
+
+    def tearDown(self):
+        self.db.audit.close()
+        self.directory.cleanup()
+
+    def test_range_ending_in_the_future_stops_at_today(self):
+        # The calendar of a new database runs from today to the end of next year
+        absences = list(self.db.iter_absences(self.today, self.today + 30))
+
+        self.assertEqual(absences, [(self.today, "001", "Ada", "Finance")])
+
+    def test_range_entirely_in_the_future_has_no_absences(self):
+        self.assertEqual(list(self.db.iter_absences(self.today + 1, self.today + 30)), [])
+
+    def test_sign_in_today_is_not_an_absence(self):
+        self.db.log_attendance("001")
+
+        self.assertEqual(list(self.db.iter_absences(self.today, self.today + 30)), [])
+
+    def test_days_before_registration_are_not_absences(self):
+        self.extend_calendar(self.today - 3)
+
+        self.assertEqual(list(self.db.iter_absences(self.today - 3, self.today)),
+                         [(self.today, "001", "Ada", "Finance")])
+
+    def test_imported_history_starts_before_registration(self):
+        self.extend_calendar(self.today - 3)
+        self.db.log_attendance("001")
+        self.execute("UPDATE attendance SET date = ?", (self.today - 2,))
+
+        self.assertEqual([row[0] for row in self.db.iter_absences(self.today - 3, self.today)],
+                         [self.today - 1, self.today])
+
+    def test_staff_registered_earlier_are_expected_from_then(self):
+        self.extend_calendar(self.today - 3)
+        self.execute("UPDATE staff SET created_at = datetime('now', '-2 days')")
+
+        self.assertEqual([row[0] for row in self.db.iter_absences(self.today - 3, self.today)],
+                         [self.today - 2, self.today - 1, self.today])
+
+    def test_report_counts_from_the_start_day_like_the_query(self):
+        self.extend_calendar(self.today - 3)
+        self.db.log_attendance("001")
+        self.execute("UPDATE attendance SET date = ?", (self.today - 2,))
+        self.db.rebuild_presence()
+
+        report = absence_report(self.db.db_path, format_day(self.today - 3), format_day(self.today))
+
+        # Three working days from the first sign-in, two of them absent
+        self.assertEqual(report[0][3:6], (3, 1, 2))
+        self.assertEqual(report[0][5], len(list(self.db.iter_absences(self.today - 3, self.today))))
+
+    def extend_calendar(self, first_day):
+        for day in range(first_day, self.today):
+            self.db.set_holiday(day, None)
+
+    def execute(self, query, params=()):
+        conn = sqlite3.connect(self.db.db_path)
+        with conn:
+            conn.execute(query, params)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
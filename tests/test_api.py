@@ -0,0 +1,104 @@
+"""
+Tests for the HTTP API's keyset paging and ETags
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from database import DatabaseManager
+from database.api import ApiServer
+
+
+class ApiTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "attendance.db")
+        self.db = DatabaseManager(self.db_path)
+        for number in range(1, 6):
+            self.db.add_staff(f"00{number}", f"Staff {number}", "Finance")
+        self.server = ApiServer(self.db_path, port=0)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.audit.close()
+        self.directory.cleanup()
+
+    def get(self, path, etag=None):
+        request = urllib.request.Request(f"http://127.0.0.1:{self.server.server_port}{path}")
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers["ETag"], json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers["ETag"], None
+
+    def pages(self, path):
+        """Items of every page, following next until there are no more"""
+        items = []
+        status, _, page = self.get(path)
+        items.append(page["items"])
+        while page["more"]:
+            status, _, page = self.get(f"{path}&after={page['next']}")
+            items.append(page["items"])
+        return items
+
+    def execute(self, query, params=()):
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.executemany(query, params)
+        conn.close()
+
+    def test_staff_pages_continue_after_the_last_id(self):
+        pages = self.pages("/staff?limit=2")
+
+        self.assertEqual([[item["staff_id"] for item in page] for page in pages],
+                         [["001", "002"], ["003", "004"], ["005"]])
+
+    def test_rows_added_before_the_cursor_do_not_shift_later_pages(self):
+        _, _, first = self.get("/staff?limit=2")
+        self.db.add_staff("000", "Staff 0", "Finance")
+        _, _, second = self.get(f"/staff?limit=2&after={first['next']}")
+
+        self.assertEqual([item["staff_id"] for item in second["items"]], ["003", "004"])
+
+    def test_attendance_pages_are_ordered_by_day_then_id(self):
+        # Two staff on each of three days (2024-10-07 to 09), inserted newest day first
+        self.execute(
+            "INSERT INTO attendance (staff_id, name, department, date, time_in) VALUES (?, ?, 'Finance', ?, ?)",
+            [(f"00{number}", f"Staff {number}", day, day * 86400 + 8 * 3600)
+             for day in (20005, 20004, 20003) for number in (1, 2)]
+        )
+        pages = self.pages("/attendance?from=2024-10-07&to=2024-10-08&limit=3")
+
+        self.assertEqual([[(item["date"], item["staff_id"]) for item in page] for page in pages], [
+            [("2024-10-07", "001"), ("2024-10-07", "002"), ("2024-10-08", "001")],
+            [("2024-10-08", "002")],
+        ])
+
+    def test_changes_continue_after_the_last_revision(self):
+        _, _, first = self.get("/changes?table=staff&since=0&limit=3")
+        self.db.update_staff("001", "Ada", "Finance")
+        _, _, second = self.get(f"/changes?table=staff&since={first['next']}")
+
+        self.assertEqual([item["staff_id"] for item in second["items"]], ["004", "005", "001"])
+
+    def test_etag_changes_when_a_row_is_deleted(self):
+        status, etag, _ = self.get("/staff")
+        self.assertEqual(self.get("/staff", etag)[0], 304)
+
+        self.db.delete_staff("005")
+
+        self.assertEqual(self.get("/staff", etag)[0], 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
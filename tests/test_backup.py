@@ -0,0 +1,49 @@
+"""
+Tests for online backups and snapshot rotation
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from database import DatabaseManager
+from database import backup
+from database.backup import backup_database, list_snapshots
+
+
+class FrozenClock(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 10, 19, 9, 13, 24, 500)
+
+
+class BackupTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "a.db")
+        self.backup_dir = os.path.join(self.directory.name, "backups")
+        db = DatabaseManager(self.db_path)
+        db.add_staff("001", "Ada", "Finance")
+        db.audit.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_backups_at_the_same_time_get_their_own_snapshots(self):
+        with mock.patch.object(backup, "datetime", FrozenClock):
+            first = backup_database(self.db_path, self.backup_dir, pause=0)
+            second = backup_database(self.db_path, self.backup_dir, pause=0)
+
+        self.assertNotEqual(first.path, second.path)
+        self.assertEqual(list_snapshots(self.db_path, self.backup_dir), [first.path, second.path])
+
+    def test_rotation_keeps_the_newest_snapshots(self):
+        paths = [backup_database(self.db_path, self.backup_dir, keep=2, pause=0).path for _ in range(4)]
+
+        self.assertEqual(list_snapshots(self.db_path, self.backup_dir), paths[-2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for the conversion of text dates and times to day numbers and epoch seconds
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from database import DatabaseManager
+from utils import day_number
+
+
+class EpochMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, "attendance.db")
+        # The schema of databases written before dates and times were stored as numbers
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript('''
+            CREATE TABLE staff (
+                staff_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                department TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE attendance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                staff_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                department TEXT NOT NULL,
+                date TEXT NOT NULL,
+                time_in TEXT,
+                time_out TEXT,
+                timestamp_in DATETIME,
+                timestamp_out DATETIME,
+                UNIQUE(staff_id, date)
+            );
+            INSERT INTO staff (staff_id, name, department) VALUES ('001', 'Ada', 'Finance');
+            INSERT INTO attendance (id, staff_id, name, department, date, time_in, time_out)
+            VALUES (7, '001', 'Ada', 'Finance', '2025-03-14', '08:30:00', '17:05:30'),
+                   (9, '001', 'Ada', 'Finance', '2025-03-17', '09:10:00', NULL);
+        ''')
+        conn.close()
+        self.db = DatabaseManager(self.db_path)
+
+    def tearDown(self):
+        self.db.audit.close()
+        self.directory.cleanup()
+
+    def rows(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT id, date, time_in, time_out FROM attendance ORDER BY id").fetchall()
+        conn.close()
+        return rows
+
+    def test_text_values_become_day_numbers_and_local_epoch_seconds(self):
+        self.assertEqual(self.rows(), [
+            (7, day_number(date(2025, 3, 14)),
+             int(datetime(2025, 3, 14, 8, 30).timestamp()), int(datetime(2025, 3, 14, 17, 5, 30).timestamp())),
+            (9, day_number(date(2025, 3, 17)), int(datetime(2025, 3, 17, 9, 10).timestamp()), None),
+        ])
+
+    def test_reopening_a_migrated_database_keeps_it(self):
+        rows = self.rows()
+        self.db.audit.close()
+        self.db = DatabaseManager(self.db_path)
+
+        self.assertEqual(self.rows(), rows)
+
+    def test_migrated_rows_get_revisions(self):
+        self.assertEqual(self.db.get_revision("attendance"), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
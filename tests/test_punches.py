@@ -0,0 +1,55 @@
+"""
+Tests for the punch debounce window
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from database import DatabaseManager
+
+
+class PunchDebounceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.directory.name, "attendance.db"), punch_debounce=60)
+        self.db.add_staff("001", "Ada", "Finance")
+        self.clock = time.monotonic()
+
+    def tearDown(self):
+        self.db.audit.close()
+        self.directory.cleanup()
+
+    def punch(self, seconds_later=0):
+        with mock.patch("time.monotonic", return_value=self.clock + seconds_later):
+            return self.db.log_attendance("001")
+
+    def time_out(self):
+        return self.db.get_all_attendance()[0].time_out
+
+    def test_repeated_punch_within_the_window_repeats_the_result(self):
+        first = self.punch()
+        second = self.punch(59)
+
+        self.assertEqual(first.action, "Sign In")
+        self.assertIs(second, first)
+        self.assertIsNone(self.time_out())
+
+    def test_punch_after_the_window_signs_out(self):
+        self.punch()
+        result = self.punch(60)
+
+        self.assertEqual(result.action, "Sign Out")
+        self.assertIsNotNone(self.time_out())
+
+    def test_unknown_id_is_not_remembered(self):
+        self.assertIsNone(self.db.log_attendance("999"))
+        self.db.add_staff("999", "Grace", "Finance")
+
+        self.assertEqual(self.db.log_attendance("999").action, "Sign In")
+
+
+if __name__ == "__main__":
+    unittest.main()
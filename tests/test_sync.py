@@ -0,0 +1,110 @@
+"""
+Tests for branch sync through change files
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import DatabaseManager
+from database.sync import export_changes, import_changes, set_site_id
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sites = {}
+        for site in ("A", "B"):
+            path = os.path.join(self.directory.name, f"{site}.db")
+            db = DatabaseManager(path)
+            db.audit.close()
+            set_site_id(path, site)
+            self.sites[site] = path
+        self.files = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def send(self, source, target, conflict="merge"):
+        """Export source's changes to target and import them; returns (export, import) results"""
+        self.files += 1
+        path = os.path.join(self.directory.name, f"{self.files}.sync.gz")
+        exported = export_changes(self.sites[source], target, path)
+        return exported, import_changes(self.sites[target], path, conflict)
+
+    def execute(self, site, sql, params=()):
+        conn = sqlite3.connect(self.sites[site])
+        try:
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def add_day(self, site, staff_id, day, time_in, time_out):
+        self.execute(site, "INSERT OR IGNORE INTO staff (staff_id, name, department) VALUES (?, 'Ada', 'Finance')",
+                     (staff_id,))
+        self.execute(site, "INSERT INTO attendance (staff_id, name, department, date, time_in, time_out) "
+                           "VALUES (?, 'Ada', 'Finance', ?, ?, ?)", (staff_id, day, time_in, time_out))
+
+    def test_round_trip_copies_rows(self):
+        self.add_day("A", "001", 20000, 1728000000, 1728030000)
+
+        exported, imported = self.send("A", "B")
+
+        self.assertEqual((exported.staff, exported.attendance), (1, 1))
+        self.assertEqual(imported.changed, 2)
+        self.assertEqual(self.execute("B", "SELECT staff_id, date, time_in, time_out FROM attendance"),
+                         [("001", 20000, 1728000000, 1728030000)])
+
+    def test_imported_rows_are_not_sent_back(self):
+        self.add_day("A", "001", 20000, 1728000000, 1728030000)
+        self.send("A", "B")
+
+        exported, _ = self.send("B", "A")
+
+        self.assertEqual((exported.staff, exported.attendance), (0, 0))
+
+    def test_local_changes_after_an_import_are_sent(self):
+        self.add_day("A", "001", 20000, 1728000000, 1728030000)
+        self.send("A", "B")
+        self.add_day("B", "002", 20000, 1728001000, None)
+
+        exported, _ = self.send("B", "A")
+
+        self.assertEqual((exported.staff, exported.attendance), (1, 1))
+
+    def test_merged_day_is_sent_back_so_both_sites_agree(self):
+        self.add_day("A", "001", 20000, 1728000000, None)
+        self.add_day("B", "001", 20000, 1728003000, 1728030000)
+        self.send("A", "B")
+
+        exported, _ = self.send("B", "A")
+
+        self.assertEqual(exported.attendance, 1)
+        query = "SELECT time_in, time_out FROM attendance"
+        self.assertEqual(self.execute("A", query), [(1728000000, 1728030000)])
+        self.assertEqual(self.execute("B", query), [(1728000000, 1728030000)])
+
+    def test_file_is_imported_once(self):
+        self.add_day("A", "001", 20000, 1728000000, 1728030000)
+        exported, _ = self.send("A", "B")
+
+        again = import_changes(self.sites["B"], str(exported.path))
+
+        self.assertTrue(again.skipped)
+
+    def test_truncated_file_is_rejected(self):
+        self.add_day("A", "001", 20000, 1728000000, 1728030000)
+        exported = export_changes(self.sites["A"], "B", os.path.join(self.directory.name, "a.sync.gz"))
+        data = exported.path.read_bytes()
+        exported.path.write_bytes(data[:len(data) // 2])
+
+        with self.assertRaises(ValueError):
+            import_changes(self.sites["B"], str(exported.path))
+        self.assertEqual(self.execute("B", "SELECT COUNT(*) FROM attendance"), [(0,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,17 +5,49 @@ Admin widget for managing staff and viewing attendance
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QPushButton, QLineEdit, QTableWidget, 
-    QTableWidgetItem, QTabWidget, QFormLayout, QGroupBox, QHeaderView, QFileDialog, QDialog, QMessageBox
+    QTableWidgetItem, QTabWidget, QFormLayout, QGroupBox, QHeaderView, QFileDialog, QDialog, QMessageBox,
+    QDateEdit, QComboBox, QTimeEdit, QSpinBox, QCheckBox
 )
-from PySide6.QtCore import Qt
-from database import DatabaseManager
+from PySide6.QtCore import Qt, QTimer, QThreadPool, QDate, QTime
+from PySide6.QtGui import QPixmap
+from database import ATTENDANCE_COLUMNS, PAGE_SIZE, STAFF_COLUMNS, DatabaseManager
+from database.policy import DEFAULT_POLICY, WEEKDAYS
+from utils import format_attendance_record, parse_day
+from utils.profiling import profiled
+from .photo_cache import THUMBNAIL_SIZE, decode_photo, encode_photo
+from .workers import Worker
 import csv
 
+# Delay after the last keystroke before a search query is run
+SEARCH_DEBOUNCE_MS = 250
+
+# (column, descending) each table is ordered by until a header is clicked
+DEFAULT_STAFF_SORT = ("name", False)
+DEFAULT_ATTENDANCE_SORT = ("time_in", True)
+
 
 class AdminWidget(QWidget):
     def __init__(self):
         super().__init__()
         self.db = DatabaseManager()
+        # Incremented per search so results of superseded queries are discarded
+        self.staff_search_generation = 0
+        self.attendance_search_generation = 0
+        # Highest revision shown in each table; None forces a full reload
+        self.staff_watermark = None
+        self.attendance_watermark = None
+        # Items of the first column by staff ID / attendance id, to find rows after inserts
+        self.staff_items = {}
+        self.attendance_items = {}
+        # Order of each table, chosen by clicking a column header
+        self.staff_sort = DEFAULT_STAFF_SORT
+        self.attendance_sort = DEFAULT_ATTENDANCE_SORT
+        # Whether the last loaded page was full, so scrolling to the end loads another
+        self.staff_has_more = False
+        self.attendance_has_more = False
+        # Deletion counts as of the last refresh, to notice rows removed elsewhere
+        self.staff_deletes = 0
+        self.attendance_deletes = 0
         self.init_ui()
     
     def init_ui(self):
@@ -57,6 +89,14 @@ class AdminWidget(QWidget):
         attendance_tab = self.create_attendance_tab()
         tab_widget.addTab(attendance_tab, "Attendance Records")
         
+        # Analytics report tab
+        report_tab = self.create_report_tab()
+        tab_widget.addTab(report_tab, "Reports")
+        
+        # Shift policy tab
+        policy_tab = self.create_policy_tab()
+        tab_widget.addTab(policy_tab, "Shift Policies")
+        
         # Export tab
         export_tab = self.create_export_tab()
         tab_widget.addTab(export_tab, "Export Data")
@@ -190,7 +230,25 @@ class AdminWidget(QWidget):
         self.staff_table.setColumnWidth(4, 80)   # Delete button (fixed width)
         self.staff_table.setColumnHidden(5, True)  # Hide the ID storage column
         
+        # Sorting and paging are done by the database, not by the widget
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self.sort_staff)
+        self.show_sort_indicator(self.staff_table, STAFF_COLUMNS, self.staff_sort)
+        self.staff_table.verticalScrollBar().valueChanged.connect(self.on_staff_scrolled)
+        
+        self.staff_search_input = self.create_search_input("Search by staff ID, name or department")
+        self.staff_search_timer = self.create_debounce_timer(self.search_staff)
+        self.staff_search_input.textChanged.connect(lambda _: self.staff_search_timer.start())
+        
+        self.staff_filter_inputs, staff_filter_layout = self.create_filter_inputs(
+            {"staff_id": "Staff ID starts with", "name": "Name starts with", "department": "Department starts with"},
+            self.staff_search_timer
+        )
+        
         layout.addWidget(QLabel("Registered Staff"))
+        layout.addWidget(self.staff_search_input)
+        layout.addLayout(staff_filter_layout)
         layout.addWidget(self.staff_table)
         
         refresh_staff_button = QPushButton("Refresh Staff")
@@ -248,7 +306,26 @@ class AdminWidget(QWidget):
         self.attendance_table.setColumnWidth(4, 120)  # Time In (same as Date/Time Out)
         self.attendance_table.setColumnWidth(5, 120)  # Time Out (same as Date/Time In)
         
+        # Sorting and paging are done by the database, not by the widget
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self.sort_attendance)
+        self.show_sort_indicator(self.attendance_table, ATTENDANCE_COLUMNS, self.attendance_sort)
+        self.attendance_table.verticalScrollBar().valueChanged.connect(self.on_attendance_scrolled)
+        
+        self.attendance_search_input = self.create_search_input("Search by staff ID, name or department")
+        self.attendance_search_timer = self.create_debounce_timer(self.search_attendance)
+        self.attendance_search_input.textChanged.connect(lambda _: self.attendance_search_timer.start())
+        
+        self.attendance_filter_inputs, attendance_filter_layout = self.create_filter_inputs(
+            {"staff_id": "Staff ID starts with", "name": "Name starts with",
+             "department": "Department starts with", "date": "Date (YYYY-MM-DD)"},
+            self.attendance_search_timer
+        )
+        
         layout.addWidget(QLabel("Attendance Records"))
+        layout.addWidget(self.attendance_search_input)
+        layout.addLayout(attendance_filter_layout)
         layout.addWidget(self.attendance_table)
         
         refresh_button = QPushButton("Refresh Records")
@@ -274,6 +351,181 @@ class AdminWidget(QWidget):
         tab.setLayout(layout)
         return tab
     
+    def create_report_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout()
+        
+        # Report options: date range and grouping
+        options_layout = QHBoxLayout()
+        
+        self.report_start_date = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.report_start_date.setCalendarPopup(True)
+        self.report_start_date.setDisplayFormat("yyyy-MM-dd")
+        self.report_end_date = QDateEdit(QDate.currentDate())
+        self.report_end_date.setCalendarPopup(True)
+        self.report_end_date.setDisplayFormat("yyyy-MM-dd")
+        
+        self.report_group_input = QComboBox()
+        self.report_group_input.addItem("By Staff", "staff")
+        self.report_group_input.addItem("By Department", "department")
+        
+        options_layout.addWidget(QLabel("From:"))
+        options_layout.addWidget(self.report_start_date)
+        options_layout.addWidget(QLabel("To:"))
+        options_layout.addWidget(self.report_end_date)
+        options_layout.addWidget(self.report_group_input)
+        
+        self.report_button = QPushButton("Generate Report")
+        self.report_button.clicked.connect(self.generate_report)
+        self.report_button.setStyleSheet("""
+            QPushButton {
+                background-color: #3B82F6;  /* Light blue */
+                color: white;
+                border: none;
+                padding: 8px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #2563EB;  /* Medium blue */
+            }
+            QPushButton:pressed {
+                background-color: #1D4ED8;  /* Darker blue */
+            }
+        """)
+        options_layout.addWidget(self.report_button)
+        layout.addLayout(options_layout)
+        
+        # Table to display the aggregates
+        self.report_table = QTableWidget()
+        self.report_table.setColumnCount(9)
+        self.report_table.setHorizontalHeaderLabels([
+            "Staff ID", "Name", "Days Present", "Total Hours", "Mean Arrival",
+            "Median Arrival", "90th Pct Arrival", "Late %", "Early Departures"
+        ])
+        self.report_table.setStyleSheet("""
+            QTableWidget {
+                border: 1px solid #3B82F6;  /* Light blue */
+                alternate-background-color: #F0F9FF;  /* Very light blue */
+                selection-background-color: #BAE6FD;  /* Lighter blue for selected items */
+            }
+            QHeaderView::section {
+                background-color: #1E3A8A;  /* Dark blue */
+                color: white;
+                padding: 4px;
+                border: 1px solid #3B82F6;  /* Light blue */
+            }
+        """)
+        self.report_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        
+        layout.addWidget(QLabel("Hours Worked and Punctuality"))
+        layout.addWidget(self.report_table)
+        
+        tab.setLayout(layout)
+        return tab
+    
+    def create_policy_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout()
+        
+        # Table to display the configured policies
+        self.policy_table = QTableWidget()
+        self.policy_table.setColumnCount(4)
+        self.policy_table.setHorizontalHeaderLabels(["Department", "Start Time", "Grace (min)", "Working Days"])
+        self.policy_table.setStyleSheet("""
+            QTableWidget {
+                border: 1px solid #3B82F6;  /* Light blue */
+                alternate-background-color: #F0F9FF;  /* Very light blue */
+                selection-background-color: #BAE6FD;  /* Lighter blue for selected items */
+            }
+            QHeaderView::section {
+                background-color: #1E3A8A;  /* Dark blue */
+                color: white;
+                padding: 4px;
+                border: 1px solid #3B82F6;  /* Light blue */
+            }
+        """)
+        self.policy_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.policy_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.policy_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.policy_table.cellClicked.connect(self.load_policy_into_form)
+        
+        layout.addWidget(QLabel("Shift Policies"))
+        layout.addWidget(self.policy_table)
+        
+        # Form to create or change a policy
+        form_group = QGroupBox("Edit Policy")
+        form_group.setStyleSheet("""
+            QGroupBox {
+                font-weight: bold;
+                border: 2px solid #1E3A8A;  /* Dark blue */
+                border-radius: 5px;
+                margin: 10px 0px;
+                padding-top: 15px;
+                color: #0F172A;  /* Dark blue-gray for better contrast */
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                subcontrol-position: top center;
+                padding: 0 5px;
+                color: #0F172A;  /* Dark blue-gray for better contrast */
+                font-weight: bold;
+            }
+        """)
+        form_layout = QFormLayout()
+        
+        self.policy_department_input = QLineEdit()
+        self.policy_department_input.setPlaceholderText("Leave blank for the default policy")
+        self.policy_start_input = QTimeEdit(QTime(8, 30))
+        self.policy_start_input.setDisplayFormat("HH:mm")
+        self.policy_grace_input = QSpinBox()
+        self.policy_grace_input.setRange(0, 240)
+        self.policy_grace_input.setSuffix(" min")
+        
+        days_layout = QHBoxLayout()
+        self.policy_day_checks = []
+        for day_name in WEEKDAYS:
+            check = QCheckBox(day_name)
+            self.policy_day_checks.append(check)
+            days_layout.addWidget(check)
+        
+        form_layout.addRow("Department:", self.policy_department_input)
+        form_layout.addRow("Start Time:", self.policy_start_input)
+        form_layout.addRow("Grace Period:", self.policy_grace_input)
+        form_layout.addRow("Working Days:", days_layout)
+        
+        buttons_layout = QHBoxLayout()
+        save_policy_button = QPushButton("Save Policy")
+        save_policy_button.clicked.connect(self.save_policy)
+        delete_policy_button = QPushButton("Delete Policy")
+        delete_policy_button.clicked.connect(self.delete_policy)
+        for button in (save_policy_button, delete_policy_button):
+            button.setStyleSheet("""
+                QPushButton {
+                    background-color: #3B82F6;  /* Light blue */
+                    color: white;
+                    border: none;
+                    padding: 8px;
+                    border-radius: 5px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #2563EB;  /* Medium blue */
+                }
+                QPushButton:pressed {
+                    background-color: #1D4ED8;  /* Darker blue */
+                }
+            """)
+            buttons_layout.addWidget(button)
+        form_layout.addRow(buttons_layout)
+        
+        form_group.setLayout(form_layout)
+        layout.addWidget(form_group)
+        
+        tab.setLayout(layout)
+        self.refresh_policies()
+        return tab
+    
     def create_export_tab(self):
         tab = QWidget()
         layout = QVBoxLayout()
@@ -360,6 +612,294 @@ class AdminWidget(QWidget):
         tab.setLayout(layout)
         return tab
     
+    def on_tables_changed(self, tables):
+        """Update the views showing tables that another connection changed"""
+        # Tables are only kept live once loaded; a searched, filtered or re-sorted
+        # table reloads the pages it shows
+        if "staff" in tables:
+            if not self.is_default_staff_view():
+                self.load_staff(max(self.staff_table.rowCount(), PAGE_SIZE))
+            elif self.staff_watermark is not None:
+                self.refresh_staff()
+        
+        if "attendance" in tables:
+            if not self.is_default_attendance_view():
+                self.load_attendance(max(self.attendance_table.rowCount(), PAGE_SIZE))
+            elif self.attendance_watermark is not None:
+                self.refresh_attendance()
+        
+        if "shift_policy" in tables:
+            self.db.load_policies()
+            self.refresh_policies()
+    
+    def create_search_input(self, placeholder):
+        search_input = QLineEdit()
+        search_input.setPlaceholderText(placeholder)
+        search_input.setClearButtonEnabled(True)
+        search_input.setStyleSheet("""
+            QLineEdit {
+                padding: 8px;
+                border: 1px solid #3B82F6;  /* Light blue */
+                border-radius: 4px;
+                color: #0F172A;  /* Dark blue-gray for better contrast */
+                background-color: white;
+            }
+            QLineEdit:focus {
+                border: 2px solid #1E3A8A;  /* Dark blue */
+            }
+        """)
+        return search_input
+    
+    def create_filter_inputs(self, placeholders, timer):
+        """One filter box per column, restarting the table's debounce timer as they are typed in"""
+        inputs = {}
+        filter_layout = QHBoxLayout()
+        for column, placeholder in placeholders.items():
+            filter_input = self.create_search_input(placeholder)
+            filter_input.textChanged.connect(lambda _: timer.start())
+            filter_layout.addWidget(filter_input)
+            inputs[column] = filter_input
+        return inputs, filter_layout
+    
+    def show_sort_indicator(self, table, columns, sort):
+        column, descending = sort
+        table.horizontalHeader().setSortIndicator(
+            columns.index(column), Qt.DescendingOrder if descending else Qt.AscendingOrder
+        )
+    
+    def next_sort(self, columns, current, section):
+        """The order after clicking a header section; clicking the sorted column again reverses it"""
+        if section >= len(columns):
+            return current  # Button columns are not sortable
+        column = columns[section]
+        return column, not current[1] if current[0] == column else False
+    
+    def create_debounce_timer(self, slot):
+        # Restarted on every keystroke, so the slot only runs once typing pauses
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(SEARCH_DEBOUNCE_MS)
+        timer.timeout.connect(slot)
+        return timer
+    
+    def staff_view(self):
+        """Sort order, column filters and search text applied to the staff table"""
+        sort, descending = self.staff_sort
+        return {
+            "sort": sort,
+            "descending": descending,
+            "filters": {column: box.text().strip() for column, box in self.staff_filter_inputs.items()},
+            "search": self.staff_search_input.text(),
+        }
+    
+    def is_default_staff_view(self):
+        """Whether the staff table shows every staff member in the default order"""
+        return (self.staff_sort == DEFAULT_STAFF_SORT and not self.staff_search_input.text().strip()
+                and not any(box.text().strip() for box in self.staff_filter_inputs.values()))
+    
+    def sort_staff(self, section):
+        sort = self.next_sort(STAFF_COLUMNS, self.staff_sort, section)
+        # The header moves its indicator on any click; put it back where the order is
+        self.show_sort_indicator(self.staff_table, STAFF_COLUMNS, sort)
+        if sort != self.staff_sort:
+            self.staff_sort = sort
+            self.load_staff(PAGE_SIZE)
+    
+    def search_staff(self):
+        """Load the first page for the current search text and filters"""
+        self.load_staff(PAGE_SIZE)
+    
+    def load_staff(self, limit):
+        """Query the first limit staff of the current view on the thread pool"""
+        if self.is_default_staff_view():
+            # Back to the full, incrementally refreshed list
+            self.refresh_staff()
+            return
+        
+        self.staff_search_generation += 1
+        generation = self.staff_search_generation
+        
+        self.staff_search_worker = Worker(self.db.get_staff_page, limit=limit, **self.staff_view())
+        self.staff_search_worker.signals.finished.connect(
+            lambda rows: self.show_staff_search_results(generation, rows, limit)
+        )
+        QThreadPool.globalInstance().start(self.staff_search_worker)
+    
+    def show_staff_search_results(self, generation, rows, limit):
+        # Ignore results that arrive after a newer search was started
+        if generation == self.staff_search_generation:
+            self.populate_staff_table(rows, limit)
+    
+    def on_staff_scrolled(self, value):
+        if self.staff_has_more and value == self.staff_table.verticalScrollBar().maximum():
+            self.load_more_staff()
+    
+    def load_more_staff(self):
+        """Append the next page of the current view"""
+        rows = self.db.get_staff_page(offset=self.staff_table.rowCount(), **self.staff_view())
+        self.append_staff_rows(rows, PAGE_SIZE)
+    
+    def attendance_view(self):
+        """Sort order, column filters and search text applied to the attendance table"""
+        sort, descending = self.attendance_sort
+        filters = {column: box.text().strip() for column, box in self.attendance_filter_inputs.items()}
+        try:
+            filters["date"] = parse_day(filters["date"]) if filters["date"] else None
+        except ValueError:
+            filters["date"] = None  # Not a complete date yet
+        return {
+            "sort": sort,
+            "descending": descending,
+            "filters": filters,
+            "search": self.attendance_search_input.text(),
+        }
+    
+    def is_default_attendance_view(self):
+        """Whether the attendance table shows every record in the default order"""
+        return (self.attendance_sort == DEFAULT_ATTENDANCE_SORT and not self.attendance_search_input.text().strip()
+                and not any(box.text().strip() for box in self.attendance_filter_inputs.values()))
+    
+    def sort_attendance(self, section):
+        sort = self.next_sort(ATTENDANCE_COLUMNS, self.attendance_sort, section)
+        # The header moves its indicator on any click; put it back where the order is
+        self.show_sort_indicator(self.attendance_table, ATTENDANCE_COLUMNS, sort)
+        if sort != self.attendance_sort:
+            self.attendance_sort = sort
+            self.load_attendance(PAGE_SIZE)
+    
+    def search_attendance(self):
+        """Load the first page for the current search text and filters"""
+        self.load_attendance(PAGE_SIZE)
+    
+    def load_attendance(self, limit):
+        """Query the first limit attendance records of the current view on the thread pool"""
+        if self.is_default_attendance_view():
+            # Back to the full, incrementally refreshed list
+            self.refresh_attendance()
+            return
+        
+        self.attendance_search_generation += 1
+        generation = self.attendance_search_generation
+        
+        self.attendance_search_worker = Worker(self.db.get_attendance_page, limit=limit, **self.attendance_view())
+        self.attendance_search_worker.signals.finished.connect(
+            lambda rows: self.show_attendance_search_results(generation, rows, limit)
+        )
+        QThreadPool.globalInstance().start(self.attendance_search_worker)
+    
+    def show_attendance_search_results(self, generation, rows, limit):
+        # Ignore results that arrive after a newer search was started
+        if generation == self.attendance_search_generation:
+            self.populate_attendance_table(rows, limit)
+    
+    def on_attendance_scrolled(self, value):
+        if self.attendance_has_more and value == self.attendance_table.verticalScrollBar().maximum():
+            self.load_more_attendance()
+    
+    def load_more_attendance(self):
+        """Append the next page of the current view"""
+        rows = self.db.get_attendance_page(offset=self.attendance_table.rowCount(), **self.attendance_view())
+        self.append_attendance_rows(rows, PAGE_SIZE)
+    
+    def generate_report(self):
+        """Compute the analytics report on the thread pool"""
+        from utils.analytics import attendance_report
+        
+        start_date = self.report_start_date.date().toString("yyyy-MM-dd")
+        end_date = self.report_end_date.date().toString("yyyy-MM-dd")
+        group_by = self.report_group_input.currentData()
+        
+        self.report_button.setEnabled(False)
+        # Reopening an unchanged report is answered from the query cache
+        self.report_worker = Worker(
+            self.db.cached, ("attendance_report", start_date, end_date, group_by),
+            lambda: attendance_report(self.db.db_path, start_date, end_date, group_by)
+        )
+        self.report_worker.signals.finished.connect(self.show_report)
+        self.report_worker.signals.failed.connect(self.report_failed)
+        QThreadPool.globalInstance().start(self.report_worker)
+    
+    def show_report(self, rows):
+        from utils.analytics import seconds_to_time
+        
+        self.report_button.setEnabled(True)
+        self.report_table.setRowCount(0)  # Clear existing data
+        
+        # Department reports have no separate name column
+        by_department = self.report_group_input.currentData() == "department"
+        self.report_table.horizontalHeaderItem(0).setText("Department" if by_department else "Staff ID")
+        self.report_table.setColumnHidden(1, by_department)
+        
+        for row_idx, row in enumerate(rows):
+            key, label, days, hours, mean_arrival, median_arrival, p90_arrival, late_share, early = row
+            values = [
+                key, label, str(days), f"{hours:.1f}",
+                seconds_to_time(mean_arrival), seconds_to_time(median_arrival), seconds_to_time(p90_arrival),
+                f"{late_share:.0%}", str(early)
+            ]
+            self.report_table.insertRow(row_idx)
+            for col_idx, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignCenter)  # Center the text
+                self.report_table.setItem(row_idx, col_idx, item)
+    
+    def report_failed(self, message):
+        self.report_button.setEnabled(True)
+        QMessageBox.critical(self, "Report Error", f"Failed to generate report: {message}")
+    
+    @profiled("refresh_policies")
+    def refresh_policies(self):
+        self.policies = self.db.get_shift_policies()
+        self.policy_table.setRowCount(0)  # Clear existing data
+        
+        for row_idx, policy in enumerate(self.policies):
+            start = QTime(0, 0).addSecs(policy.start_time).toString("HH:mm")
+            days = ", ".join(name for i, name in enumerate(WEEKDAYS) if policy.works_on(i))
+            values = [policy.department or "(Default)", start, str(policy.grace_minutes), days]
+            
+            self.policy_table.insertRow(row_idx)
+            for col_idx, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(Qt.AlignCenter)  # Center the text
+                self.policy_table.setItem(row_idx, col_idx, item)
+    
+    def load_policy_into_form(self, row, column):
+        policy = self.policies[row]
+        self.policy_department_input.setText(policy.department)
+        self.policy_start_input.setTime(QTime(0, 0).addSecs(policy.start_time))
+        self.policy_grace_input.setValue(policy.grace_minutes)
+        for i, check in enumerate(self.policy_day_checks):
+            check.setChecked(policy.works_on(i))
+    
+    def save_policy(self):
+        department = self.policy_department_input.text().strip()
+        start_time = QTime(0, 0).secsTo(self.policy_start_input.time())
+        working_days = sum(1 << i for i, check in enumerate(self.policy_day_checks) if check.isChecked())
+        
+        if not working_days:
+            QMessageBox.warning(self, "Input Error", "Please select at least one working day")
+            return
+        
+        # Saving also recomputes lateness of every stored attendance record
+        if self.db.set_shift_policy(department, start_time, self.policy_grace_input.value(), working_days):
+            self.refresh_policies()
+            QMessageBox.information(self, "Shift Policies", "Policy saved and lateness recomputed.")
+        else:
+            QMessageBox.critical(self, "Error", "Failed to save policy.")
+    
+    def delete_policy(self):
+        department = self.policy_department_input.text().strip()
+        
+        if department == DEFAULT_POLICY:
+            QMessageBox.warning(self, "Shift Policies", "The default policy cannot be deleted.")
+            return
+        
+        if self.db.delete_shift_policy(department):
+            self.refresh_policies()
+            QMessageBox.information(self, "Shift Policies", f"Policy for {department} deleted.")
+        else:
+            QMessageBox.critical(self, "Error", f"No policy found for {department}.")
+    
     def register_staff(self):
         name = self.staff_name_input.text()
         staff_id = self.staff_id_input.text()
@@ -381,75 +921,210 @@ class AdminWidget(QWidget):
             from PySide6.QtWidgets import QMessageBox
             QMessageBox.warning(self, "Input Error", "Please fill in all fields")
     
+    @profiled("refresh_attendance")
     def refresh_attendance(self):
-        # Fetch attendance records from the database
-        self.attendance_table.setRowCount(0)  # Clear existing data
+        # Reload the shown pages of a searched, filtered or re-sorted table; otherwise
+        # patch in only the records changed since the last refresh
+        self.attendance_search_generation += 1
+        if not self.is_default_attendance_view():
+            limit = max(self.attendance_table.rowCount(), PAGE_SIZE)
+            self.populate_attendance_table(self.db.get_attendance_page(limit=limit, **self.attendance_view()), limit)
+            return
         
-        records = self.db.get_all_attendance()
+        if self.attendance_watermark is not None:
+            changes = self.db.get_attendance_since(self.attendance_watermark)
+            if self.apply_attendance_changes(changes):
+                return
+        
+        # First load, or changes that cannot be patched in place. The revision is read
+        # first, so a change made while the page loads is applied again, not missed.
+        revision = self.db.get_revision("attendance")
+        self.attendance_deletes = self.db.get_delete_count("attendance")
+        self.populate_attendance_table(self.db.get_attendance_page(), PAGE_SIZE)
+        self.attendance_watermark = revision
+    
+    def apply_attendance_changes(self, changes):
+        """Patch changed records into the table; returns False if a full reload is needed"""
+        if self.db.get_delete_count("attendance") != self.attendance_deletes:
+            return False  # Records were removed
         
-        for row_idx, record in enumerate(records):
+        row_count = self.attendance_table.rowCount()
+        top_time_in = self.attendance_table.item(0, 4).data(Qt.UserRole) if row_count else None
+        # Records older than the last loaded one arrive with a later page
+        bottom_time_in = (self.attendance_table.item(row_count - 1, 4).data(Qt.UserRole)
+                          if row_count and self.attendance_has_more else None)
+        
+        # Oldest first, so each new sign-in ends up above the previous one
+        for change in reversed(changes):
+            record_id, rev, record = change[0], change[1], change[2:]
+            item = self.attendance_items.get(record_id)
+            if item is not None:
+                # Existing record, e.g. a sign-out
+                self.set_attendance_row(item.row(), record, record_id)
+            elif top_time_in is None or (record[4] or 0) >= top_time_in:
+                self.attendance_table.insertRow(0)
+                self.set_attendance_row(0, record, record_id)
+                top_time_in = record[4]
+            elif bottom_time_in is None or (record[4] or 0) >= bottom_time_in:
+                return False  # Back-dated record that belongs within the loaded pages
+            self.attendance_watermark = max(self.attendance_watermark, rev)
+        return True
+    
+    def populate_attendance_table(self, rows, limit):
+        self.attendance_table.setRowCount(0)  # Clear existing data
+        self.attendance_items = {}
+        # Searched, filtered or re-sorted pages are not patched incrementally, so the
+        # next plain refresh reloads
+        self.attendance_watermark = None
+        self.append_attendance_rows(rows, limit)
+    
+    def append_attendance_rows(self, rows, limit):
+        """Add (id, rev, record...) rows below the loaded ones"""
+        # A short page is the last one
+        self.attendance_has_more = len(rows) == limit
+        for record_id, rev, *record in rows:
+            if record_id in self.attendance_items:
+                continue  # Moved up into a loaded page since it was queried
+            row_idx = self.attendance_table.rowCount()
             self.attendance_table.insertRow(row_idx)
-            # Insert the data into the appropriate columns
-            for col_idx, data in enumerate(record):
-                if data is None:
-                    data = ""  # Display empty string instead of "None"
-                item = QTableWidgetItem(str(data))
-                item.setTextAlignment(Qt.AlignCenter)  # Center the text
-                self.attendance_table.setItem(row_idx, col_idx, item)
+            self.set_attendance_row(row_idx, record, record_id)
     
+    def set_attendance_row(self, row_idx, record, record_id=None):
+        # Insert the data into the appropriate columns
+        for col_idx, data in enumerate(format_attendance_record(record)):
+            if data is None:
+                data = ""  # Display empty string instead of "None"
+            item = QTableWidgetItem(str(data))
+            item.setTextAlignment(Qt.AlignCenter)  # Center the text
+            self.attendance_table.setItem(row_idx, col_idx, item)
+        
+        # Keep the raw sign-in time for ordering checks
+        self.attendance_table.item(row_idx, 4).setData(Qt.UserRole, record[4])
+        if record_id is not None:
+            self.attendance_items[record_id] = self.attendance_table.item(row_idx, 0)
+    
+    @profiled("refresh_staff")
     def refresh_staff(self):
-        # Fetch staff records from the database
-        self.staff_table.setRowCount(0)  # Clear existing data
+        # Reload the shown pages of a searched, filtered or re-sorted table; otherwise
+        # patch in only the staff changed since the last refresh
+        self.staff_search_generation += 1
+        if not self.is_default_staff_view():
+            limit = max(self.staff_table.rowCount(), PAGE_SIZE)
+            self.populate_staff_table(self.db.get_staff_page(limit=limit, **self.staff_view()), limit)
+            return
         
-        records = self.db.get_all_staff()
+        if self.staff_watermark is not None:
+            changes = self.db.get_staff_since(self.staff_watermark)
+            if self.apply_staff_changes(changes):
+                return
+        
+        # First load, or staff were deleted elsewhere
+        revision = self.db.get_revision("staff")
+        self.staff_deletes = self.db.get_delete_count("staff")
+        self.populate_staff_table(self.db.get_staff_page(), PAGE_SIZE)
+        self.staff_watermark = revision
+    
+    def apply_staff_changes(self, changes):
+        """Patch changed staff into the table; returns False if a full reload is needed"""
+        if self.db.get_delete_count("staff") != self.staff_deletes:
+            return False  # Staff were deleted
         
-        for row_idx, record in enumerate(records):
+        for rev, *record in changes:
+            item = self.staff_items.pop(record[0], None)
+            if item is not None:
+                # Changed staff move to their new position in name order
+                self.staff_table.removeRow(item.row())
+            row_idx = self.staff_insert_position(record[1])
+            # Past the last loaded row they arrive with a later page
+            if row_idx < self.staff_table.rowCount() or not self.staff_has_more:
+                self.staff_table.insertRow(row_idx)
+                self.set_staff_row(row_idx, record)
+            self.staff_watermark = max(self.staff_watermark, rev)
+        return True
+    
+    def staff_insert_position(self, name):
+        # Binary search over the name column, which is kept in name order
+        low, high = 0, self.staff_table.rowCount()
+        while low < high:
+            middle = (low + high) // 2
+            if self.staff_table.item(middle, 1).text() <= name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def staff_row(self, staff_id):
+        return self.staff_items[staff_id].row()
+    
+    def populate_staff_table(self, rows, limit):
+        self.staff_table.setRowCount(0)  # Clear existing data
+        self.staff_items = {}
+        # Searched, filtered or re-sorted pages are not patched incrementally, so the
+        # next plain refresh reloads
+        self.staff_watermark = None
+        self.append_staff_rows(rows, limit)
+    
+    def append_staff_rows(self, rows, limit):
+        """Add (rev, staff_id, name, department) rows below the loaded ones"""
+        # A short page is the last one
+        self.staff_has_more = len(rows) == limit
+        for rev, *record in rows:
+            if record[0] in self.staff_items:
+                continue  # Moved up into a loaded page since it was queried
+            row_idx = self.staff_table.rowCount()
             self.staff_table.insertRow(row_idx)
-            # Insert the basic data (Staff ID, Name, Department)
-            for col_idx, data in enumerate(record):
-                item = QTableWidgetItem(str(data))
-                item.setTextAlignment(Qt.AlignCenter)  # Center the text
-                self.staff_table.setItem(row_idx, col_idx, item)
-            
-            # Add Edit button
-            edit_button = QPushButton("Edit")
-            edit_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #10B981;  /* Green */
-                    color: white;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #059669;  /* Darker Green */
-                }
-            """)
-            edit_button.clicked.connect(lambda _, r=row_idx: self.edit_staff(r))
-            self.staff_table.setCellWidget(row_idx, 3, edit_button)
-            
-            # Add Delete button
-            delete_button = QPushButton("Delete")
-            delete_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #EF4444;  /* Red */
-                    color: white;
-                    border: none;
-                    padding: 4px 8px;
-                    border-radius: 3px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #DC2626;  /* Darker Red */
-                }
-            """)
-            delete_button.clicked.connect(lambda _, r=row_idx: self.delete_staff(r))
-            self.staff_table.setCellWidget(row_idx, 4, delete_button)
-            
-            # Add a hidden column to store the staff ID for reference
-            self.staff_table.setItem(row_idx, 5, QTableWidgetItem(str(record[0])))  # Staff ID
-            self.staff_table.setColumnHidden(5, True)  # Hide this column
+            self.set_staff_row(row_idx, record)
+    
+    def set_staff_row(self, row_idx, record):
+        # Insert the basic data (Staff ID, Name, Department)
+        for col_idx, data in enumerate(record):
+            item = QTableWidgetItem(str(data))
+            item.setTextAlignment(Qt.AlignCenter)  # Center the text
+            self.staff_table.setItem(row_idx, col_idx, item)
+        
+        staff_id = record[0]
+        self.staff_items[staff_id] = self.staff_table.item(row_idx, 0)
+        
+        # Add Edit button
+        edit_button = QPushButton("Edit")
+        edit_button.setStyleSheet("""
+            QPushButton {
+                background-color: #10B981;  /* Green */
+                color: white;
+                border: none;
+                padding: 4px 8px;
+                border-radius: 3px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #059669;  /* Darker Green */
+            }
+        """)
+        # Look the row up on click, since rows move as the table is patched
+        edit_button.clicked.connect(lambda _, s=staff_id: self.edit_staff(self.staff_row(s)))
+        self.staff_table.setCellWidget(row_idx, 3, edit_button)
+        
+        # Add Delete button
+        delete_button = QPushButton("Delete")
+        delete_button.setStyleSheet("""
+            QPushButton {
+                background-color: #EF4444;  /* Red */
+                color: white;
+                border: none;
+                padding: 4px 8px;
+                border-radius: 3px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #DC2626;  /* Darker Red */
+            }
+        """)
+        delete_button.clicked.connect(lambda _, s=staff_id: self.delete_staff(self.staff_row(s)))
+        self.staff_table.setCellWidget(row_idx, 4, delete_button)
+        
+        # Add a hidden column to store the staff ID for reference
+        self.staff_table.setItem(row_idx, 5, QTableWidgetItem(str(staff_id)))  # Staff ID
+        self.staff_table.setColumnHidden(5, True)  # Hide this column
     
     def edit_staff(self, row):
         # Get the staff ID from the hidden column
@@ -463,7 +1138,7 @@ class AdminWidget(QWidget):
         dialog = QDialog(self)
         dialog.setWindowTitle("Edit Staff Member")
         dialog.setModal(True)
-        dialog.resize(300, 150)
+        dialog.resize(300, 250)
         
         layout = QFormLayout()
         
@@ -473,6 +1148,37 @@ class AdminWidget(QWidget):
         layout.addRow("Name:", name_input)
         layout.addRow("Department:", department_input)
         
+        # Photo shown on the kiosk when this staff member punches
+        chosen_photo = {}
+        photo_preview = QLabel("No photo")
+        photo_preview.setFixedSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        photo_preview.setAlignment(Qt.AlignCenter)
+        
+        def preview(data):
+            image = decode_photo(data)
+            if image is not None:
+                photo_preview.setPixmap(QPixmap.fromImage(image))
+        
+        def choose_photo():
+            filename, _ = QFileDialog.getOpenFileName(
+                dialog, "Choose Photo", "", "Images (*.png *.jpg *.jpeg *.bmp)"
+            )
+            if filename:
+                data = encode_photo(filename)
+                if data is None:
+                    QMessageBox.warning(dialog, "Photo Error", "The selected file is not a readable image.")
+                    return
+                chosen_photo["data"] = data
+                preview(data)
+        
+        preview(self.db.get_staff_photo(staff_id))
+        choose_photo_button = QPushButton("Choose Photo...")
+        choose_photo_button.clicked.connect(choose_photo)
+        photo_layout = QHBoxLayout()
+        photo_layout.addWidget(photo_preview)
+        photo_layout.addWidget(choose_photo_button)
+        layout.addRow("Photo:", photo_layout)
+        
         button_layout = QHBoxLayout()
         
         save_button = QPushButton("Save")
@@ -493,16 +1199,20 @@ class AdminWidget(QWidget):
             new_department = department_input.text()
             
             if new_name and new_department:
-                # Update the staff member in the database
-                success = self.db.update_staff(staff_id, new_name, new_department)
+                # Update the staff member in the database; the photo is a separate write
+                if not self.db.update_staff(staff_id, new_name, new_department):
+                    QMessageBox.critical(self, "Error", "Failed to update staff member.")
+                    return
                 
-                if success:
-                    # Update the table display
-                    self.staff_table.item(row, 1).setText(new_name)
-                    self.staff_table.item(row, 2).setText(new_department)
-                    QMessageBox.information(self, "Success", "Staff member updated successfully!")
+                # Update the table display
+                self.staff_table.item(row, 1).setText(new_name)
+                self.staff_table.item(row, 2).setText(new_department)
+                if "data" in chosen_photo and not self.db.set_staff_photo(staff_id, chosen_photo["data"]):
+                    QMessageBox.warning(self, "Photo Not Saved",
+                        "The staff details were saved, but the photo could not be saved. "
+                        "Please try choosing it again.")
                 else:
-                    QMessageBox.critical(self, "Error", "Failed to update staff member.")
+                    QMessageBox.information(self, "Success", "Staff member updated successfully!")
             else:
                 QMessageBox.warning(self, "Input Error", "Please fill in all fields.")
     
@@ -528,6 +1238,8 @@ class AdminWidget(QWidget):
             if success:
                 # Remove the row from the table
                 self.staff_table.removeRow(row)
+                del self.staff_items[staff_id]
+                self.staff_deletes += 1
                 QMessageBox.information(self, "Success", 
                     f"{staff_name} has been removed from staff list.\n"
                     f"Their attendance records will remain for audit purposes.")
@@ -547,15 +1259,15 @@ class AdminWidget(QWidget):
         )
         
         if filename:
-            # Get attendance records from database
-            records = self.db.get_all_attendance()
+            # Stream attendance records from the database straight into the file
+            records = self.db.iter_attendance(newest_first=True)
             
             # Write to CSV file
             try:
                 with open(filename, 'w', newline='') as csvfile:
                     writer = csv.writer(csvfile)
                     writer.writerow(['Staff ID', 'Name', 'Department', 'Date', 'Time In', 'Time Out'])  # Header
-                    writer.writerows(records)  # Data rows
+                    writer.writerows(format_attendance_record(record) for record in records)  # Data rows
                 
                 QMessageBox.information(self, "Export", f"Attendance records exported successfully to {filename}")
             except Exception as e:
@@ -9,7 +9,8 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QPixmap, QPainter, QColor
 from database import DatabaseManager
-from datetime import datetime
+from .photo_cache import PhotoCache, THUMBNAIL_SIZE
+from .scanner_input import PunchQueue, ScannerInput
 
 
 class BackgroundWidget(QWidget):
@@ -38,8 +39,25 @@ class BackgroundWidget(QWidget):
 class AttendanceWidget(QWidget):
     def __init__(self):
         super().__init__()
-        self.db = DatabaseManager()
+        self.db = DatabaseManager(audit_source="kiosk")
+        # Photos shown with the punch feedback to confirm who punched
+        self.photos = PhotoCache(self.db)
+        self.photos.photo_ready.connect(self.on_photo_ready)
+        self.photo_staff_id = None
+        # Punches are written in order off the GUI thread, so badges can be read back to back
+        self.punches = PunchQueue(self.db)
+        self.punches.punched.connect(self.show_punch_result)
+        self.punches.failed.connect(self.show_punch_error)
         self.init_ui()
+        # Badge readers typing into the ID field are recognised by their keystroke timing
+        self.scanner = ScannerInput(self.id_input)
+        self.scanner.scanned.connect(self.submit_punch)
+        # One timer, so feedback for a later punch is not cleared early by an earlier one's
+        self.feedback_timer = QTimer(self)
+        self.feedback_timer.setSingleShot(True)
+        self.feedback_timer.timeout.connect(self.clear_feedback_message)
+        # Decode the early arrivers' photos once the window is up
+        QTimer.singleShot(0, self.photos.prewarm)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -151,11 +169,19 @@ class AttendanceWidget(QWidget):
         """)
         attendance_layout.addWidget(self.submit_button)
         
-        # Feedback message
+        # Feedback message, with the staff member's photo beside it
+        feedback_layout = QHBoxLayout()
+        self.photo_label = QLabel()
+        self.photo_label.setFixedSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self.photo_label.setAlignment(Qt.AlignCenter)
+        self.photo_label.hide()
+        feedback_layout.addWidget(self.photo_label)
+        
         self.feedback_label = QLabel()
         self.feedback_label.setAlignment(Qt.AlignCenter)
         self.feedback_label.setStyleSheet("color: green; font-weight: bold; margin: 10px;")
-        attendance_layout.addWidget(self.feedback_label)
+        feedback_layout.addWidget(self.feedback_label, 1)
+        attendance_layout.addLayout(feedback_layout)
         
         attendance_group.setLayout(attendance_layout)
         layout.addWidget(attendance_group)
@@ -170,71 +196,84 @@ class AttendanceWidget(QWidget):
             QMessageBox.warning(self, "Input Error", "Please enter your staff ID")
             return
         
-        # Get current time to check for late arrival
-        now = datetime.now()
-        current_time = now.time()
-        late_arrival_time = datetime.strptime("08:30", "%H:%M").time()
-        
-        # Try to log attendance in the database - returns the action type (Sign In/Sign Out/Already Signed Out)
-        action = self.db.log_attendance(staff_id)
-        
-        if action:
-            if action == "Already Signed Out":
+        # Clear the input field
+        self.id_input.clear()
+        self.submit_punch(staff_id)
+    
+    def submit_punch(self, staff_id):
+        """Queue a typed or scanned staff ID for logging"""
+        if not staff_id:
+            return
+        # Start decoding the photo now, so it is usually ready with the feedback
+        self.photos.request(staff_id)
+        self.punches.submit(staff_id)
+    
+    def show_punch_result(self, staff_id, result):
+        """Show the feedback for a logged punch - result holds the action taken, the staff member and any lateness"""
+        if result:
+            staff_name = result.staff.name
+            if result.action == "Already Signed Out":
                 # Staff has already signed out for the day
-                staff_info = self.db.get_staff(staff_id)
-                if staff_info:
-                    staff_name = staff_info[1]  # Name is the second element in the tuple
-                    feedback_text = f"{staff_name}, you have signed out already, contact HR if an error was made"
-                    self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Darker red for better contrast
-                else:
-                    feedback_text = "You have signed out already, contact HR if an error was made"
-                    self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Darker red for better contrast
-            else:
-                # Get staff information
-                staff_info = self.db.get_staff(staff_id)
-                if staff_info:
-                    staff_name = staff_info[1]  # Name is the second element in the tuple
+                feedback_text = f"{staff_name}, you have signed out already, contact HR if an error was made"
+                self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Darker red for better contrast
+            elif result.action == "Sign In":
+                total_seconds_late = result.late_seconds
+                if total_seconds_late > 0:
+                    # Late arrival after the department's start time and grace period
+                    hours_late = total_seconds_late // 3600
+                    minutes_late = (total_seconds_late % 3600) // 60
                     
-                    if action == "Sign In":
-                        if current_time > late_arrival_time:
-                            # Late arrival after 8:30am
-                            total_seconds_late = (datetime.combine(now.date(), current_time) - 
-                                            datetime.combine(now.date(), late_arrival_time)).seconds
-                            hours_late = total_seconds_late // 3600
-                            minutes_late = (total_seconds_late % 3600) // 60
-                            
-                            if hours_late > 0:
-                                if minutes_late > 0:
-                                    feedback_text = f"{staff_name}, you are {hours_late} hour(s) and {minutes_late} minute(s) late"
-                                else:
-                                    feedback_text = f"{staff_name}, you are {hours_late} hour(s) late"
-                            else:
-                                feedback_text = f"{staff_name}, you are {minutes_late} minute(s) late"
-                            
-                            self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Red for being late
+                    if hours_late > 0:
+                        if minutes_late > 0:
+                            feedback_text = f"{staff_name}, you are {hours_late} hour(s) and {minutes_late} minute(s) late"
                         else:
-                            # On-time arrival
-                            feedback_text = f"{staff_name}, you have successfully signed in, have a nice day!"
-                            self.feedback_label.setStyleSheet("color: #16A34A; font-weight: bold; margin: 10px;")  # Green for success
-                    else:  # Sign Out
-                        feedback_text = f"{staff_name}, signed out successfully, bye!"
-                        self.feedback_label.setStyleSheet("color: #16A34A; font-weight: bold; margin: 10px;")  # Green for success
+                            feedback_text = f"{staff_name}, you are {hours_late} hour(s) late"
+                    else:
+                        feedback_text = f"{staff_name}, you are {minutes_late} minute(s) late"
+                    
+                    self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Red for being late
                 else:
-                    feedback_text = "Attendance logged successfully!\nHave a nice day at work!"
+                    # On-time arrival
+                    feedback_text = f"{staff_name}, you have successfully signed in, have a nice day!"
                     self.feedback_label.setStyleSheet("color: #16A34A; font-weight: bold; margin: 10px;")  # Green for success
+            else:  # Sign Out
+                feedback_text = f"{staff_name}, signed out successfully, bye!"
+                self.feedback_label.setStyleSheet("color: #16A34A; font-weight: bold; margin: 10px;")  # Green for success
         else:
             # Staff ID doesn't exist in the database
             feedback_text = "Invalid staff ID. Please check and try again."
             self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Darker red for better contrast
         
         self.feedback_label.setText(feedback_text)
-        
-        # Clear the input field
-        self.id_input.clear()
+        self.show_photo(staff_id if result else None)
         
         # Clear the feedback message after 5 seconds
-        QTimer.singleShot(5000, self.clear_feedback_message)
+        self.feedback_timer.start(5000)
+    
+    def show_punch_error(self, staff_id, message):
+        """Tell the staff member their punch was not saved, e.g. while the database is locked"""
+        self.feedback_label.setText(f"Could not log attendance for {staff_id}, please try again.")
+        self.feedback_label.setStyleSheet("color: #DC2626; font-weight: bold; margin: 10px;")  # Darker red for better contrast
+        self.show_photo(None)
+        self.feedback_timer.start(5000)
+    
+    def show_photo(self, staff_id):
+        """Show the staff member's photo now if it is cached, otherwise once it is decoded"""
+        self.photo_staff_id = staff_id
+        image = self.photos.get(staff_id) if staff_id else None
+        if image is None:
+            self.photo_label.hide()
+        else:
+            self.photo_label.setPixmap(QPixmap.fromImage(image))
+            self.photo_label.show()
+    
+    def on_photo_ready(self, staff_id, image):
+        if staff_id == self.photo_staff_id and not image.isNull():
+            self.photo_label.setPixmap(QPixmap.fromImage(image))
+            self.photo_label.show()
     
     def clear_feedback_message(self):
         """Clear the feedback message after a delay"""
-        self.feedback_label.setText("")
\ No newline at end of file
+        self.feedback_label.setText("")
+        self.photo_staff_id = None
+        self.photo_label.hide()
\ No newline at end of file
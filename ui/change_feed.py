@@ -0,0 +1,114 @@
+"""
+Live change feed from the database to open views
+
+A background thread polls PRAGMA data_version, which changes whenever
+another connection (another window, the CLI or a kiosk on another machine
+sharing attendance.db) commits. Only then are the tables compared against
+their last known state, and the names of the changed ones are emitted
+through a Qt signal, delivered on the GUI thread.
+
+A database error (locked, unreadable, on a share that went away) only
+skips that poll: the connection is reopened on a later one, waiting
+longer after each failure in a row, up to MAX_RETRY_SECONDS. failed is
+emitted when polling starts failing and resumed once it works again.
+"""
+
+import sqlite3
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+from database import connect_readonly
+
+
+# How often the data version is polled
+POLL_INTERVAL_SECONDS = 1.0
+
+# Longest wait between retries while polls fail
+MAX_RETRY_SECONDS = 30.0
+
+# Cheap fingerprint queries: highest revision plus the deletion counter catches
+# inserts, updates and deletes; the policy table is small enough to compare whole
+TABLE_STATE_QUERIES = {
+    "staff": "SELECT (SELECT MAX(rev) FROM staff), deletes FROM table_deletes WHERE table_name = 'staff'",
+    "attendance": "SELECT (SELECT MAX(rev) FROM attendance), deletes FROM table_deletes WHERE table_name = 'attendance'",
+    "shift_policy": "SELECT * FROM shift_policy ORDER BY department",
+    "staff_photo": "SELECT MAX(updated_at), COUNT(*), SUM(LENGTH(photo)) FROM staff_photo",
+}
+
+
+class ChangeFeed(QObject):
+    """Emit tables_changed with the names of tables changed by other connections"""
+    tables_changed = Signal(list)
+    # Error message of the first failed poll in a row
+    failed = Signal(str)
+    resumed = Signal()
+
+    def __init__(self, db_path: str = "attendance.db", interval: float = POLL_INTERVAL_SECONDS):
+        super().__init__()
+        self.db_path = db_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.poll, name="change-feed", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def table_states(self, cursor):
+        states = {}
+        for table, query in TABLE_STATE_QUERIES.items():
+            cursor.execute(query)
+            states[table] = cursor.fetchall()
+        return states
+
+    def poll(self):
+        # The connection belongs to this thread; it is reopened after an error
+        conn = None
+        version = None
+        states = None  # Kept across errors, so changes made meanwhile are still noticed
+        failures = 0
+        delay = 0  # The first poll only takes the initial states
+        while not self.stop_event.wait(delay):
+            try:
+                if conn is None:
+                    conn = connect_readonly(self.db_path)
+                    version = None  # Data versions of different connections are not comparable
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA data_version")
+                current_version = cursor.fetchone()[0]
+                if current_version != version:
+                    version = current_version
+                    current_states = self.table_states(cursor)
+                    changed = [table for table in current_states
+                               if states is not None and current_states[table] != states[table]]
+                    states = current_states
+                    if changed:
+                        self.tables_changed.emit(changed)
+            except sqlite3.Error as e:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                failures += 1
+                if failures == 1:
+                    self.failed.emit(str(e))
+                delay = min(self.interval * 2 ** failures, MAX_RETRY_SECONDS)
+                continue
+
+            if failures:
+                failures = 0
+                self.resumed.emit()
+            delay = self.interval
+
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,122 @@
+"""
+Event-loop stall detector and profiling shortcut for diagnostics mode
+
+A timer on the GUI thread beats every HEARTBEAT_MS. A watchdog thread
+checks the time since the last beat. When it exceeds the threshold, the
+GUI thread is busy with something other than the event loop, so the
+watchdog takes its current stack with sys._current_frames(), which shows
+the slot that was running. When the loop gets back to the timer, the
+stall is written to the log with its length and that stack.
+"""
+
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from PySide6.QtCore import QObject, QTimer
+from PySide6.QtGui import QKeySequence, QShortcut
+
+from utils.profiling import is_capturing, set_capture
+
+
+HEARTBEAT_MS = 50
+STALL_THRESHOLD_MS = 200
+
+# Toggles cProfile capture of the punch and admin refresh slots
+CAPTURE_SHORTCUT = "Ctrl+Shift+P"
+
+# Frames from these files are where the time went; Qt and the standard library are not
+APP_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+class StallWatchdog(QObject):
+    """Log every event-loop stall longer than threshold_ms with the stack that caused it"""
+
+    def __init__(self, log_path: str, threshold_ms: int = STALL_THRESHOLD_MS):
+        super().__init__()
+        self.log_path = Path(log_path)
+        self.threshold = threshold_ms / 1000
+        self.main_thread_id = threading.main_thread().ident
+        self.last_beat = time.monotonic()
+        self.stall_stack = None  # Captured by the watchdog thread during a stall
+        self.lock = threading.Lock()
+        self.stalls = 0
+        self.max_latency = 0.0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(HEARTBEAT_MS)
+        self.timer.timeout.connect(self.beat)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.last_beat = time.monotonic()
+        self.timer.start()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.watch, name="stall-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.timer.stop()
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.write(f"{self.stalls} stalls, worst event-loop latency {self.max_latency * 1000:.0f} ms")
+
+    def beat(self):
+        """Runs on the GUI thread whenever the event loop gets to the timer"""
+        now = time.monotonic()
+        # Latency is how late this beat came compared to its interval
+        latency = now - self.last_beat - HEARTBEAT_MS / 1000
+        self.last_beat = now
+        self.max_latency = max(self.max_latency, latency)
+
+        with self.lock:
+            stack, self.stall_stack = self.stall_stack, None
+        if latency > self.threshold:
+            self.stalls += 1
+            self.write(f"Event loop stalled for {latency * 1000:.0f} ms{where(stack)}\n{''.join(stack or [])}")
+
+    def watch(self):
+        """Runs on the watchdog thread"""
+        check = self.threshold / 2
+        while not self.stop_event.wait(check):
+            if time.monotonic() - self.last_beat < self.threshold + HEARTBEAT_MS / 1000:
+                continue
+            with self.lock:
+                if self.stall_stack is not None:
+                    continue  # One stack per stall, taken as early as possible
+                frame = sys._current_frames().get(self.main_thread_id)
+                self.stall_stack = traceback.format_stack(frame) if frame else []
+
+    def write(self, message: str):
+        with open(self.log_path, "a", encoding="utf-8") as log:
+            log.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {message}\n")
+
+
+def where(stack) -> str:
+    """' in file:line function' of the innermost application frame of a formatted stack"""
+    for entry in reversed(stack or []):
+        if entry.lstrip().startswith(f'File "{APP_ROOT}') and "site-packages" not in entry:
+            location = entry.strip().splitlines()[0]
+            return f" in {location[len('File '):]}"
+    return ""
+
+
+def install_capture_shortcut(window) -> QShortcut:
+    """Let CAPTURE_SHORTCUT toggle profile capture in the window, reported in its status bar"""
+    def toggle():
+        set_capture(not is_capturing())
+        window.statusBar().showMessage("Profiling on" if is_capturing() else "Profiling off", 3000)
+
+    shortcut = QShortcut(QKeySequence(CAPTURE_SHORTCUT), window)
+    shortcut.activated.connect(toggle)
+    return shortcut
@@ -11,6 +11,8 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt
 from .attendance_widget import AttendanceWidget
 from .admin_widget import AdminWidget
+from .change_feed import ChangeFeed
+from database.scheduler import Scheduler
 
 
 class AttendanceMainWindow(QMainWindow):
@@ -73,6 +75,36 @@ class AttendanceMainWindow(QMainWindow):
         
         # Create menu bar
         self.create_menu_bar()
+        
+        # Push changes committed by other connections (CLI, other kiosks) to the open views
+        self.change_feed = ChangeFeed(self.admin_widget.db.db_path)
+        self.change_feed.tables_changed.connect(self.admin_widget.on_tables_changed)
+        self.change_feed.tables_changed.connect(self.on_tables_changed)
+        self.change_feed.failed.connect(self.on_change_feed_failed)
+        self.change_feed.resumed.connect(self.statusBar().clearMessage)
+        self.change_feed.start()
+        
+        # Nightly maintenance runs on its own thread, never on the kiosk's
+        self.scheduler = Scheduler(self.admin_widget.db.db_path)
+        self.scheduler.start()
+    
+    def on_tables_changed(self, tables):
+        if "shift_policy" in tables:
+            self.attendance_widget.db.load_policies()
+        if "staff_photo" in tables:
+            self.attendance_widget.photos.clear()
+    
+    def on_change_feed_failed(self, message):
+        # Shown until the feed resumes; the views are still usable meanwhile
+        self.statusBar().showMessage(f"Live updates paused, retrying: {message}")
+    
+    def closeEvent(self, event):
+        self.change_feed.stop()
+        self.scheduler.stop()
+        # Write the audit entries still buffered in memory
+        self.attendance_widget.db.audit.close()
+        self.admin_widget.db.audit.close()
+        super().closeEvent(event)
     
     def create_menu_bar(self):
         menu_bar = self.menuBar()
@@ -233,5 +265,7 @@ class AttendanceMainWindow(QMainWindow):
         self.setWindowTitle("SEC(NYSC) Attendance System - Admin Panel")
     
     def show_attendance_view(self):
+        # Pick up shift policy changes made in the admin panel
+        self.attendance_widget.db.load_policies()
         self.stacked_widget.setCurrentWidget(self.attendance_widget)
         self.setWindowTitle("SEC(NYSC) Attendance System")
\ No newline at end of file
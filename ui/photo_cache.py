@@ -0,0 +1,136 @@
+"""
+Staff photo thumbnails for the kiosk
+
+Photos are read from the database and decoded and scaled to thumbnails on
+the thread pool, since QImage (unlike QPixmap) may be used off the GUI
+thread. Thumbnails are kept in an LRU cache bounded by their total size in
+bytes. At startup it is pre-warmed with the staff who usually arrive first,
+so the morning rush is served from memory.
+"""
+
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QIODevice, QObject, QThreadPool, Qt, Signal
+from PySide6.QtGui import QImage
+
+from .workers import Worker
+
+
+THUMBNAIL_SIZE = 160
+
+# Photos are stored scaled down to this size as JPEG, keeping the database small
+STORED_PHOTO_SIZE = 512
+
+# Memory bound of the cached thumbnails (a 160x160 ARGB32 image is ~100 KB)
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+# Entries kept at most, counting staff known to have no photo
+MAX_CACHE_ENTRIES = 2000
+
+# Number of staff whose photos are decoded at startup
+PREWARM_COUNT = 100
+
+
+def decode_photo(data, size: int = THUMBNAIL_SIZE):
+    """Decode an encoded photo into a thumbnail QImage (None if absent or unreadable)"""
+    if not data:
+        return None
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    return image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+def encode_photo(filename: str):
+    """Read an image file and encode it for storage (None if it is not a readable image)"""
+    image = QImage(filename)
+    if image.isNull():
+        return None
+    if max(image.width(), image.height()) > STORED_PHOTO_SIZE:
+        image = image.scaled(STORED_PHOTO_SIZE, STORED_PHOTO_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPEG", 85)
+    return bytes(buffer.data())
+
+
+class PhotoCache(QObject):
+    """LRU cache of decoded staff photo thumbnails, filled off the GUI thread"""
+    # staff_id, thumbnail (a null QImage when the staff member has no photo)
+    photo_ready = Signal(str, QImage)
+
+    def __init__(self, db, max_bytes: int = MAX_CACHE_BYTES):
+        super().__init__()
+        self.db = db
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # staff_id -> QImage, None for staff without a photo
+        self.size = 0
+        self.pending = set()
+        self.workers = set()  # Keeps running workers alive
+        # Bumped by clear(), so photos loaded before it are not stored after it
+        self.generation = 0
+
+    def get(self, staff_id: str):
+        """The cached thumbnail, None if it is not cached or there is no photo"""
+        if staff_id not in self.images:
+            return None
+        self.images.move_to_end(staff_id)
+        return self.images[staff_id]
+
+    def contains(self, staff_id: str) -> bool:
+        return staff_id in self.images
+
+    def request(self, staff_id: str):
+        """Make sure the thumbnail gets loaded; photo_ready is emitted when it is"""
+        if staff_id in self.images or staff_id in self.pending:
+            return
+        self.pending.add(staff_id)
+        self.start(lambda: {staff_id: decode_photo(self.db.get_staff_photo(staff_id))}, [staff_id])
+
+    def prewarm(self, count: int = PREWARM_COUNT):
+        """Load the photos of the staff who usually sign in first"""
+        def load():
+            return {
+                staff_id: decode_photo(self.db.get_staff_photo(staff_id))
+                for staff_id in self.db.get_early_arrivers(count)
+            }
+        self.start(load)
+
+    def start(self, load, staff_ids=()):
+        generation = self.generation
+        worker = Worker(load)
+        worker.signals.finished.connect(lambda images: self.store(worker, generation, images))
+        worker.signals.failed.connect(lambda message: self.store(worker, generation, {}, staff_ids))
+        self.workers.add(worker)
+        QThreadPool.globalInstance().start(worker)
+
+    def store(self, worker, generation, images, failed_ids=()):
+        """Add decoded thumbnails (runs on the GUI thread)"""
+        self.workers.discard(worker)
+        self.pending.difference_update(failed_ids)
+        for staff_id, image in images.items():
+            self.pending.discard(staff_id)
+            if generation != self.generation:
+                continue
+            self.put(staff_id, image)
+            self.photo_ready.emit(staff_id, image if image is not None else QImage())
+
+    def put(self, staff_id: str, image):
+        if staff_id in self.images:
+            self.remove(staff_id)
+        self.images[staff_id] = image
+        self.size += image.sizeInBytes() if image is not None else 0
+        while len(self.images) > 1 and (self.size > self.max_bytes or len(self.images) > MAX_CACHE_ENTRIES):
+            self.remove(next(iter(self.images)))
+
+    def remove(self, staff_id: str):
+        image = self.images.pop(staff_id, None)
+        if image is not None:
+            self.size -= image.sizeInBytes()
+
+    def clear(self):
+        """Forget every thumbnail, e.g. after photos were changed"""
+        self.images.clear()
+        self.size = 0
+        self.generation += 1
@@ -0,0 +1,129 @@
+"""
+Badge reader input for the kiosk
+
+RFID and barcode readers act as keyboards: they type a whole staff ID and
+Enter within a few milliseconds. ScannerInput watches the keystroke timing
+of the ID field and recognises such bursts, taking the ID from its own
+buffer instead of the field, so back-to-back badges are never merged and
+text a person was typing is left alone. Typed and scanned IDs both go
+through a PunchQueue, which logs them in order on the thread pool while
+the kiosk keeps reading the next badge.
+"""
+
+import time
+from collections import deque
+
+from PySide6.QtCore import QEvent, QObject, QThreadPool, Qt, Signal
+
+from utils.profiling import profiled
+from .workers import Worker
+
+
+# Longest gap between two keystrokes of a reader burst; people type
+# 100 ms or more apart, readers a few milliseconds
+SCANNER_KEY_INTERVAL_MS = 30
+
+# Shortest ID accepted as a burst, so a quick double key press is not a scan
+MIN_SCAN_LENGTH = 3
+
+
+class ScannerInput(QObject):
+    """Event filter on a QLineEdit that emits scanned(staff_id) for each reader burst"""
+    scanned = Signal(str)
+
+    def __init__(self, line_edit, key_interval_ms: int = SCANNER_KEY_INTERVAL_MS,
+                 min_length: int = MIN_SCAN_LENGTH):
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.key_interval_ms = key_interval_ms
+        self.min_length = min_length
+        self.keys = []  # Characters of the burst in progress
+        self.last_key_at = None
+        self.text_before = ""  # Field text before the burst started, restored after it
+        line_edit.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() != QEvent.KeyPress:
+            return False
+
+        # The window system's timestamp, so a busy GUI thread does not stretch the gaps
+        at = event.timestamp() or int(time.monotonic() * 1000)
+        fast = self.last_key_at is not None and at - self.last_key_at <= self.key_interval_ms
+        self.last_key_at = at
+
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+            keys, self.keys = self.keys, []
+            if fast and len(keys) >= self.min_length:
+                self.line_edit.setText(self.text_before)
+                self.scanned.emit("".join(keys).strip())
+                return True  # Consumed, so returnPressed does not fire for the scan
+            return False
+
+        text = event.text()
+        if not text or not text.isprintable():
+            self.keys = []
+            return False
+        if not fast:
+            self.keys = []
+        if not self.keys:
+            # This key may start a burst
+            self.text_before = self.line_edit.text()
+        self.keys.append(text)
+        return False
+
+
+class PunchQueue(QObject):
+    """Logs staff IDs in the order they were submitted, off the GUI thread
+
+    IDs submitted while a batch is being written are queued and written
+    together in the next batch, one worker at a time.
+    """
+    # staff_id, PunchResult (None for an unknown ID)
+    punched = Signal(str, object)
+    # staff_id, error message
+    failed = Signal(str, str)
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self.pending = deque()
+        self.worker = None
+
+    def submit(self, staff_id: str):
+        self.pending.append(staff_id)
+        self.start_next()
+
+    def is_busy(self) -> bool:
+        return self.worker is not None or bool(self.pending)
+
+    def start_next(self):
+        if self.worker is not None or not self.pending:
+            return
+        batch = list(self.pending)
+        self.pending.clear()
+        worker = Worker(self.punch_all, batch)
+        worker.signals.finished.connect(self.on_finished)
+        worker.signals.failed.connect(lambda message: self.on_finished([(staff_id, None, message) for staff_id in batch]))
+        self.worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    @profiled("log_attendance")
+    def punch_all(self, staff_ids):
+        """Log each ID in turn (runs on the thread pool); a failure only affects its own ID"""
+        results = []
+        for staff_id in staff_ids:
+            try:
+                results.append((staff_id, self.db.log_attendance(staff_id), None))
+            except Exception as e:
+                results.append((staff_id, None, str(e)))
+        return results
+
+    def on_finished(self, results):
+        """Report the batch's results and start the next one (runs on the GUI thread)"""
+        self.worker = None
+        for staff_id, result, error in results:
+            if error is None:
+                self.punched.emit(staff_id, result)
+            else:
+                self.failed.emit(staff_id, error)
+        self.start_next()
@@ -3,15 +3,20 @@ Utility functions for the attendance system
 """
 
 import csv
-from typing import List, Tuple
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
 
 
-def export_to_csv(data: List[Tuple], headers: List[str], filename: str) -> bool:
+# Day numbers count local calendar days since this date
+EPOCH_DATE = date(1970, 1, 1)
+
+
+def export_to_csv(data: Iterable[Tuple], headers: List[str], filename: str) -> bool:
     """
     Export data to a CSV file
     
     Args:
-        data: List of tuples containing the data rows
+        data: Iterable of tuples containing the data rows, written as they are read
         headers: List of header names
         filename: Path to the output CSV file
     
@@ -48,15 +53,113 @@ def validate_staff_id(staff_id: str) -> bool:
     return staff_id.isalnum() and len(staff_id) > 0
 
 
-def format_timestamp_for_display(timestamp: str) -> str:
+def day_number(day: date) -> int:
+    """
+    Convert a calendar date to its integer day number
+    
+    Args:
+        day: The local calendar date
+    
+    Returns:
+        Number of days since 1970-01-01
+    """
+    return (day - EPOCH_DATE).days
+
+
+def day_to_date(day: int) -> date:
+    """
+    Convert an integer day number back to a calendar date
+    
+    Args:
+        day: Number of days since 1970-01-01
+    
+    Returns:
+        The corresponding date
+    """
+    return EPOCH_DATE + timedelta(days=day)
+
+
+def parse_day(text: str) -> int:
+    """
+    Parse a 'YYYY-MM-DD' string into an integer day number
+    
+    Args:
+        text: The date string
+    
+    Returns:
+        Number of days since 1970-01-01
+    """
+    return day_number(datetime.strptime(text, "%Y-%m-%d").date())
+
+
+def day_start_timestamp(day: int) -> int:
+    """
+    Get the epoch timestamp of local midnight at the start of a day
+    
+    Args:
+        day: Number of days since 1970-01-01
+    
+    Returns:
+        Epoch seconds of 00:00:00 local time on that day
+    """
+    return int(datetime.combine(day_to_date(day), datetime.min.time()).timestamp())
+
+
+def format_day(day: Optional[int]) -> str:
+    """
+    Format an integer day number for display
+    
+    Args:
+        day: Number of days since 1970-01-01, or None
+    
+    Returns:
+        'YYYY-MM-DD' string, or an empty string if day is None
+    """
+    if day is None:
+        return ""
+    return day_to_date(day).strftime("%Y-%m-%d")
+
+
+def format_time(timestamp: Optional[int]) -> str:
+    """
+    Format the local time of day of an epoch timestamp for display
+    
+    Args:
+        timestamp: Epoch seconds, or None
+    
+    Returns:
+        'HH:MM:SS' string, or an empty string if timestamp is None
+    """
+    if timestamp is None:
+        return ""
+    return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+
+
+def format_timestamp_for_display(timestamp: Optional[int]) -> str:
     """
     Format timestamp for display purposes
     
     Args:
-        timestamp: The timestamp string to format
+        timestamp: Epoch seconds, or None
+    
+    Returns:
+        'YYYY-MM-DD HH:MM:SS' string, or an empty string if timestamp is None
+    """
+    if timestamp is None:
+        return ""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_attendance_record(record: Tuple) -> Tuple:
+    """
+    Convert an attendance row from the database into display strings
+    
+    Args:
+        record: Tuple of (staff_id, name, department, day, time_in, time_out)
+            with the day and times stored as integers
     
     Returns:
-        Formatted timestamp string
+        Tuple with the day formatted as a date and the times as local times
     """
-    # This function can be expanded based on your formatting preferences
-    return timestamp
\ No newline at end of file
+    staff_id, name, department, day, time_in, time_out = record
+    return (staff_id, name, department, format_day(day), format_time(time_in), format_time(time_out))
@@ -0,0 +1,306 @@
+"""
+Hours-worked, punctuality and absence analytics for the attendance system
+
+A date range is loaded from the database in one bulk query into NumPy arrays
+and every aggregate is computed per group with vectorized operations, so
+years of history for the whole organization are summarized without a
+Python-level loop over attendance rows. Absences come from the presence
+bitmaps, unpacked into a staff x day matrix, counted from each staff
+member's start day as in database.workdays.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from database import connect_readonly
+from database.policy import PolicyBook
+from database.presence import YEAR_BYTES
+from database.workdays import STAFF_START_SQL
+from utils import day_number, day_start_timestamp, day_to_date, parse_day
+
+
+CLOSING_TIME = "17:00"
+ARRIVAL_PERCENTILES = (50, 90)
+
+# Marker for a missing time_in/time_out in the integer arrays
+MISSING = -1
+
+
+def time_to_seconds(value: str) -> int:
+    """Convert an 'HH:MM' or 'HH:MM:SS' string to seconds since midnight"""
+    parts = [int(part) for part in value.split(":")]
+    while len(parts) < 3:
+        parts.append(0)
+    hours, minutes, seconds = parts
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def seconds_to_time(seconds: float) -> str:
+    """Format seconds since midnight as 'HH:MM' for display"""
+    if seconds is None or np.isnan(seconds):
+        return ""
+    minutes = int(round(seconds / 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def load_attendance(db_path: str, start_date: str, end_date: str) -> Dict[str, object]:
+    """
+    Load attendance between two dates (inclusive) into column arrays
+
+    Args:
+        db_path: Path to the SQLite database
+        start_date: First date of the range ('YYYY-MM-DD')
+        end_date: Last date of the range ('YYYY-MM-DD')
+
+    Returns:
+        Dictionary of equally long arrays: staff_id, department, arrival and
+        departure (seconds since local midnight, MISSING if absent) and worked
+        (seconds between time_in and time_out, 0 if open) and late_seconds
+        (as stored by the shift policies), plus a "names"
+        dictionary mapping every staff ID in the range to a display name
+    """
+    first_day = parse_day(start_date)
+    last_day = parse_day(end_date)
+
+    # A read-only connection on the WAL snapshot never holds up kiosk writes
+    conn = connect_readonly(db_path)
+    cursor = conn.cursor()
+
+    # Both statements read the same snapshot, so the row count matches the rows
+    cursor.execute("BEGIN")
+    cursor.execute('''
+        SELECT COUNT(*), MAX(LENGTH(staff_id)), MAX(LENGTH(department))
+        FROM attendance
+        WHERE date BETWEEN ? AND ?
+    ''', (first_day, last_day))
+    count, id_length, department_length = cursor.fetchone()
+
+    row_type = np.dtype([
+        ("staff_id", f"U{id_length or 1}"),
+        ("department", f"U{department_length or 1}"),
+        ("date", np.int64),
+        ("time_in", np.int64),
+        ("time_out", np.int64),
+        ("late_seconds", np.int64),
+    ])
+    # Rows are copied straight from the cursor into one structured array; records
+    # closed by the nightly job count as having no sign-out
+    cursor.execute('''
+        SELECT staff_id, department, date, COALESCE(time_in, -1),
+               CASE WHEN auto_closed THEN -1 ELSE COALESCE(time_out, -1) END,
+               COALESCE(late_seconds, 0)
+        FROM attendance
+        WHERE date BETWEEN ? AND ?
+    ''', (first_day, last_day))
+    rows = np.fromiter(cursor, dtype=row_type, count=count)
+
+    names = dict(cursor.execute("SELECT staff_id, name FROM staff").fetchall())
+    for staff_id in set(np.unique(rows["staff_id"]).tolist()) - names.keys():
+        # Deleted staff keep the name stored with their latest attendance record
+        cursor.execute(
+            "SELECT name FROM attendance WHERE staff_id = ? ORDER BY date DESC LIMIT 1",
+            (staff_id,)
+        )
+        names[staff_id] = cursor.fetchone()[0]
+    conn.close()
+
+    # Local midnight of every day in the range, so each punch becomes a time of day
+    # with a single subtraction (and DST changes are still respected per day)
+    midnights = np.array([day_start_timestamp(day) for day in range(first_day, last_day + 1)], dtype=np.int64)
+    midnight = midnights[rows["date"] - first_day]
+
+    times_in = rows["time_in"]
+    times_out = rows["time_out"]
+    has_in = times_in != MISSING
+    has_out = times_out != MISSING
+    return {
+        "staff_id": rows["staff_id"],
+        "department": rows["department"],
+        "arrival": np.where(has_in, times_in - midnight, MISSING),
+        "departure": np.where(has_out, times_out - midnight, MISSING),
+        "worked": np.where(has_in & has_out, times_out - times_in, 0),
+        "late_seconds": rows["late_seconds"],
+        "names": names,
+    }
+
+
+def group_percentiles(codes: np.ndarray, values: np.ndarray, group_count: int, percentiles) -> List[np.ndarray]:
+    """Linearly interpolated percentiles of values for every group code (NaN for empty groups)"""
+    # One sort by (group, value) serves every requested percentile
+    order = np.lexsort((values, codes))
+    sorted_values = values[order].astype(np.float64)
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+
+    results = []
+    for percentile in percentiles:
+        position = starts[present] + (counts[present] - 1) * (percentile / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        weight = position - lower
+
+        result = np.full(group_count, np.nan)
+        result[present] = sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+        results.append(result)
+    return results
+
+
+def summarize(data: Dict[str, object], group_by: str = "staff", closing_time: str = CLOSING_TIME) -> List[tuple]:
+    """
+    Compute per-staff or per-department attendance aggregates
+
+    Args:
+        data: Column arrays returned by load_attendance
+        group_by: "staff" or "department"
+        closing_time: Departures before this time count as early
+
+    Returns:
+        List of tuples (key, label, days present, total hours, mean arrival,
+        arrival percentiles..., share of days late, early departures), with
+        arrival values in seconds since midnight
+    """
+    if group_by == "staff":
+        keys, codes = np.unique(data["staff_id"], return_inverse=True)
+        labels = [data["names"].get(key, key) for key in keys.tolist()]
+    elif group_by == "department":
+        keys, codes = np.unique(data["department"], return_inverse=True)
+        labels = keys
+    else:
+        raise ValueError(f"Unknown grouping: {group_by}")
+
+    group_count = len(keys)
+    if group_count == 0:
+        return []
+    codes = codes.ravel()
+
+    arrival = data["arrival"]
+    departure = data["departure"]
+    has_arrival = arrival != MISSING
+    completed = has_arrival & (departure != MISSING)
+
+    days = np.bincount(codes, minlength=group_count)
+    worked_seconds = np.bincount(codes, weights=data["worked"], minlength=group_count)
+
+    arrival_days = np.bincount(codes[has_arrival], minlength=group_count)
+    arrival_sum = np.bincount(codes[has_arrival], weights=arrival[has_arrival], minlength=group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_arrival = arrival_sum / arrival_days
+
+    percentiles = group_percentiles(codes[has_arrival], arrival[has_arrival], group_count, ARRIVAL_PERCENTILES)
+
+    late = has_arrival & (data["late_seconds"] > 0)
+    late_days = np.bincount(codes[late], minlength=group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        late_share = np.where(arrival_days > 0, late_days / arrival_days, 0.0)
+
+    early = completed & (departure < time_to_seconds(closing_time))
+    early_departures = np.bincount(codes[early], minlength=group_count)
+
+    hours = worked_seconds / 3600.0
+    return [
+        (str(keys[i]), str(labels[i]), int(days[i]), float(hours[i]), float(mean_arrival[i]))
+        + tuple(float(p[i]) for p in percentiles)
+        + (float(late_share[i]), int(early_departures[i]))
+        for i in range(group_count)
+    ]
+
+
+def attendance_report(db_path: str, start_date: str, end_date: str, group_by: str = "staff") -> List[tuple]:
+    """Load a date range and summarize it in one call"""
+    return summarize(load_attendance(db_path, start_date, end_date), group_by)
+
+
+def longest_runs(flags: np.ndarray) -> np.ndarray:
+    """Length of the longest run of True in every row of a 2-D boolean array"""
+    if flags.shape[1] == 0:
+        return np.zeros(flags.shape[0], dtype=np.int64)
+    counts = np.cumsum(flags, axis=1)
+    # Count reached at the latest False of each position; the run is what came after it
+    resets = np.maximum.accumulate(np.where(flags, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+def absence_report(db_path: str, start_date: str, end_date: str, department: Optional[str] = None) -> List[tuple]:
+    """
+    Compute every staff member's absences on working days from the presence bitmaps
+
+    Args:
+        db_path: Path to the SQLite database
+        start_date: First date of the range ('YYYY-MM-DD')
+        end_date: Last date of the range ('YYYY-MM-DD'); days after today are ignored
+        department: Only report staff of this department
+
+    Returns:
+        List of tuples (staff ID, name, department, working days, days present,
+        days absent, longest run of consecutive absent working days,
+        attendance rate), ordered by staff ID
+    """
+    first_day = parse_day(start_date)
+    last_day = min(parse_day(end_date), day_number(date.today()))
+    day_count = max(0, last_day - first_day + 1)
+
+    conn = connect_readonly(db_path)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    if department is None:
+        cursor.execute(STAFF_START_SQL + " ORDER BY staff_id")
+    else:
+        cursor.execute(STAFF_START_SQL + " WHERE department = ? ORDER BY staff_id", (department,))
+    staff = cursor.fetchall()
+    rows = {row[0]: index for index, row in enumerate(staff)}
+
+    # Unpack each year's bitmaps into one staff x day matrix of the range
+    present = np.zeros((len(staff), day_count), dtype=bool)
+    for year in range(day_to_date(first_day).year, day_to_date(last_day).year + 1) if day_count else ():
+        cursor.execute("SELECT staff_id, bits FROM presence WHERE year = ?", (year,))
+        bitmaps = [(rows[staff_id], bits) for staff_id, bits in cursor.fetchall() if staff_id in rows]
+        if not bitmaps:
+            continue
+        year_first = day_number(date(year, 1, 1))
+        lo = max(first_day, year_first)
+        hi = min(last_day, day_number(date(year, 12, 31)))
+        packed = np.frombuffer(b"".join(bits for _, bits in bitmaps), dtype=np.uint8).reshape(-1, YEAR_BYTES)
+        year_bits = np.unpackbits(packed, axis=1, bitorder="little")
+        present[[row for row, _ in bitmaps], lo - first_day:hi - first_day + 1] = \
+            year_bits[:, lo - year_first:hi - year_first + 1]
+
+    cursor.execute("SELECT date FROM calendar WHERE date BETWEEN ? AND ? AND holiday IS NOT NULL",
+                   (first_day, last_day))
+    holidays = np.zeros(day_count, dtype=bool)
+    holidays[[row[0] - first_day for row in cursor.fetchall()]] = True
+    policies = PolicyBook.load(cursor)
+    conn.close()
+
+    # Working days per department from its shift policy, as a bit test on the
+    # weekday, minus public holidays and the days before each staff member's start
+    days = np.arange(first_day, first_day + day_count)
+    weekdays = (days + 3) % 7
+    departments = np.array([row[2] for row in staff], dtype=object)
+    started = days >= np.array([row[3] for row in staff], dtype=np.int64).reshape(-1, 1)
+    working = np.zeros_like(present)
+    streaks = np.zeros(len(staff), dtype=np.int64)
+    for name in set(departments.tolist()):
+        policy = policies.policy_for(name)
+        working_days = policy.working_days if policy else 0b1111111
+        columns = ((working_days >> weekdays) & 1 == 1) & ~holidays
+        members = departments == name
+        working[np.ix_(members, columns)] = True
+        # Weekends and other days off neither break nor extend an absence streak
+        streaks[members] = longest_runs((started & ~present)[np.ix_(members, columns)])
+
+    working &= started
+    absent = working & ~present
+    working_count = working.sum(axis=1)
+    present_count = (working & present).sum(axis=1)
+    absent_count = absent.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(working_count > 0, present_count / working_count, 0.0)
+
+    return [
+        (staff_id, name, dept, int(working_count[i]), int(present_count[i]), int(absent_count[i]),
+         int(streaks[i]), float(rate[i]))
+        for i, (staff_id, name, dept, _) in enumerate(staff)
+    ]
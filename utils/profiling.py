@@ -0,0 +1,74 @@
+"""
+On-demand cProfile capture for the attendance system
+
+Functions decorated with @profiled cost one flag check while capture is
+off. While it is on, every call runs under cProfile and its statistics
+are dumped to a .prof file in the profile directory, ready for offline
+analysis with pstats or snakeviz:
+
+    python -m pstats diagnostics/log_attendance-20251001-081502-123456.prof
+"""
+
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+PROFILE_DIR = "diagnostics"
+
+# Capture state shared by every decorated function
+capture_enabled = False
+profile_dir = Path(PROFILE_DIR)
+
+# cProfile allows one active profiler per process; nested captures are folded
+# into the outer one
+active_lock = threading.Lock()
+
+
+def set_capture(enabled: bool, directory: str = None):
+    """Turn capture of decorated calls on or off"""
+    global capture_enabled, profile_dir
+    if directory is not None:
+        profile_dir = Path(directory)
+    capture_enabled = enabled
+
+
+def is_capturing() -> bool:
+    return capture_enabled
+
+
+@contextmanager
+def profile_block(name: str):
+    """Profile the enclosed code regardless of the capture flag and dump it as name-<time>.prof"""
+    if not active_lock.acquire(blocking=False):
+        # Already inside a profiled call
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_dir / f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+    finally:
+        active_lock.release()
+
+
+def profiled(name: str):
+    """Decorator: profile each call of the function while capture is on"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not capture_enabled:
+                return function(*args, **kwargs)
+            with profile_block(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator